@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Times the pose apply engine against the old per-plug setAttr loop.
+
+:description:
+    Builds a fake rig in the stand-in cmds module, writes two poses for it and applies
+    them back and forth. The old loop re-reads the XML and calls setAttr on every plug,
+    the engine reuses its compiled plan and only sets the plugs that change. Undoable
+    applies still take a setAttr per changed plug, applies off the undo queue are set
+    in one MDGModifier.
+
+    python benchmarks/bench_apply.py --ctrls 150 --attrs 10 --call-cost 0.00002
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import maya_stand_ins
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def legacy_apply_attrs(util, cmds, xml_path):
+    """
+    The per-plug loop _apply_attrs used before the apply engine.
+    """
+    contents = util._read_xml(xml_path)
+    namespace = util.curr_char_ns
+    for control in contents:
+        ns_control = "%s:%s" % (namespace, control)
+        for attr in contents[control]:
+            value = float(contents[control][attr])
+            cmds.setAttr("%s.%s" % (ns_control, attr), value)
+
+
+def build_rig(cmds, namespace, num_ctrls, num_attrs):
+    """
+    Adds the controls of a fake rig to the stand-in scene.
+
+    :return: The namespaced control names.
+    :type: list
+    """
+    controls = []
+    for ctrl_index in range(num_ctrls):
+        node = "%s:face_%03d_CC" % (namespace, ctrl_index)
+        attrs = dict(("attr%02d" % x, 0.0) for x in range(num_attrs))
+        cmds.add_control(node, attrs)
+        controls.append(node)
+
+    return controls
+
+
+def write_pose(util, cmds, controls, xml_path, seed):
+    """
+    Sets the rig to a made up pose and writes it out with write_xml.
+    """
+    for plug_index, plug in enumerate(sorted(cmds.plugs)):
+        cmds.plugs[plug] = round(((plug_index * 7 + seed) % 100) / 10.0, 3)
+    util.write_xml(controls, xml_path)
+
+
+def time_it(func, repeat):
+    """
+    Runs the function a few times and returns the best time of one run.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split(":synopsis:")[0])
+    parser.add_argument("--ctrls", type=int, default=150)
+    parser.add_argument("--attrs", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--call-cost", type=float, default=0.0,
+                        help="Seconds burned per cmds call to model Maya's overhead.")
+    args = parser.parse_args(argv)
+
+    cmds, utils = maya_stand_ins.install(args.call_cost)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        util = utils.PoseLibraryUtil(maya_stand_ins.StandInContext(temp_dir))
+        util.curr_char_ns = "faceRig"
+        controls = build_rig(cmds, util.curr_char_ns, args.ctrls, args.attrs)
+
+        pose_a = os.path.join(temp_dir, "faceRig_a.xml")
+        pose_b = os.path.join(temp_dir, "faceRig_b.xml")
+        write_pose(util, cmds, controls, pose_a, 1)
+        write_pose(util, cmds, controls, pose_b, 2)
+
+        def legacy():
+            legacy_apply_attrs(util, cmds, pose_a)
+            legacy_apply_attrs(util, cmds, pose_b)
+
+        def engine():
+            util._apply_attrs(pose_a)
+            util._apply_attrs(pose_b)
+
+        def engine_same():
+            util._apply_attrs(pose_b)
+
+        # Off the undo queue, like a hover preview, the engine sets it in one batch.
+        plans = [util.apply_engine.get_plan(x, util.curr_char_ns, util._read_pose) \
+                                                                for x in (pose_a, pose_b)]
+
+        def engine_batched():
+            for plan in plans:
+                util.apply_engine.apply(plan, undoable=False)
+
+        results = []
+        for label, func in (("legacy loop, A then B", legacy),
+                            ("engine, A then B", engine),
+                            ("engine, B again (no-op)", engine_same),
+                            ("engine, A then B, no undo", engine_batched)):
+            cmds.calls = 0
+            seconds = time_it(func, args.repeat)
+            results.append((label, seconds, cmds.calls // args.repeat))
+
+        num_plugs = args.ctrls * args.attrs
+        print("%d plugs, %d repeats, %.1fus per cmds call" % (num_plugs, args.repeat,
+                                                             args.call_cost * 1e6))
+        for label, seconds, calls in results:
+            print("  %-26s %9.3f ms  %7d cmds calls" % (label, seconds * 1e3, calls))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
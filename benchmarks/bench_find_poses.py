@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Times matching pose file names to characters, the old prefix loop against the trie.
+
+:description:
+    Makes up a library of pose file names for a set of characters, where some character
+    names are prefixes of others ("char_007" and "char_0071"), then matches every file
+    with the loop find_poses used to run and with the CharacterMatcher. The matcher's
+    results are checked against the character each file was made for. With --on-disk
+    the files are also written to a temp dir and run through find_poses.
+
+    python benchmarks/bench_find_poses.py --files 100000 --chars 200
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import maya_stand_ins
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def legacy_match(char_list, curr_file):
+    """
+    The loop find_poses used before the CharacterMatcher, first prefix wins.
+    """
+    base_name = os.path.splitext(curr_file)[0]
+    for search_char in char_list:
+        search_char_len = len(search_char)
+        char_start_index = curr_file.find(search_char, 0, search_char_len)
+        if char_start_index != -1:
+            return base_name[:search_char_len], base_name[search_char_len+1:]
+
+    return None, None
+
+
+def make_library(num_files, num_chars):
+    """
+    Makes up character names and pose file names for them.
+
+    :return: The characters and the (file_name, char) pairs.
+    :type: list, list
+    """
+    # Every tenth character also gets a longer sibling that starts with its name.
+    chars = []
+    for char_index in range(num_chars):
+        if char_index % 10 == 9:
+            chars.append("%s1" % chars[-1])
+        else:
+            chars.append("char_%03d" % char_index)
+
+    files = []
+    for file_index in range(num_files):
+        char = chars[file_index % num_chars]
+        files.append(("%s_pose_%06d.xml" % (char, file_index), char))
+
+    return chars, files
+
+
+def time_it(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split(":synopsis:")[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--chars", type=int, default=200)
+    parser.add_argument("--on-disk", action="store_true",
+                        help="Also write the files out and time find_poses on them.")
+    args = parser.parse_args(argv)
+
+    cmds, utils = maya_stand_ins.install()
+    pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+    chars, files = make_library(args.files, args.chars)
+
+    legacy_time, legacy_result = time_it(
+                            lambda: [legacy_match(chars, x[0]) for x in files])
+    build_time, matcher = time_it(lambda: pose_io.CharacterMatcher(chars))
+    trie_time, trie_result = time_it(lambda: [matcher.split(x[0]) for x in files])
+
+    legacy_wrong = sum(1 for x, y in zip(legacy_result, files) if x[0] != y[1])
+    trie_wrong = sum(1 for x, y in zip(trie_result, files) if x[0] != y[1])
+
+    print("%d files, %d characters" % (args.files, args.chars))
+    print("  legacy loop    %9.1f ms  %6d files on the wrong character" % (
+                                                        legacy_time * 1e3, legacy_wrong))
+    print("  trie build     %9.1f ms" % (build_time * 1e3))
+    print("  trie match     %9.1f ms  %6d files on the wrong character" % (
+                                                        trie_time * 1e3, trie_wrong))
+    if trie_wrong:
+        sys.exit("The CharacterMatcher put files on the wrong character.")
+
+    if not args.on_disk:
+        return None
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        refs = [maya_stand_ins.StandInRef(x, x) for x in chars]
+        util = utils.PoseLibraryUtil(maya_stand_ins.StandInContext(temp_dir, refs))
+        util.rigs = util.check_for_rigs()
+        util.get_pose_dir()
+        util.match_rigs_to_char()
+        for file_name, char in files:
+            open(os.path.join(util.proj_data_path, file_name), "w").close()
+
+        first_time, _ = time_it(util.find_poses)
+        again_time, _ = time_it(util.find_poses)
+        found = sum(len(x) for x in util.pose_paths.values())
+        print("  find_poses     %9.1f ms  first run, building the manifest" % (
+                                                                    first_time * 1e3))
+        print("  find_poses     %9.1f ms  from the manifest, %d poses" % (
+                                                                    again_time * 1e3,
+                                                                    found))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
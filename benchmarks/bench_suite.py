@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Benchmarks the pose library's main operations on made up libraries, as JSON.
+
+:description:
+    Makes up pose libraries in a temp dir at a few scales and times find_poses, flat
+    and sharded for a scene with two of the characters, _read_xml cold and from the
+    pose cache, reading binary poses, _apply_attrs,
+    mirrored applies, hover previews, write_xml, the nearest pose search and filling
+    the GUI's pose model against the stand-in cmds module. Every operation reports its
+    latency percentiles, throughput and peak Python memory. Memory is measured on a
+    separate run under tracemalloc, so tracing doesn't slow down the timed runs.
+
+    The report is JSON, and --compare prints how a run moved against an older report.
+
+    python benchmarks/bench_suite.py --out before.json
+    python benchmarks/bench_suite.py --compare before.json
+    python benchmarks/bench_suite.py --full --out full.json
+
+    find_poses scales with the pose count, the rest scale with the attrs per pose and
+    run on a sample of poses, so 100k poses of 5,000 attrs don't have to fit on disk.
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module. The GUI benchmark needs
+    PySide2 and is skipped without it.
+
+:see_also:
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import maya_stand_ins
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+QUICK_POSES = [100, 1000, 10000]
+QUICK_ATTRS = [10, 100, 1000]
+FULL_POSES = [100, 1000, 10000, 100000]
+FULL_ATTRS = [10, 100, 1000, 5000]
+
+# Attributes per control on the made up rigs.
+ATTRS_PER_CTRL = 10
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def percentile(sorted_values, pct):
+    """
+    Gets a percentile from sorted values, interpolating between the closest two.
+    """
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * \
+                                                                    (position - lower)
+
+
+def measure(func, runs, items_per_run=1, setup=None):
+    """
+    Times a function over a few runs, then runs it once more under tracemalloc for its
+    peak memory.
+
+    :param func: What to time, called with no arguments.
+    :type: function
+
+    :param runs: How many timed runs.
+    :type: int
+
+    :param items_per_run: How many items one run handles, for the throughput.
+    :type: int
+
+    :param setup: Called before every run, outside the timing.
+    :type: function
+
+    :return: The latency percentiles in ms, throughput in items per second and the
+             peak memory in bytes.
+    :type: dict
+    """
+    latencies = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {"runs": runs,
+            "items_per_run": items_per_run,
+            "mean_ms": total / runs * 1e3,
+            "min_ms": latencies[0] * 1e3,
+            "p50_ms": percentile(latencies, 50) * 1e3,
+            "p90_ms": percentile(latencies, 90) * 1e3,
+            "p99_ms": percentile(latencies, 99) * 1e3,
+            "max_ms": latencies[-1] * 1e3,
+            "throughput_per_s": items_per_run * runs / total if total else 0.0,
+            "peak_bytes": peak}
+
+
+def new_util(utils, root, chars=None):
+    """
+    Makes a PoseLibraryUtil on a temp library with a rig per character.
+    """
+    refs = [maya_stand_ins.StandInRef(x, x) for x in chars or []]
+    util = utils.PoseLibraryUtil(maya_stand_ins.StandInContext(root, refs))
+    util.rigs = util.check_for_rigs() or []
+    util.get_pose_dir()
+    util.match_rigs_to_char()
+    return util
+
+
+def build_rig(cmds, namespace, num_attrs):
+    """
+    Adds a rig with the number of keyable attrs to the stand-in scene.
+
+    :return: The namespaced control names.
+    :type: list
+    """
+    controls = []
+    for ctrl_index in range((num_attrs + ATTRS_PER_CTRL - 1) // ATTRS_PER_CTRL):
+        node = "%s:ctrl_%04d_CC" % (namespace, ctrl_index)
+        count = min(ATTRS_PER_CTRL, num_attrs - ctrl_index * ATTRS_PER_CTRL)
+        cmds.add_control(node, dict(("attr%02d" % x, 0.0) for x in range(count)))
+        controls.append(node)
+
+    return controls
+
+
+def set_rig(cmds, controls, seed):
+    """
+    Moves every plug of a rig to a made up value.
+    """
+    for ctrl_index, control in enumerate(controls):
+        for attr_index, attr in enumerate(cmds.nodes[control]):
+            value = ((ctrl_index * 31 + attr_index * 7 + seed) % 200) / 10.0 - 10.0
+            cmds.plugs["%s.%s" % (control, attr)] = value
+
+
+def set_rig_partly(cmds, controls, seed, every=10):
+    """
+    Moves one control in every so many off its defaults, the rest go back to 0.
+    """
+    for ctrl_index, control in enumerate(controls):
+        posed = (ctrl_index + seed) % every == 0
+        for attr_index, attr in enumerate(cmds.nodes[control]):
+            value = ((ctrl_index * 31 + attr_index * 7 + seed) % 200) / 10.0 - 9.95
+            cmds.plugs["%s.%s" % (control, attr)] = value if posed else 0.0
+
+
+def bench_find_poses(cmds, utils, root, num_poses, args):
+    """
+    find_poses on a library of num_poses files, building the manifest and reading it.
+    """
+    chars = ["char_%02d" % x for x in range(max(1, min(50, num_poses // 100)))]
+    util = new_util(utils, root, chars)
+    for pose_index in range(num_poses):
+        char = chars[pose_index % len(chars)]
+        open("%s/%s_pose_%06d.xml" % (util.proj_data_path, char, pose_index),
+             "w").close()
+
+    def cold_setup():
+        util.manifest = None
+        if os.path.isfile("%s.manifest.json" % util.proj_data_path):
+            os.remove("%s.manifest.json" % util.proj_data_path)
+
+    runs = max(3, args.runs // 4) if num_poses >= 10000 else args.runs
+    results = {"find_poses.cold": measure(util.find_poses, runs, num_poses, cold_setup),
+               "find_poses.warm": measure(util.find_poses, runs, num_poses)}
+
+    # A scene with two of the characters, on the flat library and once it's sharded.
+    scene_util = new_util(utils, root, chars[:2])
+    scene_poses = sum(1 for x in range(num_poses) if x % len(chars) < 2)
+    results["find_poses.scene_flat"] = measure(scene_util.find_poses, runs, scene_poses)
+
+    util.shard_library()
+    scene_util = new_util(utils, root, chars[:2])
+
+    def sharded_cold_setup():
+        scene_util.manifest = None
+        for char in chars[:2]:
+            manifest_path = "%s.manifests/%s.json" % (util.proj_data_path, char)
+            if os.path.isfile(manifest_path):
+                os.remove(manifest_path)
+
+    results["find_poses.scene_sharded.cold"] = measure(scene_util.find_poses, runs,
+                                                       scene_poses, sharded_cold_setup)
+    results["find_poses.scene_sharded.warm"] = measure(scene_util.find_poses, runs,
+                                                       scene_poses)
+    return results
+
+
+def bench_pose_files(cmds, utils, root, num_attrs, args):
+    """
+    Reading, writing and applying poses of num_attrs attributes.
+    """
+    util = new_util(utils, root, ["rig"])
+    util.curr_char_ns = "rig%d" % num_attrs
+    controls = build_rig(cmds, util.curr_char_ns, num_attrs)
+    pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+    # A sample of poses in both formats.
+    xml_paths = []
+    bin_paths = []
+    for pose_index in range(args.sample):
+        set_rig(cmds, controls, pose_index)
+        xml_path = "%s/rig_pose_%03d.xml" % (util.proj_data_path, pose_index)
+        util.write_xml(controls, xml_path)
+        bin_path = "%s.%s" % (os.path.splitext(xml_path)[0], pose_io.BIN_EXT)
+        pose_io.write_pose(pose_io.read_pose(xml_path), bin_path)
+        xml_paths.append(xml_path)
+        bin_paths.append(bin_path)
+
+    # Poses with a tenth of the controls moved, saved in full and sparse.
+    dense_paths = []
+    sparse_paths = []
+    for pose_index in range(args.sample):
+        set_rig_partly(cmds, controls, pose_index)
+        for sparse, paths in ((False, dense_paths), (True, sparse_paths)):
+            util.sparse_poses = sparse
+            paths.append("%s/rig_%s_%03d.xml" % (util.proj_data_path,
+                                                 "sparse" if sparse else "dense",
+                                                 pose_index))
+            util.write_xml(controls, paths[-1])
+    util.sparse_poses = False
+
+    def read_xml():
+        for xml_path in xml_paths:
+            util._read_xml(xml_path)
+
+    def read_dense():
+        for xml_path in dense_paths:
+            util._read_pose(xml_path)
+
+    def read_sparse():
+        for xml_path in sparse_paths:
+            util._read_pose(xml_path)
+
+    def read_binary():
+        for bin_path in bin_paths:
+            pose_io.read_pose(bin_path)
+
+    # Apply goes back and forth between the poses, with the plans cached like in use.
+    def apply_attrs():
+        for xml_path in xml_paths:
+            util._apply_attrs(xml_path)
+
+    # The same, mirrored. The made up controls are all center controls, so this times
+    # the mirror table and not any difference in the plugs set.
+    def apply_mirror():
+        for xml_path in xml_paths:
+            util._apply_attrs(xml_path, mirror=True)
+
+    # Moving the mouse across the grid of poses, previewing each, then off the grid.
+    util.find_poses()
+    util.curr_char = "rig"
+
+    def hover_previews():
+        for pose_index in range(len(xml_paths)):
+            util.preview_pose("pose_%03d" % pose_index)
+        util.end_preview()
+
+    write_path = "%s/rig_write.xml" % util.proj_data_path
+
+    def write_xml():
+        util.write_xml(controls, write_path)
+
+    # The first apply compiles the plans, time that on its own.
+    def apply_cold_setup():
+        util.apply_engine.invalidate()
+        util.pose_cache.invalidate()
+
+    sample = len(xml_paths)
+    def read_cold_setup():
+        util.pose_cache.invalidate()
+
+    results = {"read_xml.cold": measure(read_xml, args.runs, sample, read_cold_setup),
+               "read_xml.warm": measure(read_xml, args.runs, sample),
+               "read_binary": measure(read_binary, args.runs, sample),
+               "apply_attrs.cold": measure(apply_attrs, args.runs, sample,
+                                           apply_cold_setup),
+               "apply_attrs.warm": measure(apply_attrs, args.runs, sample),
+               "apply_mirror.cold": measure(apply_mirror, args.runs, sample,
+                                            apply_cold_setup),
+               "apply_mirror.warm": measure(apply_mirror, args.runs, sample),
+               "preview.hover": measure(hover_previews, args.runs, sample),
+               "write_xml": measure(write_xml, args.runs, 1),
+               "read_partial.dense": measure(read_dense, args.runs, sample,
+                                             read_cold_setup),
+               "read_partial.sparse": measure(read_sparse, args.runs, sample,
+                                              read_cold_setup)}
+
+    # Leave the scene empty for the next scale.
+    for control in controls:
+        for attr in cmds.nodes.pop(control):
+            cmds.plugs.pop("%s.%s" % (control, attr), None)
+    return results
+
+
+def bench_search(utils, num_poses, args, num_attrs=100):
+    """
+    Finding the closest poses in a similarity index of num_poses poses, exactly and
+    through the clusters, and adding and removing a pose.
+    """
+    pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+    num_ctrls = (num_attrs + ATTRS_PER_CTRL - 1) // ATTRS_PER_CTRL
+    index = utils.PoseSearchIndex()
+    for pose_index in range(num_poses):
+        pose_data = pose_io.PoseData()
+        for ctrl_index in range(num_ctrls):
+            pose_data.add_control("ctrl_%04d_CC" % ctrl_index,
+                                  [("attr%02d" % x, ((ctrl_index * 31 + x * 7 + \
+                                                      pose_index) % 200) / 10.0) \
+                                   for x in range(ATTRS_PER_CTRL)])
+        index.add("pose_%06d" % pose_index, pose_data)
+
+    query = [((x * 13) % 200) / 10.0 for x in range(len(index.column_keys))]
+    extra = pose_io.PoseData()
+    extra.add_control("ctrl_0000_CC", [("attr00", 1.0)])
+
+    def search_exact():
+        index.search(query, count=10, approximate=False)
+
+    def search_approx():
+        index.search(query, count=10, approximate=True)
+
+    def add_remove():
+        index.add("extra", extra)
+        index.remove("extra")
+
+    # The first approximate search trains the clusters, time it on its own.
+    train_start = time.perf_counter()
+    search_approx()
+    return {"search.exact": measure(search_exact, args.runs, num_poses),
+            "search.approx": measure(search_approx, args.runs, num_poses),
+            "search.train": {"ms": (time.perf_counter() - train_start) * 1e3},
+            "search.add_remove": measure(add_remove, args.runs, 1)}
+
+
+def bench_gui_model(num_poses, args):
+    """
+    Fills the GUI's pose model and reads a screen of rows, if PySide2 is around.
+    """
+    try:
+        from PySide2 import QtCore, QtWidgets
+    except ImportError:
+        return {"gui.pose_model": {"skipped": "PySide2 is not installed"}}
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if QtWidgets.QApplication.instance() is None:
+        bench_gui_model.app = QtWidgets.QApplication([])
+    gui = sys.modules.get("pose_library.pose_library_gui")
+    if gui is None:
+        import pose_library.pose_library_gui as gui
+
+    poses = ["pose_%06d" % x for x in range(num_poses)]
+    model = gui.PoseListModel()
+
+    def fill():
+        model.set_poses(poses)
+        for row in range(min(60, num_poses)):
+            model.data(model.index(row), QtCore.Qt.DisplayRole)
+
+    return {"gui.pose_model": measure(fill, args.runs, num_poses)}
+
+
+def compare(report, baseline):
+    """
+    Prints how each operation's median and peak memory moved against a baseline.
+    """
+    print("%-40s %12s %12s %8s %10s" % ("operation", "p50 before", "p50 now", "change",
+                                        "peak now"))
+    for key in sorted(report["results"]):
+        now = report["results"][key]
+        before = baseline.get("results", {}).get(key)
+        if "p50_ms" not in now:
+            continue
+        if not before or "p50_ms" not in before:
+            print("%-40s %12s %10.3fms %8s %9.1fK" % (key, "-", now["p50_ms"], "new",
+                                                       now["peak_bytes"] / 1024.0))
+            continue
+        change = (now["p50_ms"] / before["p50_ms"] - 1.0) * 100 if before["p50_ms"] \
+                                                                  else 0.0
+        print("%-40s %10.3fms %10.3fms %+7.1f%% %9.1fK" % (key, before["p50_ms"],
+                                                          now["p50_ms"], change,
+                                                          now["peak_bytes"] / 1024.0))
+
+
+def main(argv=None):
+    synopsis = __doc__.split(":synopsis:")[1].split(":description:")[0].strip()
+    parser = argparse.ArgumentParser(description=synopsis)
+    parser.add_argument("--poses", type=int, nargs="*",
+                        help="Library sizes for find_poses and the GUI model.")
+    parser.add_argument("--attrs", type=int, nargs="*",
+                        help="Attrs per pose for reading, writing and applying.")
+    parser.add_argument("--full", action="store_true",
+                        help="Run up to 100k poses and 5,000 attrs per pose.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=20,
+                        help="Poses per attr count to read, write and apply.")
+    parser.add_argument("--call-cost", type=float, default=0.0,
+                        help="Seconds burned per cmds call to model Maya's overhead.")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--compare", help="An older JSON report to compare against.")
+    args = parser.parse_args(argv)
+
+    pose_counts = args.poses or (FULL_POSES if args.full else QUICK_POSES)
+    attr_counts = args.attrs or (FULL_ATTRS if args.full else QUICK_ATTRS)
+
+    cmds, utils = maya_stand_ins.install(args.call_cost)
+    results = {}
+    for num_poses in pose_counts:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name, result in bench_find_poses(cmds, utils, temp_dir, num_poses,
+                                                 args).items():
+                results["%s[poses=%d]" % (name, num_poses)] = result
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        for name, result in bench_search(utils, num_poses, args).items():
+            results["%s[poses=%d]" % (name, num_poses)] = result
+        for name, result in bench_gui_model(num_poses, args).items():
+            results["%s[poses=%d]" % (name, num_poses)] = result
+
+    for num_attrs in attr_counts:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name, result in bench_pose_files(cmds, utils, temp_dir, num_attrs,
+                                                 args).items():
+                results["%s[attrs=%d]" % (name, num_attrs)] = result
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "args": vars(args),
+              "results": results}
+
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            compare(report, json.load(fh))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+    elif not args.compare:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    In-memory stand-ins for maya.cmds and the pipeline modules the pose library uses.
+
+:description:
+    Installs fake "maya", "maya_tools" and "gen_utils" modules into sys.modules so the
+    pose library modules can be imported and timed outside of Maya. The fake cmds module
+    keeps every plug in a dictionary and can burn a fixed amount of time per command to
+    stand in for the overhead of Maya's command engine.
+
+:applications:
+    None, runs in plain Python.
+
+:see_also:
+    pose_library.pose_library_utils
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import importlib
+import math
+import os
+import sys
+import time
+import types
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+# The pose library modules the pipeline deploys under maya_tools.utils, in import order.
+UTILS_MODULES = ["pose_library_io", "pose_library_trace", "pose_library_utils",
+                 "pose_library_cli"]
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def install(call_cost=0.0):
+    """
+    Installs the stand-in modules and imports the pose library utils against them.
+
+    :param call_cost: Seconds to burn on every cmds call, to model Maya's overhead.
+    :type: float
+
+    :return: The stand-in cmds and the imported pose_library_utils module.
+    :type: StandInCmds, module
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+
+    cmds = StandInCmds(call_cost)
+
+    open_maya = build_open_maya(cmds)
+    maya_api = types.ModuleType("maya.api")
+    maya_api.OpenMaya = open_maya
+
+    maya = types.ModuleType("maya")
+    maya.cmds = cmds
+    maya.api = maya_api
+    sys.modules["maya"] = maya
+    sys.modules["maya.cmds"] = cmds
+    sys.modules["maya.api"] = maya_api
+    sys.modules["maya.api.OpenMaya"] = open_maya
+
+    maya_utils = types.ModuleType("maya_tools.utils.maya_utils")
+    maya_utils.get_assets_from_refs = lambda context: context.refs
+    maya_utils.get_maya_pipe_context = lambda: StandInContext()
+    maya_utils.IOM = StandInIO
+    maya_guis = types.ModuleType("maya_tools.guis.maya_guis")
+    maya_guis.PreviewImage = object
+    maya_guis.ConfirmDialog = object
+    maya_gui_utils = types.ModuleType("maya_tools.guis.maya_gui_utils")
+    maya_gui_utils.get_maya_window = lambda: None
+
+    pipe_enums = types.ModuleType("gen_utils.pipe_enums")
+    pipe_enums.FileExtensions = types.SimpleNamespace(PNG="png", XML="xml")
+    gen_utils = types.ModuleType("gen_utils.utils")
+    gen_utils.IO = StandInIO
+    gen_utils.AutoVivification = AutoVivification
+
+    modules = {"maya_tools": types.ModuleType("maya_tools"),
+               "maya_tools.utils": types.ModuleType("maya_tools.utils"),
+               "maya_tools.utils.maya_utils": maya_utils,
+               "maya_tools.guis": types.ModuleType("maya_tools.guis"),
+               "maya_tools.guis.maya_guis": maya_guis,
+               "maya_tools.guis.maya_gui_utils": maya_gui_utils,
+               "gen_utils": types.ModuleType("gen_utils"),
+               "gen_utils.pipe_enums": pipe_enums,
+               "gen_utils.utils": gen_utils}
+    sys.modules.update(modules)
+
+    # The pipeline deploys the pose library modules under maya_tools.utils, so alias
+    # them there as they're imported. Modules have to come after what they import.
+    for module_name in UTILS_MODULES:
+        module = importlib.import_module("pose_library.%s" % module_name)
+        sys.modules["maya_tools.utils.%s" % module_name] = module
+
+    return cmds, sys.modules["maya_tools.utils.pose_library_utils"]
+
+
+def build_open_maya(cmds):
+    """
+    Builds the small slice of maya.api.OpenMaya the pose library uses, reading from the
+    same plug dictionary as the stand-in cmds. API reads are in-process in Maya, so they
+    don't burn the per-command cost.
+
+    Like in Maya, rotates are angle attributes the API reads and writes in radians while
+    cmds and the pose files use degrees. Translates are distances, in centimeters both
+    ways.
+
+    :param cmds: The stand-in cmds module the plugs live in.
+    :type: StandInCmds
+
+    :return: The stand-in OpenMaya module.
+    :type: module
+    """
+    open_maya = types.ModuleType("maya.api.OpenMaya")
+
+    # Degrees per radian, what an angle's internal value is multiplied by for the UI.
+    angle_scale = 180.0 / math.pi
+
+    class MFn(object):
+        kUnitAttribute = 1
+
+    class MFnUnitAttribute(object):
+        kAngle = 1
+        kDistance = 2
+
+        def __init__(self, mobj):
+            self._unit_type = mobj.unit_type
+
+        def unitType(self):
+            return self._unit_type
+
+    class MObject(object):
+        __slots__ = ("unit_type",)
+
+        def __init__(self, unit_type=None):
+            self.unit_type = unit_type
+
+        def hasFn(self, fn_type):
+            return fn_type == MFn.kUnitAttribute and self.unit_type is not None
+
+    class MPlug(object):
+        __slots__ = ("name", "unit_type", "scale")
+
+        def __init__(self, name):
+            self.name = name
+
+            # The unit comes from the attribute's name, rotateX or translateX.
+            attr = name.rsplit(".", 1)[-1]
+            self.unit_type = None
+            self.scale = 1.0
+            if attr.startswith("rotate"):
+                self.unit_type = MFnUnitAttribute.kAngle
+                self.scale = angle_scale
+            elif attr.startswith("translate"):
+                self.unit_type = MFnUnitAttribute.kDistance
+
+        def attribute(self):
+            return MObject(self.unit_type)
+
+        def asDouble(self):
+            return float(cmds.plugs[self.name]) / self.scale
+
+        @property
+        def isLocked(self):
+            return False
+
+        @property
+        def isDestination(self):
+            return False
+
+    class MDGModifier(object):
+        # doIt is one call into Maya however many plugs it sets.
+        def __init__(self):
+            self._values = []
+
+        def newPlugValueDouble(self, plug, value):
+            self._values.append((plug.name, float(value) * plug.scale))
+
+        def doIt(self):
+            cmds._cost()
+            for name, value in self._values:
+                if name not in cmds.plugs:
+                    raise RuntimeError("(kInvalidParameter): Object does not exist")
+            for name, value in self._values:
+                cmds.plugs[name] = value
+
+    class MSelectionList(object):
+        def __init__(self):
+            self._items = []
+
+        def add(self, name):
+            if name not in cmds.plugs and name not in cmds.nodes:
+                raise RuntimeError("(kInvalidParameter): Object does not exist")
+            self._items.append(name)
+            return self
+
+        def length(self):
+            return len(self._items)
+
+        def getPlug(self, index):
+            return MPlug(self._items[index])
+
+    class MAngle(object):
+        # Radians in, degrees in the UI.
+        def __init__(self, value=0.0):
+            self.value = value
+
+        @staticmethod
+        def uiUnit():
+            return "degrees"
+
+        def asUnits(self, unit):
+            return self.value * angle_scale if unit == "degrees" else self.value
+
+    class MDistance(object):
+        # Centimeters in and out.
+        def __init__(self, value=0.0):
+            self.value = value
+
+        @staticmethod
+        def uiUnit():
+            return "centimeters"
+
+        def asUnits(self, unit):
+            return self.value
+
+    open_maya.MObject = MObject
+    open_maya.MPlug = MPlug
+    open_maya.MDGModifier = MDGModifier
+    open_maya.MSelectionList = MSelectionList
+    open_maya.MAngle = MAngle
+    open_maya.MDistance = MDistance
+    open_maya.MFn = MFn
+    open_maya.MFnUnitAttribute = MFnUnitAttribute
+
+    return open_maya
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class AutoVivification(dict):
+    """
+    Same behavior as gen_utils.utils.AutoVivification, missing keys make new dicts.
+    """
+    def __getitem__(self, item):
+        try:
+            return dict.__getitem__(self, item)
+        except KeyError:
+            value = self[item] = type(self)()
+            return value
+
+
+class StandInIO(object):
+    """
+    Quiet stand-in for the IO and IOM message classes.
+    """
+    messages = []
+
+    @classmethod
+    def _log(cls, level, message):
+        cls.messages.append((level, message))
+
+    @classmethod
+    def error(cls, message):
+        cls._log("error", message)
+
+    @classmethod
+    def warning(cls, message):
+        cls._log("warning", message)
+
+    @classmethod
+    def success(cls, message):
+        cls._log("success", message)
+
+    @classmethod
+    def info(cls, message):
+        cls._log("info", message)
+
+
+class StandInRef(object):
+    """
+    Stand-in for the pipeline's referenced asset data.
+    """
+    def __init__(self, name, asset_ns):
+        self.name = name
+        self.asset_ns = asset_ns
+
+
+class StandInContext(object):
+    """
+    Stand-in for the pipeline context, resolving the tool directories to a local dir.
+    """
+    def __init__(self, root=None, refs=None):
+        self.root = root
+        self.refs = refs or []
+
+    def eval_path(self, formula=None, **kwargs):
+        if formula == "pr_project_tools_data_dir":
+            return "%s/data" % self.root
+        return "%s/imgs" % self.root
+
+
+class StandInCmds(types.ModuleType):
+    """
+    Dictionary backed stand-in for maya.cmds. Plugs are "ns:ctrl.attr" keys.
+    """
+    def __init__(self, call_cost=0.0):
+        super(StandInCmds, self).__init__("maya.cmds")
+        self.call_cost = call_cost
+        self.plugs = {}
+        self.defaults = {}
+        self.nodes = {}
+        self.selection = []
+        self.keys = {}
+        self.calls = 0
+        self.undo_depth = 0
+
+    def _cost(self):
+        self.calls += 1
+        if self.call_cost:
+            end = time.perf_counter() + self.call_cost
+            while time.perf_counter() < end:
+                pass
+
+    def add_control(self, node, attrs, defaults=None):
+        """
+        Adds a control with {attr: value} keyable attributes to the fake scene. The
+        attributes default to 0, or 1 for scales, unless {attr: default} says otherwise.
+        """
+        defaults = defaults or {}
+        self.nodes[node] = list(attrs)
+        for attr, value in attrs.items():
+            plug = "%s.%s" % (node, attr)
+            self.plugs[plug] = float(value)
+            default = 1.0 if attr.startswith("scale") else 0.0
+            self.defaults[plug] = float(defaults.get(attr, default))
+
+    def attributeQuery(self, attr, node=None, listDefault=False, **kwargs):
+        self._cost()
+        plug = "%s.%s" % (node, attr)
+        if plug not in self.plugs:
+            raise RuntimeError("No object matches name: %s" % plug)
+        return [self.defaults[plug]]
+
+    def objExists(self, name):
+        self._cost()
+        return name in self.nodes or name in self.plugs
+
+    def getAttr(self, plug, **kwargs):
+        self._cost()
+        try:
+            return self.plugs[plug]
+        except KeyError:
+            raise ValueError("No object matches name: %s" % plug)
+
+    def setAttr(self, plug, value, **kwargs):
+        self._cost()
+        if plug not in self.plugs:
+            raise RuntimeError("No object matches name: %s" % plug)
+        self.plugs[plug] = value
+
+    def setKeyframe(self, plugs, time=None, value=None, **kwargs):
+        self._cost()
+        if isinstance(plugs, str):
+            plugs = [plugs]
+        for plug in plugs:
+            if plug not in self.plugs:
+                raise RuntimeError("No object matches name: %s" % plug)
+        # One (start, end) range, or a list of them like Maya's multi-use flag.
+        ranges = [time] if isinstance(time, tuple) else time
+        for plug in plugs:
+            for start, end in ranges:
+                self.keys.setdefault(plug, {})[start] = value
+
+    def listAttr(self, node, keyable=False, **kwargs):
+        self._cost()
+        return list(self.nodes.get(node, []))
+
+    def ls(self, selection=False, **kwargs):
+        self._cost()
+        return list(self.selection)
+
+    def select(self, items=None, add=False, clear=False, **kwargs):
+        self._cost()
+        if clear or not add:
+            self.selection = []
+        if items:
+            if isinstance(items, str):
+                items = [items]
+            self.selection.extend(items)
+
+    def undoInfo(self, openChunk=False, closeChunk=False, **kwargs):
+        self._cost()
+        if openChunk:
+            self.undo_depth += 1
+        if closeChunk:
+            self.undo_depth -= 1
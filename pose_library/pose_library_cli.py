@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Command line maintenance for a pose library, without Maya.
+
+:description:
+    Works on a pose library's data and imgs directories, the same layout the tool reads
+    and writes. Pose files are parsed across a pool of processes, so the overnight jobs
+    can get through a library of tens of thousands of poses.
+
+    reindex   Lists the data directory again and rewrites the manifest.
+    validate  Checks every pose parses, has values and has a thumbnail.
+    convert   Converts the pose files to XML or binary.
+    orphans   Finds thumbnails without a pose, poses without a thumbnail and blobs in
+              the store nothing references anymore.
+    dedupe    Finds poses of a character with the same contents. Poses without a
+              character, from --chars or the manifest, are skipped.
+    stats     Counts the poses, formats, sizes and controls per character.
+    migrate   Moves the library into the content-addressed store.
+    shard     Moves the library into a directory per character, with hashed buckets
+              for characters with more than --bucket-poses poses.
+
+    python pose_library_cli.py validate --data //share/data --imgs //share/imgs
+    python pose_library_cli.py dedupe --data ... --imgs ... --chars octoNinja Tom --json
+    python pose_library_cli.py shard --data ... --imgs ... --chars octoNinja Tom
+
+:applications:
+    None, runs in plain Python.
+
+:see_also:
+    pose_library_io
+    pose_library_utils.PoseLibraryUtil
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+
+# External. The io module ships next to this one. Run with -m or from the pipeline it's
+# in the same package, run as a script it's in the script's directory. The pipeline's
+# copy is the last resort, so the tool runs outside the pipeline too.
+if __package__:
+    from .pose_library_io import BIN_EXT, BUCKET_POSES, FORMAT_RANK, LIBRARY_EXTS, \
+                                 POSE_EXTS, REF_EXT, migrate_to_store, pose_ext, \
+                                 read_pose, shard_library, store_dir, write_pose, \
+                                 CharacterMatcher, PoseLayout, PoseStore
+else:
+    try:
+        from pose_library_io import BIN_EXT, BUCKET_POSES, FORMAT_RANK, LIBRARY_EXTS, \
+                                    POSE_EXTS, REF_EXT, migrate_to_store, pose_ext, \
+                                    read_pose, shard_library, store_dir, write_pose, \
+                                    CharacterMatcher, PoseLayout, PoseStore
+    except ImportError:
+        from maya_tools.utils.pose_library_io import BIN_EXT, BUCKET_POSES, \
+                        FORMAT_RANK, LIBRARY_EXTS, POSE_EXTS, REF_EXT, migrate_to_store, \
+                        pose_ext, read_pose, shard_library, store_dir, write_pose, \
+                        CharacterMatcher, PoseLayout, PoseStore
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def scan_pose(data_path):
+    """
+    Parses one pose file and sums it up. Runs in the worker processes.
+
+    :param data_path: The full path to a pose file.
+    :type: str
+
+    :return: The file's path, if it parsed, its size, control and value counts, if it's
+             sparse, and a digest of its contents.
+    :type: dict
+    """
+    result = {"data": data_path, "ok": False, "size": 0, "controls": 0, "values": 0,
+              "sparse": False, "digest": None, "seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        result["size"] = os.path.getsize(data_path)
+    except OSError:
+        return result
+
+    pose_data = read_pose(data_path)
+    result["seconds"] = time.perf_counter() - start
+    if pose_data is None:
+        return result
+
+    # Hashed the way the store hashes a pose, sorted and rounded to the XML's 3
+    # decimals, so an XML pose matches its binary copy whatever order it was saved in.
+    # A sparse pose only matches another sparse pose, the flag is in the bytes.
+    digest = hashlib.sha1(PoseStore.normalize(pose_data).to_bytes())
+
+    result["ok"] = True
+    result["controls"] = len(pose_data.controls)
+    result["values"] = len(pose_data.values)
+    result["sparse"] = pose_data.sparse
+    result["digest"] = digest.hexdigest()
+    pose_data.release()
+    return result
+
+
+def convert_pose(args):
+    """
+    Converts one pose file to another format. Runs in the worker processes.
+
+    :param args: The source path, the extension to convert to and whether to delete
+                 the source after.
+    :type: tuple
+
+    :return: The path written, or None if nothing was.
+    :type: str
+    """
+    src_path, to_ext, remove_source = args
+    dest_path = "%s.%s" % (os.path.splitext(src_path)[0], to_ext)
+    if os.path.isfile(dest_path):
+        return None
+
+    pose_data = read_pose(src_path)
+    if pose_data is None:
+        return None
+    write_pose(pose_data, dest_path)
+    pose_data.release()
+
+    if remove_source:
+        try:
+            os.remove(src_path)
+        except OSError:
+            pass
+
+    return dest_path
+
+
+def run_pool(func, items, jobs):
+    """
+    Maps a function over the items across a pool of processes, or in this process if
+    there's only one job.
+
+    :param func: A module level function, so it can be sent to the workers.
+    :type: function
+
+    :param items: What to map over.
+    :type: list
+
+    :param jobs: The number of processes.
+    :type: int
+
+    :return: The results, in the same order as the items.
+    :type: list
+    """
+    if jobs <= 1 or len(items) < 2:
+        return [func(x) for x in items]
+
+    # Big chunks keep the back and forth between processes down on big libraries.
+    chunk_size = max(1, min(256, len(items) // (jobs * 4)))
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(func, items, chunk_size)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def list_poses(manifest, matcher=None):
+    """
+    Lists the library's poses the way find_poses does. When a pose has more than one
+    format the reference wins over the binary file over the XML, and the thumbnail is
+    the one the manifest has for the winning file.
+
+    :param manifest: The library's manifest.
+    :type: PoseManifest or ShardedManifest
+
+    :param matcher: Matches file names to characters. Without it, the characters saved
+                    in the manifest are used.
+    :type: CharacterMatcher
+
+    :return: {base_name: {"char": str, "pose": str, "data": str, "img": str,
+                          "stored": bool, "variants": [str]}}
+    :type: OrderedDict
+    """
+    poses = OrderedDict()
+    entries = manifest.load()
+    for file_name in sorted(entries):
+        record = entries[file_name]
+        base_name = os.path.splitext(file_name)[0]
+        if matcher is not None:
+            char, pose = matcher.split(file_name)
+        else:
+            char, pose = record.get("char"), record.get("pose")
+
+        found = poses.get(base_name)
+        if found is None:
+            found = poses[base_name] = {"char": char,
+                                        "pose": pose or base_name,
+                                        "data": record["data"],
+                                        "img": record["img"],
+                                        "stored": False,
+                                        "variants": []}
+        found["variants"].append(record["data"])
+        if FORMAT_RANK[pose_ext(file_name)] > FORMAT_RANK[pose_ext(found["data"])]:
+            found["data"] = record["data"]
+            found["img"] = record["img"]
+        found["stored"] = pose_ext(found["data"]) == REF_EXT
+
+    return poses
+
+
+def cmd_reindex(args, manifest, matcher):
+    manifest.rebuild()
+
+    # Save the characters with the records, so later runs don't need --chars.
+    if matcher is not None:
+        for file_name, record in manifest.entries.items():
+            record["char"], record["pose"] = matcher.split(file_name)
+        manifest.save()
+
+    return {"files": len(manifest.entries),
+            "matched": sum(1 for x in manifest.entries.values() if x.get("char"))}
+
+
+def cmd_validate(args, manifest, matcher):
+    poses = list_poses(manifest, matcher)
+    data_paths = [y for x in poses.values() for y in x["variants"]]
+    results = run_pool(scan_pose, data_paths, args.jobs)
+    results = dict((x["data"], x) for x in results)
+
+    problems = []
+    for base_name, found in poses.items():
+        for data_path in found["variants"]:
+            result = results[data_path]
+            if not result["ok"]:
+                problems.append((data_path, "does not parse"))
+            elif not result["values"]:
+                problems.append((data_path, "has no values"))
+        if not os.path.isfile(found["img"]):
+            problems.append((found["data"], "has no thumbnail"))
+        if matcher is not None and found["char"] is None:
+            problems.append((found["data"], "doesn't match a character"))
+
+    return {"poses": len(poses), "files": len(data_paths),
+            "problems": [{"file": x, "problem": y} for x, y in problems]}
+
+
+def cmd_convert(args, manifest, matcher):
+    to_ext = args.to
+    src_paths = [x["data"] for x in manifest.load().values() \
+                                        if pose_ext(x["data"]) not in (to_ext, REF_EXT)]
+    converted = run_pool(convert_pose,
+                         [(x, to_ext, args.remove_source) for x in src_paths], args.jobs)
+    converted = [x for x in converted if x]
+
+    # The converted files changed the directory, pick them up in the manifest.
+    manifest.revalidate()
+    return {"converted": len(converted), "skipped": len(src_paths) - len(converted)}
+
+
+def cmd_orphans(args, manifest, matcher):
+    poses = list_poses(manifest, matcher)
+    imgs = set(x["img"] for x in poses.values())
+
+    # Every directory a thumbnail can be in, the shards and buckets of a sharded one.
+    orphan_imgs = []
+    for _, imgs_dir in manifest.leaf_dirs():
+        try:
+            img_names = sorted(os.listdir(imgs_dir))
+        except OSError:
+            img_names = []
+        for img_name in img_names:
+            img_path = "%s/%s" % (imgs_dir, img_name)
+            if img_name.lower().endswith(".png") and img_path not in imgs:
+                orphan_imgs.append(img_path)
+
+    missing_imgs = [x["data"] for x in poses.values() if not os.path.isfile(x["img"])]
+
+    # Blobs left behind by a delete that didn't get to finish, or by someone else's
+    # reference that was rewritten before we saw it.
+    store = PoseStore(store_dir(manifest.data_dir))
+    orphan_blobs = [store.blob_path(x, y) for x, y in store.iter_blobs() \
+                                                        if not manifest.references(x)]
+
+    if args.delete:
+        for file_path in orphan_imgs + orphan_blobs:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    return {"orphan_thumbnails": orphan_imgs, "poses_without_thumbnails": missing_imgs,
+            "orphan_blobs": orphan_blobs,
+            "deleted": len(orphan_imgs) + len(orphan_blobs) if args.delete else 0}
+
+
+def cmd_dedupe(args, manifest, matcher):
+    poses = list_poses(manifest, matcher)
+    results = run_pool(scan_pose, [x["data"] for x in poses.values()], args.jobs)
+
+    # Only poses of the same character are duplicates, other rigs share control names.
+    # A pose we can't tell the character of is left out, files the tool didn't write
+    # have no character in the manifest without --chars.
+    groups = OrderedDict()
+    unmatched = []
+    for found, result in zip(poses.values(), results):
+        if not result["ok"]:
+            continue
+        if found["char"] is None:
+            unmatched.append(found["data"])
+            continue
+        groups.setdefault((found["char"], result["digest"]), []).append(found)
+    duplicates = [x for x in groups.values() if len(x) > 1]
+
+    # Keep the first pose of each group, the rest go with their thumbnails. Stored
+    # thumbnails can be shared, orphans cleans those up once nothing uses them.
+    deleted = 0
+    if args.delete:
+        for group in duplicates:
+            for found in group[1:]:
+                img_paths = [] if found["stored"] else [found["img"]]
+                for file_path in found["variants"] + img_paths:
+                    try:
+                        os.remove(file_path)
+                        deleted += 1
+                    except OSError:
+                        pass
+        manifest.revalidate()
+
+    return {"groups": [[x["data"] for x in y] for y in duplicates],
+            "duplicates": sum(len(x) - 1 for x in duplicates),
+            "unmatched": unmatched,
+            "deleted": deleted}
+
+
+def cmd_stats(args, manifest, matcher):
+    poses = list_poses(manifest, matcher)
+    data_paths = [y for x in poses.values() for y in x["variants"]]
+    start = time.perf_counter()
+    results = run_pool(scan_pose, data_paths, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    formats = dict((x, 0) for x in LIBRARY_EXTS)
+    chars = {}
+    for result in results:
+        formats[pose_ext(result["data"])] += 1
+    results = dict((x["data"], x) for x in results)
+    for found in poses.values():
+        result = results[found["data"]]
+        char_stats = chars.setdefault(found["char"] or "?",
+                                      {"poses": 0, "bytes": 0, "controls": 0,
+                                       "values": 0, "unreadable": 0})
+        char_stats["poses"] += 1
+        char_stats["bytes"] += result["size"]
+        char_stats["controls"] += result["controls"]
+        char_stats["values"] += result["values"]
+        char_stats["unreadable"] += 0 if result["ok"] else 1
+
+    return {"poses": len(poses), "files": len(data_paths), "formats": formats,
+            "characters": chars, "parse_seconds": elapsed,
+            "parse_seconds_per_file": sum(x["seconds"] for x in results.values()) / \
+                                                                max(1, len(results))}
+
+
+def cmd_migrate(args, manifest, matcher):
+    stats = migrate_to_store(manifest.data_dir, manifest.imgs_dir,
+                             not args.keep_source, manifest.leaf_dirs())
+    manifest.rebuild()
+    return stats
+
+
+def cmd_shard(args, manifest, matcher):
+    # Without --chars, use the characters reindex saved with the records.
+    chars = args.chars or sorted(set(x["char"] for x in manifest.load().values() \
+                                                                    if x.get("char")))
+    if not chars:
+        sys.exit("shard needs --chars, or a reindex with --chars first.")
+    stats = shard_library(manifest.data_dir, manifest.imgs_dir, chars,
+                          args.bucket_poses or None)
+
+    # Build every shard's manifest now, so the first scene to open doesn't list them.
+    layout = PoseLayout(manifest.data_dir, manifest.imgs_dir)
+    stats["indexed"] = len(layout.manifest().rebuild())
+    return stats
+
+
+COMMANDS = OrderedDict([("reindex", cmd_reindex),
+                        ("validate", cmd_validate),
+                        ("convert", cmd_convert),
+                        ("orphans", cmd_orphans),
+                        ("dedupe", cmd_dedupe),
+                        ("stats", cmd_stats),
+                        ("migrate", cmd_migrate),
+                        ("shard", cmd_shard)])
+
+
+def print_report(command, report):
+    """
+    Prints a report for people to read, one line per value or problem.
+    """
+    print("%s:" % command)
+    for key, value in report.items():
+        if isinstance(value, list):
+            print("  %s: %d" % (key, len(value)))
+            for item in value:
+                print("    %s" % (item if not isinstance(item, dict) else \
+                                  "%s %s" % (item["file"], item["problem"])))
+        elif isinstance(value, dict):
+            print("  %s:" % key)
+            for sub_key, sub_value in sorted(value.items()):
+                print("    %s: %s" % (sub_key, sub_value))
+        else:
+            print("  %s: %s" % (key, value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pose library maintenance.")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--data", required=True, help="The pose data directory.")
+    parser.add_argument("--imgs", required=True, help="The pose thumbnail directory.")
+    parser.add_argument("--chars", nargs="*",
+                        help="The character names, to match files to characters like "
+                             "the tool does. Uses the manifest's characters if not set.")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="Processes to parse with, 1 parses in this process.")
+    parser.add_argument("--to", choices=POSE_EXTS, default=BIN_EXT,
+                        help="The format convert converts to.")
+    parser.add_argument("--remove-source", action="store_true",
+                        help="Delete the original files after converting them.")
+    parser.add_argument("--keep-source", action="store_true",
+                        help="Keep the pose files and thumbnails migrate moved.")
+    parser.add_argument("--bucket-poses", type=int, default=BUCKET_POSES,
+                        help="Characters with more poses than this get hashed buckets "
+                             "when sharded, 0 to never bucket.")
+    parser.add_argument("--delete", action="store_true",
+                        help="Delete the orphaned thumbnails or the duplicate poses.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.normpath(args.data).replace("\\", "/")
+    imgs_dir = os.path.normpath(args.imgs).replace("\\", "/")
+    if not os.path.isdir(data_dir):
+        parser.error("The data directory \"%s\" doesn't exist." % data_dir)
+
+    # A sharded library reads every character's shard.
+    manifest = PoseLayout(data_dir, imgs_dir).manifest()
+    matcher = CharacterMatcher(args.chars) if args.chars else None
+    report = COMMANDS[args.command](args, manifest, matcher)
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print_report(args.command, report)
+
+    # Validation failing should fail the overnight job.
+    if args.command == "validate" and report["problems"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
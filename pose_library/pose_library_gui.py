@@ -26,17 +26,70 @@
 
 # Default Python Imports
 from PySide2 import QtGui, QtCore, QtWidgets
+import hashlib
+import json
 import os
+import struct
+import threading
+from collections import OrderedDict
 
 # External
 from maya_tools.guis.maya_gui_utils import get_maya_window
 from maya_tools.utils.maya_utils import get_maya_pipe_context, IOM
 from maya_tools.guis.maya_guis import ConfirmDialog
 from maya_tools.utils.pose_library_utils import PoseLibraryUtil
+from maya_tools.utils.pose_library_io import file_stamp
+from maya_tools.utils.pose_library_trace import TRACER, traced
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+ATLAS_MAGIC = b"PLTA"
+ATLAS_FOOTER = struct.Struct("<QI4s")
 
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+def load_thumbnail(image_path, size=100):
+    """
+    Reads an image and scales it down to fit in a thumbnail. Safe on worker threads.
+
+    :param image_path: The path to the image on disk.
+    :type: str
+
+    :param size: The thumbnail's width and height.
+    :type: int
+
+    :return: The thumbnail, or None if the image couldn't be read.
+    :type: QtGui.QImage
+    """
+    image = QtGui.QImage(image_path)
+    if image.isNull():
+        return None
+
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, QtCore.Qt.KeepAspectRatio,
+                             QtCore.Qt.SmoothTransformation)
+    return image
+
+
+def encode_png(image):
+    """
+    Encodes an image as PNG bytes. Safe on worker threads.
+
+    :param image: The image to encode.
+    :type: QtGui.QImage
+
+    :return: The PNG file's bytes.
+    :type: bytes
+    """
+    byte_array = QtCore.QByteArray()
+    buffer = QtCore.QBuffer(byte_array)
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(byte_array.data())
+
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
 
@@ -44,7 +97,8 @@ class PoseLibraryGUI(QtWidgets.QDialog):
     """
     Class for the GUI.
     """
-    def __init__(self, context=None):
+    def __init__(self, context=None, thumbnail_threads=4, thumb_cache_dir=None,
+                 browser_threshold=200):
         QtWidgets.QDialog.__init__(self, parent=get_maya_window())
 
         self.context = context
@@ -53,7 +107,22 @@ class PoseLibraryGUI(QtWidgets.QDialog):
 
         self.flow_layout = None
 
+        # Characters with more poses than the threshold are shown in the pose view,
+        # which only paints the poses that are on screen, instead of a widget per pose
+        # in the flow layout.
+        self.browser_threshold = browser_threshold
+
+        # How many poses Find Similar shows.
+        self.similar_count = 12
+        self.browser_stack = None
+        self.pose_view = None
+        self.pose_model = None
+        self.use_pose_view = False
+
         self.char_cb             = None
+        self.ns_list             = None
+        self.blend_slider        = None
+        self.selected_pose       = None
         self.selected_wrapper    = None
         self.selected_widget     = None
         self.selected_img_widget = None
@@ -63,18 +132,62 @@ class PoseLibraryGUI(QtWidgets.QDialog):
 
         self.util = PoseLibraryUtil(self.context)
 
+        # Thumbnails are decoded on worker threads, the labels show the pose's name
+        # until their image is ready. Downscaled copies are kept in a local cache, so
+        # the network share is only read again for thumbnails that changed.
+        self.thumb_cache = ThumbnailCache(thumb_cache_dir)
+        self.thumb_loader = ThumbnailLoader(thumbnail_threads, cache=self.thumb_cache,
+                                            parent=self)
+        self.thumb_loader.loaded.connect(self.thumbnail_loaded)
+
+        # {pose: (wrapper, title_label, img_label)} for the poses in the flow layout, so
+        # a click finds its widgets without searching the layout.
+        self.pose_widgets = {}
+
+        # Watches the library for poses other animators add, delete or change.
+        self.library_watcher = None
+
+        # Lists the library on a worker thread while the dialog is already up.
+        self.library_scanner = None
+        self.scan_bar = None
+        self.scan_label = None
+        self.scanned_files = 0
+
+        # Writes the cache's atlases once the thumbnails settle down.
+        self.thumb_flush_timer = QtCore.QTimer(self)
+        self.thumb_flush_timer.setSingleShot(True)
+        self.thumb_flush_timer.setInterval(2000)
+        self.thumb_flush_timer.timeout.connect(self.thumb_cache.flush)
+
+        # Hovering a pose previews it on the rig. Leaving it puts the rig back after a
+        # moment, so moving straight onto the next pose only changes what differs.
+        self.preview_cb = None
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(80)
+        self.preview_timer.timeout.connect(self.util.end_preview)
+
 
     def init_gui(self):
         """
         Builds the GUI the user will use. The tool will not show if there aren't any
         rigs referenced in the current file.
         """
-        # Gather the info for the util object.
-        self.util.gather_info()
+        # Gather the info for the util object. The poses are found on a worker thread
+        # once the dialog is up, a slow share would keep it from showing otherwise.
+        self.util.gather_info(scan=False)
+        self.thumb_cache.set_library(self.util.proj_imgs_path)
 
-        # The main hb and add the scroll area and selection layout.
+        # The main hb and add the scroll area and selection layout. The scroll area and
+        # the pose view share a spot, only one is shown depending on the pose count.
         main_hb = QtWidgets.QHBoxLayout(self)
-        main_hb.addWidget(self.create_scroll_area())
+        browser_vb = QtWidgets.QVBoxLayout()
+        self.browser_stack = QtWidgets.QStackedWidget()
+        self.browser_stack.addWidget(self.create_scroll_area())
+        self.browser_stack.addWidget(self.create_pose_view())
+        browser_vb.addWidget(self.browser_stack)
+        browser_vb.addLayout(self.create_scan_progress())
+        main_hb.addLayout(browser_vb)
         main_hb.addLayout(self.create_selection_menu())
 
         # Add the referenced rigs to the character combobox.
@@ -89,6 +202,105 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         self.setMinimumSize(500, 325)
         self.show()
 
+        # Find the poses in the background, they show up as they're found.
+        self.start_scan()
+
+
+    def create_scan_progress(self):
+        """
+        Creates the progress shown while the library is being scanned.
+
+        :return: A horizontal box layout.
+        :type: QtWidgets.QHBoxLayout
+        """
+        scan_hb = QtWidgets.QHBoxLayout()
+        self.scan_label = QtWidgets.QLabel("Scanning the pose library...")
+        self.scan_bar = QtWidgets.QProgressBar()
+        self.scan_bar.setMaximumHeight(10)
+        self.scan_bar.setTextVisible(False)
+
+        # We don't know how many files there are until the listing is done.
+        self.scan_bar.setRange(0, 0)
+        scan_hb.addWidget(self.scan_label)
+        scan_hb.addWidget(self.scan_bar)
+        self.scan_label.hide()
+        self.scan_bar.hide()
+
+        return scan_hb
+
+
+    def start_scan(self):
+        """
+        Starts finding the poses on a worker thread.
+        """
+        if not self.util.proj_data_path:
+            return None
+
+        self.scanned_files = 0
+        self.scan_label.setText("Scanning the pose library...")
+        self.scan_label.show()
+        self.scan_bar.show()
+
+        self.library_scanner = LibraryScanner(self.util, parent=self)
+        self.library_scanner.chunkFound.connect(self.scan_chunk_found)
+        self.library_scanner.scanDone.connect(self.scan_done)
+        self.library_scanner.start()
+
+
+    def scan_chunk_found(self, chunk):
+        """
+        Adds a chunk of pose files from the scan, showing the ones for the current
+        character right away.
+
+        :param chunk: (file_name, record) for the pose files found.
+        :type: list
+        """
+        added = self.util.add_scanned(chunk)
+        self.scanned_files += len(chunk)
+        self.scan_label.setText("Scanning the pose library... %d files" % \
+                                                                    self.scanned_files)
+
+        char = self.curr_char
+        new_poses = [x[1] for x in added if x[0] == char]
+        if char is None or not new_poses:
+            return None
+
+        # The character's first poses, or the character just got big enough for the
+        # pose view, lay out the whole character again.
+        char_poses = len(self.util.pose_paths[char])
+        if char_poses == len(new_poses) or \
+                        (not self.use_pose_view and char_poses > self.browser_threshold):
+            self.clear_scroll_area()
+            self.populate_scroll_area()
+            return None
+
+        for pose in new_poses:
+            self.create_pose_display(char, pose)
+
+
+    def scan_done(self, cancelled):
+        """
+        Hides the progress and starts watching the library once the scan is done.
+
+        :param cancelled: If the scan was stopped before it finished.
+        :type: bool
+        """
+        self.scan_label.hide()
+        self.scan_bar.hide()
+        if cancelled:
+            return None
+
+        if not self.util.pose_paths:
+            IOM.warning("This project's pose library is empty.")
+
+        # Start watching the library for changes from other animators. A sharded
+        # library only watches the shards of the characters in the scene.
+        if self.util.manifest is not None and self.library_watcher is None:
+            watch_paths = self.util.manifest.watch_paths()
+            self.library_watcher = LibraryWatcher(watch_paths, parent=self)
+            self.library_watcher.libraryChanged.connect(self.library_changed)
+            self.library_watcher.start()
+
 
     def create_scroll_area(self):
         """
@@ -114,6 +326,41 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         return scroll_area
 
 
+    def create_pose_view(self):
+        """
+        Creates the list view for characters with a lot of poses. It's a list model in
+        icon mode with a delegate painting each pose, so only the visible poses cost
+        anything and the selection lives in the view's selection model.
+
+        :return: The pose view.
+        :type: QtWidgets.QListView
+        """
+        self.pose_model = PoseListModel(self)
+        self.pose_model.thumbnailNeeded.connect(self.pose_thumbnail_needed)
+
+        self.pose_view = QtWidgets.QListView()
+        self.pose_view.setViewMode(QtWidgets.QListView.IconMode)
+        self.pose_view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.pose_view.setMovement(QtWidgets.QListView.Static)
+        self.pose_view.setLayoutMode(QtWidgets.QListView.Batched)
+        self.pose_view.setBatchSize(500)
+        self.pose_view.setUniformItemSizes(True)
+        self.pose_view.setSpacing(4)
+        self.pose_view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.pose_view.setItemDelegate(PoseItemDelegate(parent=self.pose_view))
+        self.pose_view.setModel(self.pose_model)
+        self.pose_view.setMinimumWidth(250)
+        self.pose_view.selectionModel().currentChanged.connect(self.pose_view_clicked)
+
+        # Hover previews, entering empty space or leaving the view ends them.
+        self.pose_view.setMouseTracking(True)
+        self.pose_view.entered.connect(self.pose_view_hovered)
+        self.pose_view.viewportEntered.connect(self.pose_unhovered)
+        self.pose_view.viewport().installEventFilter(self)
+
+        return self.pose_view
+
+
     def create_selection_menu(self):
         """
         Creates the side bar for all the options.
@@ -134,11 +381,63 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         add_btn.clicked.connect(self.add_btn_clicked)
         main_vb.addWidget(add_btn)
 
+        # Show a pose on the rig while hovering over its thumbnail.
+        self.preview_cb = QtWidgets.QCheckBox("Preview on Hover")
+        self.preview_cb.setChecked(True)
+        main_vb.addWidget(self.preview_cb)
+
+        # Save new poses with only what differs from the character's default pose.
+        self.sparse_cb = QtWidgets.QCheckBox("Save Sparse")
+        self.sparse_cb.toggled.connect(self.sparse_cb_toggled)
+        main_vb.addWidget(self.sparse_cb)
+
         # Apply a pose button.
         apply_btn = QtWidgets.QPushButton("Apply")
         apply_btn.clicked.connect(self.apply_btn_clicked)
         main_vb.addWidget(apply_btn)
 
+        # Apply the pose with left and right swapped.
+        mirror_btn = QtWidgets.QPushButton("Apply Mirrored")
+        mirror_btn.clicked.connect(self.mirror_btn_clicked)
+        main_vb.addWidget(mirror_btn)
+
+        # Put back what the last apply changed.
+        revert_btn = QtWidgets.QPushButton("Revert Last Apply")
+        revert_btn.clicked.connect(self.util.revert_pose)
+        main_vb.addWidget(revert_btn)
+
+        # The instances of the character, to apply a pose to several of them at once.
+        self.ns_list = QtWidgets.QListWidget()
+        self.ns_list.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.ns_list.setMaximumHeight(80)
+        main_vb.addWidget(self.ns_list)
+
+        apply_many_btn = QtWidgets.QPushButton("Apply to Selected Rigs")
+        apply_many_btn.clicked.connect(self.apply_many_btn_clicked)
+        main_vb.addWidget(apply_many_btn)
+
+        # Blend toward the selected pose. Dragging previews live, releasing keeps the
+        # blend as one undo.
+        blend_hb = QtWidgets.QHBoxLayout()
+        blend_hb.addWidget(QtWidgets.QLabel("Blend"))
+        self.blend_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.blend_slider.setRange(0, 100)
+        self.blend_slider.sliderPressed.connect(self.blend_slider_pressed)
+        self.blend_slider.valueChanged.connect(self.blend_slider_changed)
+        self.blend_slider.sliderReleased.connect(self.blend_slider_released)
+        blend_hb.addWidget(self.blend_slider)
+        main_vb.addLayout(blend_hb)
+
+        # Show only the poses closest to how the rig is posed, or every pose again.
+        similar_hb = QtWidgets.QHBoxLayout()
+        similar_btn = QtWidgets.QPushButton("Find Similar")
+        similar_btn.clicked.connect(self.similar_btn_clicked)
+        similar_hb.addWidget(similar_btn)
+        show_all_btn = QtWidgets.QPushButton("Show All")
+        show_all_btn.clicked.connect(self.show_all_btn_clicked)
+        similar_hb.addWidget(show_all_btn)
+        main_vb.addLayout(similar_hb)
+
         # Select pose's controls
         pose_ctrl_btn = QtWidgets.QPushButton("Pose Controls")
         pose_ctrl_btn.clicked.connect(self.sel_pose_ctrls)
@@ -171,6 +470,16 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         return main_vb
 
 
+    def sparse_cb_toggled(self, checked):
+        """
+        Turns saving sparse poses on or off.
+
+        :param checked: The checkbox's state.
+        :type: bool
+        """
+        self.util.sparse_poses = bool(checked)
+
+
     def char_changed(self, item):
         """
         Clears the scroll area and populates the character's poses.
@@ -183,6 +492,7 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         if value == "None" or value == "":
             self.clear_scroll_area()
             self.util.change_char()
+            self.ns_list.clear()
             return None
 
         # Clear the scroll area.
@@ -193,7 +503,15 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         self.curr_char_ns = value
         self.util.change_char(self.curr_char, self.curr_char_ns)
 
+        # List the character's instances, with the one from the combo box selected.
+        self.ns_list.clear()
+        for namespace in self.util.match_char_dict.get(self.curr_char, []):
+            ns_item = QtWidgets.QListWidgetItem(namespace)
+            self.ns_list.addItem(ns_item)
+            ns_item.setSelected(namespace == value)
+
         # Set the selected and populate the scroll area with the current character.
+        self.selected_pose = None
         self.selected_wrapper = None
         self.selected_widget = None
         self.selected_img_widget = None
@@ -204,6 +522,21 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         """
         Clears the scroll area by removing all the widgets.
         """
+        # Put back anything previewed on the rig, its widget won't see the mouse leave.
+        self.preview_timer.stop()
+        self.util.end_preview()
+
+        # Stop loading thumbnails for the widgets we're about to remove.
+        self.thumb_loader.cancel()
+        self.pose_widgets = {}
+        self.pose_model.clear()
+
+        # Nothing is selected once the widgets are gone.
+        self.selected_pose = None
+        self.selected_wrapper = None
+        self.selected_widget = None
+        self.selected_img_widget = None
+
         # Remove all the items in reverse order.
         for layout_index in reversed(range(self.flow_layout.count())):
 
@@ -245,9 +578,13 @@ class PoseLibraryGUI(QtWidgets.QDialog):
             return None
 
 
-    def populate_scroll_area(self):
+    @traced("populate_scroll_area")
+    def populate_scroll_area(self, only_poses=None):
         """
         Populates the scroll area with what was found
+
+        :param only_poses: Only show these poses, in this order. Every pose if None.
+        :type: list
         """
         # Get the character from the combo box.
         char = self.curr_char
@@ -257,42 +594,120 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         if pose_paths is None or not char in pose_paths.keys():
             return None
 
-        # Get the characters poses.
+        # Get the characters poses. Big characters go in the pose view, which doesn't
+        # make any widgets per pose.
         poses = pose_paths[char]
+        if only_poses is not None:
+            poses = [x for x in only_poses if x in poses]
+        self.use_pose_view = len(poses) > self.browser_threshold
+        TRACER.add("poses", len(poses))
+        if self.use_pose_view:
+            self.browser_stack.setCurrentWidget(self.pose_view)
+            self.pose_model.set_poses(list(poses))
+            return None
+
+        self.browser_stack.setCurrentIndex(0)
         for pose in poses:
             self.create_pose_display(char, pose)
 
 
-    def item_clicked(self):
+    def item_clicked(self, pose_key):
         """
         Set label and image widgets from what was selected.
+
+        :param pose_key: The pose the clicked label belongs to, sent by the label.
+        :type: str
         """
-        if self.sender():
-            # Using the obj name, we can find out the widget of the label and img.
-            clicked_obj_name = str(self.sender().objectName())
+        # Find the title qlabel, image qlabel, and the wrapper widget.
+        found = self._find_widget(pose_key)
 
-            # Find the title qlabel, image qlabel, and the wrapper widget.
-            qlabel, img_widget, wrapper = self._find_widget(clicked_obj_name)
+        # If we didn't get a qlabel then we don't do anything.
+        if not found:
+            IOM.warning("Can't find a label to set selected for \"%s\"" % pose_key)
+            return None
+        qlabel, img_widget, wrapper = found
 
-            # If we didn't get a qlabel then we don't do anything.
-            if not qlabel:
-                IOM.warning("Can't find a label to set selected" % qlabel)
-                return None
+        # Set the widget before this one to display as unselected.
+        if self.selected_wrapper is not None:
+            self.selected_wrapper.setStyleSheet("background-color: #2B2B2B")
 
-            # If this is the first time selecting anything then set it to the sender.
-            if not self.selected_widget:
-                self.selected_wrapper = wrapper
-                self.selected_widget = qlabel
-                self.selected_img_widget = img_widget
+        # Then set the current widget to display as selected.
+        self.selected_wrapper = wrapper
+        self.selected_widget = qlabel
+        self.selected_img_widget = img_widget
+        self.selected_wrapper.setStyleSheet("background-color: #45733D")
+        self.selected_pose = pose_key
+
+
+    def pose_view_clicked(self, current, previous=None):
+        """
+        Sets the selected pose from the pose view's current index.
+
+        :param current: The model index of the pose selected.
+        :type: QtCore.QModelIndex
+        """
+        if not current.isValid():
+            self.selected_pose = None
+            return None
+
+        self.selected_pose = current.data(QtCore.Qt.UserRole)
 
-            # Set the widget before this one to display as unselected.
-            self.selected_wrapper.setStyleSheet("background-color: #2B2B2B")
 
-            # Then set the current widget to display as selected.
-            self.selected_wrapper = wrapper
-            self.selected_widget = qlabel
-            self.selected_img_widget = img_widget
-            self.selected_wrapper.setStyleSheet("background-color: #45733D")
+    def pose_hovered(self, pose_name):
+        """
+        Previews a pose on the rig while the mouse is over it.
+
+        :param pose_name: The pose under the mouse.
+        :type: str
+        """
+        if not self.preview_cb.isChecked() or not self.curr_char or not pose_name:
+            return None
+
+        # Going straight from one pose to the next doesn't put the rig back in between.
+        self.preview_timer.stop()
+        self.util.preview_pose(pose_name, self.curr_char)
+
+
+    def pose_unhovered(self, pose_name=None):
+        """
+        Puts the rig back shortly after the mouse leaves a pose, unless it lands on
+        another one first.
+        """
+        if self.util.pose_preview is not None:
+            self.preview_timer.start()
+
+
+    def pose_view_hovered(self, index):
+        """
+        Previews the pose under the mouse in the pose view.
+
+        :param index: The model index of the pose under the mouse.
+        :type: QtCore.QModelIndex
+        """
+        if index.isValid():
+            self.pose_hovered(index.data(QtCore.Qt.UserRole))
+
+
+    def eventFilter(self, watched, event):
+        """
+        Ends the hover preview when the mouse leaves the pose view.
+        """
+        if self.pose_view is not None and watched is self.pose_view.viewport() and \
+                                                    event.type() == QtCore.QEvent.Leave:
+            self.pose_unhovered()
+        return QtWidgets.QDialog.eventFilter(self, watched, event)
+
+
+    def pose_thumbnail_needed(self, pose_name):
+        """
+        Loads a thumbnail the pose view is about to paint.
+
+        :param pose_name: The pose the pose view needs a thumbnail for.
+        :type: str
+        """
+        pose_img = self.util.get_pose_paths(pose_name, self.curr_char)[1]
+        if pose_img:
+            self.thumb_loader.request(self.curr_char, pose_name, pose_img)
 
 
     def add_btn_clicked(self):
@@ -311,6 +726,11 @@ class PoseLibraryGUI(QtWidgets.QDialog):
 
         self.util.add_pose(text, char)
 
+        # Add the new thumbnail to the local cache.
+        pose_img = self.util.get_pose_paths(text, char)[1]
+        if pose_img:
+            self.thumb_cache.update(char, text, pose_img)
+
         # Create the GUI element added onto the scroll area.
         self.create_pose_display(char, text)
 
@@ -329,25 +749,32 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         # Check if there is a character or pose name passed in.
         if char is None or pose_name is None:
             return None
+
+        # The pose view only needs the pose added to its model.
+        if self.use_pose_view:
+            self.pose_model.add_pose(pose_name)
+            return None
+
         # The base vb we'll add the inner widgets to.
         add_vb = QtWidgets.QVBoxLayout()
 
-        # If the image already exists, use that, otherwise we just put its name.
+        # Show the pose's name until the thumbnail is loaded on a worker thread. If
+        # there isn't an image the name just stays.
         pose_paths = self.util.pose_paths
         image_path = pose_paths[char][pose_name]["img"]
-        if os.path.exists(image_path):
-            img_lbl = SignalLabel(image=image_path)
-        else:
-            img_lbl = SignalLabel(text="%s" % pose_name)
+        img_lbl = SignalLabel(text="%s" % pose_name, pose_key=pose_name)
+        self.thumb_loader.request(char, pose_name, image_path)
 
         # We distinguish the img and title by adding ".png" to the ObjectName.
         # This is also where we set the minimumHeight.
         img_lbl.setObjectName("%s.png" % pose_name)
         img_lbl.setMinimumHeight(100)
         img_lbl.labelClicked.connect(self.item_clicked)
+        img_lbl.labelEntered.connect(self.pose_hovered)
+        img_lbl.labelLeft.connect(self.pose_unhovered)
 
         # The pose title
-        title_lbl = SignalLabel("%s" % pose_name)
+        title_lbl = SignalLabel("%s" % pose_name, pose_key=pose_name)
         title_lbl.setObjectName("%s" % pose_name)
         title_lbl.labelClicked.connect(self.item_clicked)
 
@@ -361,6 +788,83 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         wrapper_widget.setStyleSheet("background-color: #2B2B2B")
         self.flow_layout.addWidget(wrapper_widget)
 
+        # Index the widgets by the pose so clicks find them right away.
+        self.pose_widgets[pose_name] = (wrapper_widget, title_lbl, img_lbl)
+
+
+    def thumbnail_loaded(self, pose_name, image):
+        """
+        Swaps the placeholder for the thumbnail once a worker has decoded it.
+
+        :param pose_name: The pose the thumbnail is for.
+        :type: str
+
+        :param image: The decoded thumbnail.
+        :type: QtGui.QImage
+        """
+        # A cached thumbnail can be followed by a fresh one if the image changed, so
+        # keep the label around.
+        self.thumb_flush_timer.start()
+        if self.use_pose_view:
+            self.pose_model.set_thumbnail(pose_name, image)
+            return None
+
+        widgets = self.pose_widgets.get(pose_name)
+        if widgets is None:
+            return None
+
+        widgets[2].setPixmap(QtGui.QPixmap.fromImage(image))
+
+
+    @traced("library_changed")
+    def library_changed(self):
+        """
+        Updates just the poses that changed on the network drive, without clearing and
+        rebuilding the scroll area.
+        """
+        delta = self.util.refresh_poses()
+        char = self.curr_char
+        if char is None:
+            return None
+
+        for pose_char, pose in delta["removed"]:
+            if pose_char != char:
+                continue
+            if pose == self.selected_pose:
+                self.selected_pose = None
+            if self.use_pose_view:
+                self.pose_model.remove_pose(pose)
+            else:
+                self.remove_pose_display(pose)
+
+        for pose_char, pose in delta["added"]:
+            if pose_char == char:
+                self.create_pose_display(char, pose)
+
+        # The thumbnail may have changed with the pose, check it again.
+        for pose_char, pose in delta["modified"]:
+            if pose_char == char:
+                pose_img = self.util.pose_paths[char][pose]["img"]
+                self.thumb_loader.request(char, pose, pose_img, check=True)
+
+
+    def closeEvent(self, event):
+        """
+        Stops the scan and any thumbnails still loading when the dialog closes.
+        """
+        if self.library_scanner is not None and self.library_scanner.isRunning():
+            self.library_scanner.cancel()
+            self.library_scanner.wait(2000)
+        if self.library_watcher is not None:
+            self.library_watcher.stop()
+        self.util.end_blend()
+        self.preview_timer.stop()
+        self.util.end_preview()
+        self.thumb_loader.cancel()
+        self.thumb_flush_timer.stop()
+        self.thumb_cache.flush()
+        QtWidgets.QDialog.closeEvent(self, event)
+
 
     def apply_btn_clicked(self):
         """
@@ -368,18 +872,116 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         it.
         """
         # Check if anything is selected first.
-        if not self.selected_widget:
+        if not self.selected_pose:
             IOM.error("Nothing is selected.")
             return None
 
         # Get the character from the combo box.
-        pose_selected = self.selected_widget.objectName()
+        pose_selected = self.selected_pose
         char = self.curr_char
 
         # Try to apply the pose.
         self.util.apply_pose(pose_selected, char)
 
 
+    def mirror_btn_clicked(self):
+        """
+        Applies the mirror image of the selected pose.
+        """
+        if not self.selected_pose:
+            IOM.error("Nothing is selected.")
+            return None
+
+        self.util.apply_pose(self.selected_pose, self.curr_char, mirror=True)
+
+
+    def apply_many_btn_clicked(self):
+        """
+        Applies the selected pose to every instance selected in the namespace list.
+        """
+        if not self.selected_pose:
+            IOM.error("Nothing is selected.")
+            return None
+
+        namespaces = [x.text() for x in self.ns_list.selectedItems()]
+        if not namespaces:
+            IOM.error("No rigs are selected to apply the pose to.")
+            return None
+
+        self.util.apply_pose_to_namespaces(self.selected_pose, self.curr_char,
+                                           namespaces)
+
+
+    def similar_btn_clicked(self):
+        """
+        Shows only the poses closest to how the current rig is posed, closest first.
+        """
+        if not self.curr_char:
+            IOM.error("No character is selected.")
+            return None
+
+        found = self.util.find_similar_poses(self.similar_count)
+        if not found:
+            IOM.warning("No poses to compare with.")
+            return None
+
+        self.clear_scroll_area()
+        self.populate_scroll_area([x[0] for x in found])
+        IOM.success("Closest: %s" % ", ".join("%s (%.2f)" % x for x in found))
+
+
+    def show_all_btn_clicked(self):
+        """
+        Shows every pose of the character again.
+        """
+        self.clear_scroll_area()
+        self.populate_scroll_area()
+
+
+    def blend_slider_pressed(self):
+        """
+        Starts blending from where the rig is toward the selected pose.
+        """
+        if not self.selected_pose:
+            IOM.error("Nothing is selected.")
+            return None
+
+        self.util.begin_blend(self.selected_pose, self.curr_char)
+
+
+    def blend_slider_changed(self, value):
+        """
+        Moves the blend while dragging. Clicking or using the keys on the slider without
+        dragging applies that much of the pose in one go.
+
+        :param value: The slider's value, 0 to 100.
+        :type: int
+        """
+        weight = value / 100.0
+        if self.util.pose_blend is not None:
+            self.util.blend_pose(weight)
+            return None
+
+        if not self.selected_pose or not value:
+            return None
+        self.util.apply_pose_blend(self.selected_pose, self.curr_char, weight)
+        self._reset_blend_slider()
+
+
+    def blend_slider_released(self):
+        """
+        Keeps the blend as one undo and puts the slider back to 0.
+        """
+        self.util.end_blend()
+        self._reset_blend_slider()
+
+
+    def _reset_blend_slider(self):
+        self.blend_slider.blockSignals(True)
+        self.blend_slider.setValue(0)
+        self.blend_slider.blockSignals(False)
+
+
     def update_pose_btn_clicked(self):
         """
         Confirms the change with the user, then updates the pose by updating the XML,
@@ -394,12 +996,12 @@ class PoseLibraryGUI(QtWidgets.QDialog):
             return None
 
         # Ensure there is a selected pose.
-        if not self.selected_widget:
+        if not self.selected_pose:
             IOM.error("There is no selected item.")
             return None
 
         # Get the pose name and use it to find the info in the poses dictionary.
-        pose_selected = self.selected_widget.objectName()
+        pose_selected = self.selected_pose
         if self.overwrite_pose_cb.isChecked() == True:
             self.util.update_pose_data(pose_selected, True)
         else:
@@ -420,12 +1022,12 @@ class PoseLibraryGUI(QtWidgets.QDialog):
             return None
 
         # Ensure there is a selected pose.
-        if not self.selected_widget:
+        if not self.selected_pose:
             IOM.error("There is no selected item.")
             return None
 
         # Get the pose name and use it to find the info in the poses dictionary.
-        pose_selected = self.selected_widget.objectName()
+        pose_selected = self.selected_pose
 
         # Try to update the thumbnail.
         pose_img = self.util.update_thbnail(pose_selected)
@@ -433,44 +1035,56 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         # If we didn't get a valid img path, then don't change the thumbnail.
         if not pose_img:
             return None
-        self.selected_img_widget.setPixmap(pose_img)
 
+        # Replace the cached copy so the next session doesn't show the old one.
+        image = self.thumb_cache.update(self.curr_char, pose_selected, pose_img)
+        self.thumb_cache.flush()
+        if image is None:
+            return None
+        if self.use_pose_view:
+            self.pose_model.set_thumbnail(pose_selected, image)
+        else:
+            self.selected_img_widget.setPixmap(QtGui.QPixmap.fromImage(image))
 
-    def _find_widget(self, obj_name):
+
+    def _find_widget(self, pose_key):
         """
-        Attempts to finds a widget in the layout with the name sent in.
+        Finds the widgets of a pose in the flow layout.
 
-        :param obj_name: The object name we're looking for.
+        :param pose_key: The pose we're looking for.
         :type: str
 
-        :return: The QLabel widget the name is attached to, and the qlabel of the img.
-        :type: QtWidgets.QLabel, QtWidgets.QLabel
+        :return: The QLabel widget of the title, the qlabel of the img, and the wrapper.
+        :type: QtWidgets.QLabel, QtWidgets.QLabel, QtWidgets.QWidget
         """
-        # Start at the flow layout.
-        wrapper = None
-        qlabel = None
-        qlabel_img = None
-        for layout_index in range(self.flow_layout.count()):
-            # Derive the vbox from the widget item and match it with the title of what
-            # was selected.
-            widget_item = self.flow_layout.itemAt(layout_index)
-            curr_widget = widget_item.widget()
-            widget_vb = curr_widget.layout()
+        widgets = self.pose_widgets.get(pose_key)
+        if widgets is None:
+            return None
+
+        wrapper, qlabel, qlabel_img = widgets
+        return qlabel, qlabel_img, wrapper
 
-            # We can get the GUI item's title then test if it is within the obj_name.
-            # So "pose_name.png" will still find the item_title "pose_name".
-            item_title = widget_vb.itemAt(1).widget().text()
-            if item_title in obj_name:
-                # 0 is the img, 1 is the label under.
-                wrapper = curr_widget
-                qlabel = widget_vb.itemAt(1).widget()
-                qlabel_img = widget_vb.itemAt(0).widget()
 
-        # If we didn't get a qlabel then we don't do anything.
-        if not qlabel:
+    def remove_pose_display(self, pose_key):
+        """
+        Removes one pose's widgets from the flow layout.
+
+        :param pose_key: The pose to remove.
+        :type: str
+        """
+        widgets = self.pose_widgets.pop(pose_key, None)
+        if widgets is None:
             return None
 
-        return qlabel, qlabel_img, wrapper
+        wrapper = widgets[0]
+        if wrapper is self.selected_wrapper:
+            self.selected_wrapper = None
+            self.selected_widget = None
+            self.selected_img_widget = None
+
+        self.flow_layout.removeWidget(wrapper)
+        wrapper.setParent(None)
+        wrapper.deleteLater()
 
 
     def del_btn_clicked(self):
@@ -489,18 +1103,20 @@ class PoseLibraryGUI(QtWidgets.QDialog):
             return None
 
         # Ensure there is a selected pose.
-        if not self.selected_widget:
+        if not self.selected_pose:
             IOM.error("There is no selected item.")
             return None
 
         # Get the pose name and use it to find the info in the poses dictionary.
-        pose_selected = self.selected_widget.objectName()
+        pose_selected = self.selected_pose
         self.util.delete_pose(pose_selected)
+        self.selected_pose = None
 
-        # Clear the scroll area then repopulate it.
-        self.clear_scroll_area()
-        self.populate_scroll_area()
-        self.selected_widget = None
+        # Just drop the pose from whichever browser is showing it.
+        if self.use_pose_view:
+            self.pose_model.remove_pose(pose_selected)
+        else:
+            self.remove_pose_display(pose_selected)
 
 
     def sel_pose_ctrls(self):
@@ -508,15 +1124,302 @@ class PoseLibraryGUI(QtWidgets.QDialog):
         Selects the pose's controls.
         """
         # Ensure there is a selected pose.
-        if not self.selected_widget:
+        if not self.selected_pose:
             IOM.error("There is no selected item.")
             return None
 
         # Get the pose name and use it to find the info in the poses dictionary.
-        pose_selected = self.selected_widget.objectName()
+        pose_selected = self.selected_pose
         self.util.select_pose_ctrls(pose_selected)
 
 
+class LibraryScanner(QtCore.QThread):
+    """
+    Lists the pose library on a worker thread and sends the pose files found in chunks.
+    The chunks are added to the util on the GUI thread, the worker only touches the
+    manifest and the directory. The manifest locks its records, so poses added and
+    deleted during the scan are kept.
+    """
+    chunkFound = QtCore.Signal(list)
+    scanDone = QtCore.Signal(bool)
+
+    def __init__(self, util, chunk_size=250, parent=None):
+        super(LibraryScanner, self).__init__(parent)
+
+        self.util = util
+        self.chunk_size = chunk_size
+        self._cancelled = threading.Event()
+
+    def run(self):
+        with TRACER.span("library_scan"):
+            for chunk in self.util.scan_poses(self.chunk_size, self._cancelled.is_set):
+                if self._cancelled.is_set():
+                    break
+                TRACER.add("files", len(chunk))
+                self.chunkFound.emit(chunk)
+
+        self.scanDone.emit(self._cancelled.is_set())
+
+    def cancel(self):
+        """
+        Stops the scan at the next file. The manifest isn't saved for a stopped scan.
+        """
+        self._cancelled.set()
+
+
+class LibraryWatcher(QtCore.QObject):
+    """
+    Watches the pose library for changes. A QFileSystemWatcher catches changes right
+    away where the OS reports them, and polling the paths' modified times catches them
+    on network drives where it doesn't. Changes are debounced, so a bulk copy of poses
+    is one libraryChanged, and a steady stream of changes still fires every max_delay.
+    """
+    libraryChanged = QtCore.Signal()
+
+    def __init__(self, paths, poll_interval=10000, debounce=750, max_delay=5000,
+                 parent=None):
+        super(LibraryWatcher, self).__init__(parent)
+
+        self.paths = list(paths)
+        self.stamps = {}
+
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._changed)
+        self.watcher.fileChanged.connect(self._changed)
+
+        self.debounce_timer = QtCore.QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce)
+        self.debounce_timer.timeout.connect(self._fire)
+
+        self.max_timer = QtCore.QTimer(self)
+        self.max_timer.setSingleShot(True)
+        self.max_timer.setInterval(max_delay)
+        self.max_timer.timeout.connect(self._fire)
+
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def start(self):
+        """
+        Starts watching from the library's current state.
+        """
+        self._watch()
+        self.stamps = self._stamps()
+        self.poll_timer.start()
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.debounce_timer.stop()
+        self.max_timer.stop()
+        watched = self.watcher.files() + self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+
+    def poll(self):
+        """
+        Checks the paths' modified times, for drives the file watcher can't see.
+        """
+        if self._stamps() != self.stamps:
+            self._changed()
+
+    def _changed(self, path=None):
+        # Files replaced on save drop out of the watcher, so add them back.
+        self._watch()
+        self.debounce_timer.start()
+        if not self.max_timer.isActive():
+            self.max_timer.start()
+
+    def _fire(self):
+        self.debounce_timer.stop()
+        self.max_timer.stop()
+        self.stamps = self._stamps()
+        self.libraryChanged.emit()
+
+    def _watch(self):
+        watched = set(self.watcher.files() + self.watcher.directories())
+        for path in self.paths:
+            if path not in watched and os.path.exists(path):
+                self.watcher.addPath(path)
+
+    def _stamps(self):
+        return dict((x, file_stamp(x)) for x in self.paths)
+
+
+class PoseListModel(QtCore.QAbstractListModel):
+    """
+    The poses of one character for the pose view. Thumbnails are asked for only when
+    the view paints a pose, and only the most recently used are held as pixmaps so big
+    characters don't hold every thumbnail in memory.
+    """
+    thumbnailNeeded = QtCore.Signal(str)
+
+    def __init__(self, parent=None, max_thumbs=1000):
+        super(PoseListModel, self).__init__(parent)
+
+        self.poses = []
+        self.rows = {}
+        self.max_thumbs = max_thumbs
+        self.thumbs = OrderedDict()
+        self.requested = set()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.poses)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.poses):
+            return None
+
+        pose_name = self.poses[index.row()]
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole, QtCore.Qt.UserRole):
+            return pose_name
+
+        if role == QtCore.Qt.DecorationRole:
+            pixmap = self.thumbs.get(pose_name)
+            if pixmap is not None:
+                self.thumbs.move_to_end(pose_name)
+            elif pose_name not in self.requested:
+                self.requested.add(pose_name)
+                self.thumbnailNeeded.emit(pose_name)
+            return pixmap
+
+        return None
+
+    def set_poses(self, poses):
+        """
+        Replaces every pose in the model.
+
+        :param poses: The pose names, in display order.
+        :type: list
+        """
+        self.beginResetModel()
+        self.poses = list(poses)
+        self.rows = dict((x, y) for y, x in enumerate(self.poses))
+        self.thumbs = OrderedDict()
+        self.requested = set()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_poses([])
+
+    def add_pose(self, pose_name):
+        """
+        Adds a pose to the end of the model, if it isn't in it already.
+        """
+        if pose_name in self.rows:
+            return None
+
+        row = len(self.poses)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.poses.append(pose_name)
+        self.rows[pose_name] = row
+        self.endInsertRows()
+
+    def remove_pose(self, pose_name):
+        """
+        Removes a pose from the model.
+        """
+        row = self.rows.get(pose_name)
+        if row is None:
+            return None
+
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        self.poses.pop(row)
+        self.rows.pop(pose_name)
+        for index in range(row, len(self.poses)):
+            self.rows[self.poses[index]] = index
+        self.thumbs.pop(pose_name, None)
+        self.requested.discard(pose_name)
+        self.endRemoveRows()
+
+    def set_thumbnail(self, pose_name, image):
+        """
+        Sets a pose's thumbnail and repaints it.
+
+        :param pose_name: The pose the thumbnail is for.
+        :type: str
+
+        :param image: The thumbnail.
+        :type: QtGui.QImage
+        """
+        row = self.rows.get(pose_name)
+        if row is None:
+            return None
+
+        self.thumbs[pose_name] = QtGui.QPixmap.fromImage(image)
+        self.thumbs.move_to_end(pose_name)
+
+        # Past the budget drop the oldest, they're asked for again if scrolled back to.
+        while len(self.thumbs) > self.max_thumbs:
+            old_pose = self.thumbs.popitem(last=False)[0]
+            self.requested.discard(old_pose)
+
+        model_index = self.index(row)
+        self.dataChanged.emit(model_index, model_index, [QtCore.Qt.DecorationRole])
+
+    def index_of(self, pose_name):
+        """
+        Gets the model index of a pose.
+
+        :return: The index, invalid if the pose isn't in the model.
+        :type: QtCore.QModelIndex
+        """
+        row = self.rows.get(pose_name)
+        if row is None:
+            return QtCore.QModelIndex()
+        return self.index(row)
+
+
+class PoseItemDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints a pose in the pose view the same way the flow layout shows one, the
+    thumbnail, or the pose's name until it's loaded, with the title under it.
+    """
+    def __init__(self, size=100, parent=None):
+        super(PoseItemDelegate, self).__init__(parent)
+
+        self.size = size
+        self.color = QtGui.QColor("#2B2B2B")
+        self.selected_color = QtGui.QColor("#45733D")
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(self.size + 10, self.size + 30)
+
+    def paint(self, painter, option, index):
+        painter.save()
+
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.fillRect(rect, self.selected_color)
+        else:
+            painter.fillRect(rect, self.color)
+
+        pose_name = index.data(QtCore.Qt.DisplayRole) or ""
+        img_rect = QtCore.QRect(rect.x() + (rect.width() - self.size) // 2,
+                                rect.y() + 3, self.size, self.size)
+        text_rect = QtCore.QRect(rect.x() + 2, img_rect.bottom() + 2,
+                                 rect.width() - 4, rect.bottom() - img_rect.bottom() - 2)
+        painter.setPen(option.palette.color(QtGui.QPalette.Text))
+
+        pixmap = index.data(QtCore.Qt.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            target = QtCore.QRect(QtCore.QPoint(0, 0), pixmap.size())
+            target.moveCenter(img_rect.center())
+            painter.drawPixmap(target, pixmap)
+        else:
+            painter.drawText(img_rect, QtCore.Qt.AlignCenter | QtCore.Qt.TextWordWrap,
+                             pose_name)
+
+        title = option.fontMetrics.elidedText(pose_name, QtCore.Qt.ElideRight,
+                                              text_rect.width())
+        painter.drawText(text_rect, QtCore.Qt.AlignCenter, title)
+
+        painter.restore()
+
+
 class FlowLayout(QtWidgets.QLayout):
     def __init__(self, parent=None, margin=0, spacing=-1):
         super(FlowLayout, self).__init__(parent)
@@ -615,18 +1518,452 @@ class SignalLabel(QtWidgets.QLabel):
     Child of QLabel to create a signal and shoot it whenever the mouse is pressed. Also
     will handle adding images and the dimensions.
     """
-    labelClicked = QtCore.Signal(str) # can be other types (list, dict, object...)
+    labelClicked = QtCore.Signal(str) # sends the pose key of the label
+    labelEntered = QtCore.Signal(str) # the mouse moved onto the label
+    labelLeft = QtCore.Signal(str)    # the mouse moved off the label
 
-    def __init__(self, text=None, image=None, parent=None):
+    def __init__(self, text=None, image=None, parent=None, pose_key=None):
         super(SignalLabel, self).__init__(parent)
         if text:
             self.setText(text)
         if image:
             self.setPixmap(image)
 
+        # The pose this label shows, sent with every click.
+        self.pose_key = pose_key
+
         self.setFixedWidth(100)
 
     def mousePressEvent(self, event):
-        self.labelClicked.emit("emit the signal")
+        self.labelClicked.emit(self.pose_key or "")
+
+    def enterEvent(self, event):
+        self.labelEntered.emit(self.pose_key or "")
+        super(SignalLabel, self).enterEvent(event)
+
+    def leaveEvent(self, event):
+        self.labelLeft.emit(self.pose_key or "")
+        super(SignalLabel, self).leaveEvent(event)
+
 
+class ThumbnailTask(QtCore.QRunnable):
+    """
+    Decodes one thumbnail on a worker thread. QPixmaps can only be made on the GUI
+    thread, so this makes a QImage and the GUI turns it into a pixmap.
+
+    With a cache, the cached copy is sent and nothing on the share is touched. With
+    check, the cached copy is sent right away and the image on the share is only read
+    if its modified time doesn't match the cached copy's.
+    """
+    def __init__(self, loader, generation, char, pose_name, image_path, size,
+                 check=False):
+        super(ThumbnailTask, self).__init__()
+
+        self.loader = loader
+        self.generation = generation
+        self.char = char
+        self.pose_name = pose_name
+        self.image_path = image_path
+        self.size = size
+        self.check = check
+
+    @traced("thumbnail")
+    def run(self):
+        # Skip anything requested before the last cancel.
+        if self.generation != self.loader.generation:
+            return None
+
+        cache = self.loader.cache
+        cached = None
+        if cache is not None:
+            cached = cache.get(self.char, self.pose_name, self.image_path)
+            if cached is not None:
+                image = QtGui.QImage.fromData(cached[1], "PNG")
+                if image.isNull():
+                    cached = None
+                else:
+                    self.loader.signals.decoded.emit(self.generation, self.pose_name,
+                                                     image)
+
+        # Trust the cached copy unless asked to check it, so a cache hit doesn't stat
+        # the share. Add and update thumbnail refresh the cache themselves.
+        if cached is not None and not self.check:
+            TRACER.add("cache_hits")
+            return None
+
+        try:
+            src_stat = os.stat(self.image_path)
+        except OSError:
+            return None
+        src_mtime = src_stat.st_mtime
+        if cached is not None and cached[0] == src_mtime:
+            TRACER.add("cache_hits")
+            return None
+
+        TRACER.add("bytes_read", src_stat.st_size)
+        image = load_thumbnail(self.image_path, self.size)
+        if image is None:
+            return None
+
+        if cache is not None:
+            cache.put(self.char, self.pose_name, self.image_path, src_mtime,
+                      encode_png(image))
+
+        if self.generation != self.loader.generation:
+            return None
+        self.loader.signals.decoded.emit(self.generation, self.pose_name, image)
+
+
+class ThumbnailSignals(QtCore.QObject):
+    """
+    QRunnables can't have signals, so the tasks emit through this. It lives on the GUI
+    thread, so the connection is queued back onto it.
+    """
+    decoded = QtCore.Signal(int, str, QtGui.QImage)
+
+
+class ThumbnailLoader(QtCore.QObject):
+    """
+    Loads thumbnails on a pool of worker threads. Every cancel starts a new generation,
+    and anything from an older generation is dropped instead of being emitted.
+    """
+    loaded = QtCore.Signal(str, QtGui.QImage)
+
+    def __init__(self, thread_count=4, size=100, cache=None, parent=None):
+        super(ThumbnailLoader, self).__init__(parent)
+
+        self.size = size
+        self.cache = cache
+        self.generation = 0
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, thread_count))
+
+        self.signals = ThumbnailSignals(self)
+        self.signals.decoded.connect(self._decoded)
+
+    def set_thread_count(self, thread_count):
+        """
+        Sets how many worker threads decode thumbnails.
+
+        :param thread_count: The number of threads, at least 1.
+        :type: int
+        """
+        self.pool.setMaxThreadCount(max(1, thread_count))
+
+    def request(self, char, pose_name, image_path, check=False):
+        """
+        Queues a thumbnail to be loaded. The loaded signal fires when it's ready.
+
+        :param char: The character the pose is for.
+        :type: str
+
+        :param pose_name: The pose the thumbnail is for.
+        :type: str
+
+        :param image_path: The path to the thumbnail on disk.
+        :type: str
+
+        :param check: Whether to check a cached copy against the source's modified time.
+        :type: bool
+        """
+        task = ThumbnailTask(self, self.generation, char, pose_name, image_path,
+                             self.size, check)
+        self.pool.start(task)
+
+    def cancel(self):
+        """
+        Drops every queued load and ignores the ones already running.
+        """
+        self.generation += 1
+        self.pool.clear()
+
+    def _decoded(self, generation, pose_name, image):
+        if generation != self.generation:
+            return None
+        self.loaded.emit(pose_name, image)
+
+
+class ThumbnailAtlas(object):
+    """
+    Every cached thumbnail of one character packed into one file, so opening the
+    character is one local read. The file is the PNGs back to back, then a JSON table of
+    {pose: [src_path, src_mtime, offset, length]}, then a footer with the table's offset
+    and length. A flush writes the whole file again without the replaced thumbnails.
+
+    Other Maya sessions share the atlas, so it's read again before a flush if it
+    changed on disk since. It's written to a temp file that replaces it, never in
+    place, so a session reading it or flushing at the same time can't get a torn file.
+    If two sessions flush at once the last one wins, and the thumbnails it didn't have
+    are only cached again.
+    """
+    def __init__(self, path):
+
+        self.path = path
+        self.entries = {}
+        self.blobs = b""
+        self.pending = {}
+        self.loaded = False
+        self.file_stat = None
+
+    def load(self):
+        """
+        Reads the atlas from disk, if it's there and valid.
+        """
+        self.loaded = True
+        self.entries = {}
+        self.blobs = b""
+        self.file_stat = self._stat()
+        try:
+            with open(self.path, "rb") as fh:
+                data = fh.read()
+        except (IOError, OSError):
+            return None
+
+        if len(data) < ATLAS_FOOTER.size:
+            return None
+        table_offset, table_size, magic = ATLAS_FOOTER.unpack_from(
+                                                    data, len(data) - ATLAS_FOOTER.size)
+        if magic != ATLAS_MAGIC or table_offset + table_size > len(data):
+            return None
+
+        try:
+            table = data[table_offset:table_offset + table_size].decode("utf-8")
+            table = json.loads(table)
+        except ValueError:
+            return None
+
+        self.entries = table
+        self.blobs = data[:table_offset]
+
+    def _stat(self):
+        # The size and modified time, to tell when another session wrote the file.
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def get(self, pose_name, src_path):
+        """
+        Gets a cached thumbnail.
+
+        :return: The source image's modified time and the PNG bytes, or None.
+        :type: float, bytes
+        """
+        if not self.loaded:
+            self.load()
+
+        if pose_name in self.pending:
+            entry = self.pending[pose_name]
+            if entry[0] == src_path:
+                return entry[1], entry[2]
+            return None
+
+        entry = self.entries.get(pose_name)
+        if entry is None or entry[0] != src_path:
+            return None
+        return entry[1], self.blobs[entry[2]:entry[2] + entry[3]]
+
+    def put(self, pose_name, src_path, src_mtime, png_bytes):
+        """
+        Adds or replaces a thumbnail. It's written on the next flush.
+        """
+        if not self.loaded:
+            self.load()
+        self.pending[pose_name] = (src_path, src_mtime, png_bytes)
+
+    def flush(self):
+        """
+        Writes the pending thumbnails to disk.
+
+        :return: The size of the atlas file.
+        :type: int
+        """
+        if not self.pending:
+            return len(self.blobs)
+
+        # Another session wrote the atlas since we read it, so our offsets are no good.
+        # Read it again to keep its thumbnails, ours are still pending.
+        if self._stat() != self.file_stat:
+            self.load()
+
+        # Keep the thumbnails that weren't replaced, packed together, then add ours.
+        entries = {}
+        parts = []
+        offset = 0
+        for pose_name, entry in self.entries.items():
+            if pose_name in self.pending:
+                continue
+            parts.append(self.blobs[entry[2]:entry[2] + entry[3]])
+            entries[pose_name] = [entry[0], entry[1], offset, entry[3]]
+            offset += entry[3]
+
+        for pose_name, (src_path, src_mtime, png_bytes) in self.pending.items():
+            parts.append(png_bytes)
+            entries[pose_name] = [src_path, src_mtime, offset, len(png_bytes)]
+            offset += len(png_bytes)
+        blobs = b"".join(parts)
+
+        table = json.dumps(entries, separators=(",", ":")).encode("utf-8")
+        footer = ATLAS_FOOTER.pack(offset, len(table), ATLAS_MAGIC)
+
+        # Written to a temp file first and swapped in, so a reader never sees half of it
+        # and two sessions never write into the same file.
+        temp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(temp_path, "wb") as fh:
+                fh.write(blobs)
+                fh.write(table)
+                fh.write(footer)
+            os.replace(temp_path, self.path)
+        except (IOError, OSError):
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            return len(self.blobs)
+
+        self.blobs = blobs
+        self.entries = entries
+        self.pending = {}
+        self.file_stat = self._stat()
+        return offset + len(table) + ATLAS_FOOTER.size
+
+
+class ThumbnailCache(object):
+    """
+    A local cache of downscaled pose thumbnails. Each character's thumbnails are one
+    atlas file, and each thumbnail is kept with its source path and modified time so
+    a changed image on the share is picked up. Once the cache is over its size budget
+    the least recently used atlases are deleted. Safe to use from worker threads.
+    """
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024 * 1024):
+
+        self.cache_dir = cache_dir
+        if not self.cache_dir:
+            self.cache_dir = os.path.join(os.path.expanduser("~"), ".pose_library",
+                                          "thumbs")
+        self.max_bytes = max_bytes
+
+        self.library_dir = None
+        self._atlases = {}
+        self._lock = threading.Lock()
+
+    def set_library(self, imgs_dir):
+        """
+        Points the cache at a project's images directory. Every directory gets its own
+        atlases, so projects with the same character names don't mix.
+
+        :param imgs_dir: The project's pose images directory.
+        :type: str
+        """
+        with self._lock:
+            self._atlases = {}
+            self.library_dir = None
+            if not imgs_dir:
+                return None
+
+            key = hashlib.sha1(imgs_dir.encode("utf-8")).hexdigest()[:16]
+            self.library_dir = os.path.join(self.cache_dir, key)
+            try:
+                os.makedirs(self.library_dir, exist_ok=True)
+            except OSError:
+                IOM.warning("Unable to make the thumbnail cache, thumbnails will load "
+                            "from the network.")
+                self.library_dir = None
+
+    def get(self, char, pose_name, src_path):
+        """
+        Gets a cached thumbnail.
+
+        :param char: The character the pose is for.
+        :type: str
+
+        :param pose_name: The pose the thumbnail is for.
+        :type: str
+
+        :param src_path: The path to the thumbnail on the share.
+        :type: str
+
+        :return: The source's modified time when cached and the PNG bytes, or None.
+        :type: float, bytes
+        """
+        with self._lock:
+            atlas = self._atlas(char)
+            if atlas is None:
+                return None
+            return atlas.get(pose_name, src_path)
+
+    def put(self, char, pose_name, src_path, src_mtime, png_bytes):
+        """
+        Caches a thumbnail. It's written to disk on the next flush.
+        """
+        with self._lock:
+            atlas = self._atlas(char)
+            if atlas is not None:
+                atlas.put(pose_name, src_path, src_mtime, png_bytes)
+
+    def update(self, char, pose_name, src_path, size=100):
+        """
+        Reads a thumbnail that was just written and caches it, for add and update
+        thumbnail.
+
+        :return: The thumbnail, or None if it couldn't be read.
+        :type: QtGui.QImage
+        """
+        try:
+            src_mtime = os.stat(src_path).st_mtime
+        except OSError:
+            return None
+        image = load_thumbnail(src_path, size)
+        if image is None:
+            return None
+
+        self.put(char, pose_name, src_path, src_mtime, encode_png(image))
+        return image
+
+    def flush(self):
+        """
+        Writes every atlas with new thumbnails, then evicts past the size budget.
+        """
+        with self._lock:
+            for atlas in self._atlases.values():
+                atlas.flush()
+            self._evict()
+
+    def _atlas(self, char):
+        if self.library_dir is None or not char:
+            return None
 
+        atlas = self._atlases.get(char)
+        if atlas is None:
+            file_name = "%s.atlas" % hashlib.sha1(char.encode("utf-8")).hexdigest()[:16]
+            atlas = ThumbnailAtlas(os.path.join(self.library_dir, file_name))
+            self._atlases[char] = atlas
+        return atlas
+
+    def _evict(self):
+        # Gather every atlas in the cache, for every project, oldest first.
+        atlas_files = []
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".atlas"):
+                    continue
+                file_path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                atlas_files.append((stat.st_mtime, stat.st_size, file_path))
+
+        total = sum(x[1] for x in atlas_files)
+        in_use = set(x.path for x in self._atlases.values())
+        for mtime, size, file_path in sorted(atlas_files):
+            if total <= self.max_bytes:
+                break
+            if file_path in in_use:
+                continue
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,2242 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Reads and writes pose library files without needing Maya.
+
+:description:
+    Poses are saved either as the original XML files or as a compact binary file. The
+    binary file is a small header, a string table of the control and attribute names,
+    then every value as one contiguous little-endian float64 array. The array is aligned
+    so it can be viewed straight out of the file's buffer, or a memory-map of it, without
+    parsing or copying each value.
+
+    Header: magic "PLIB", version (uint16), flags (uint16), control count (uint32),
+    value count (uint32), string table size (uint32).
+    String table: UTF-8, one line per control, the control then its attributes, all
+    separated by tabs.
+    Values: float64, starting on the next 8 byte boundary after the string table.
+
+    A sparse pose only keeps the attributes that differ from its character's default
+    pose, and is expanded against it when read. Every control is still listed so the
+    pose keeps its selection set. The binary file flags it with BIN_FLAG_SPARSE, the XML
+    with a sparse="1" attribute on the root.
+
+    A library is either flat, every pose in one data directory, or sharded into a
+    directory per character so a scene only reads the characters in it. PoseLayout
+    has the details.
+
+:applications:
+    None, this module is pure Python so tools outside of Maya can use it.
+
+:see_also:
+    pose_library_utils.PoseLibraryUtil
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+import xml.etree.ElementTree as et
+
+# External. The command line tool runs this module outside the pipeline, where it falls
+# back on the plain versions below.
+try:
+    from gen_utils.utils import IO, AutoVivification
+except ImportError:
+    class IO(object):
+        """
+        Prints the pipeline's messages to stderr.
+        """
+        @staticmethod
+        def error(message):
+            sys.stderr.write("# Error: %s\n" % message)
+
+        @staticmethod
+        def warning(message):
+            sys.stderr.write("# Warning: %s\n" % message)
+
+    class AutoVivification(dict):
+        """
+        Same as the pipeline's, missing keys make new dicts.
+        """
+        def __getitem__(self, item):
+            try:
+                return dict.__getitem__(self, item)
+            except KeyError:
+                value = self[item] = type(self)()
+                return value
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+XML_EXT = "xml"
+BIN_EXT = "pbin"
+POSE_EXTS = (XML_EXT, BIN_EXT)
+
+# A named reference to a pose stored once in the content-addressed store.
+REF_EXT = "pref"
+REF_VERSION = 1
+
+# Every kind of file a pose can have in the data directory.
+LIBRARY_EXTS = POSE_EXTS + (REF_EXT,)
+
+# Which file wins when a pose has more than one, the reference over the binary file
+# over the XML.
+FORMAT_RANK = {XML_EXT: 0, BIN_EXT: 1, REF_EXT: 2}
+
+IMG_EXT = "png"
+
+BIN_MAGIC = b"PLIB"
+BIN_VERSION = 1
+BIN_HEADER = struct.Struct("<4sHHIII")
+
+# Header flags.
+BIN_FLAG_SPARSE = 1
+
+# How far from the default pose a value has to be to be kept in a sparse pose. The XML
+# only keeps 3 decimals, so anything that rounds to the default is the default.
+SPARSE_TOLERANCE = 5e-4
+
+MANIFEST_VERSION = 1
+
+LAYOUT_VERSION = 1
+
+# A character with more poses than this gets hashed buckets when its shard is made, 16
+# of them, or 256 past 16 times this.
+BUCKET_POSES = 4096
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def file_stamp(file_path):
+    """
+    Gets a cheap signature of a file on disk, so we can tell if it changed since we last
+    looked at it without reading it again.
+
+    :param file_path: The full path to a file on disk.
+    :type: str
+
+    :return: The modified time and size of the file, or None if it doesn't exist.
+    :type: tuple
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    return stat.st_mtime, stat.st_size
+
+
+def pose_ext(file_path):
+    """
+    Gets the pose format of a file from its extension.
+
+    :param file_path: A path or file name.
+    :type: str
+
+    :return: The extension without the dot, or None if it isn't a pose file.
+    :type: str
+    """
+    ext = os.path.splitext(file_path)[1][1:].lower()
+    if ext in LIBRARY_EXTS:
+        return ext
+    return None
+
+
+def pose_file_variants(file_path):
+    """
+    Gets the paths the same pose would have in every pose format.
+
+    :param file_path: The path to a pose file.
+    :type: str
+
+    :return: The paths, one per format.
+    :type: list
+    """
+    base_path = os.path.splitext(file_path)[0]
+    return ["%s.%s" % (base_path, ext) for ext in LIBRARY_EXTS]
+
+
+def _align(offset, alignment=8):
+    """
+    Rounds an offset up to the next multiple of the alignment.
+    """
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def read_pose(file_path, use_mmap=False):
+    """
+    Reads a pose file in whatever format its extension says it is.
+
+    :param file_path: The full path to a pose file on disk.
+    :type: str
+
+    :param use_mmap: Memory-map binary files instead of reading them in. Only worth it
+                     on local disks, a mapped file can't be deleted on Windows.
+    :type: bool
+
+    :return: The pose, or None if it couldn't be read.
+    :type: PoseData
+    """
+    ext = pose_ext(file_path)
+    if ext == BIN_EXT:
+        return read_binary_pose(file_path, use_mmap)
+    if ext == REF_EXT:
+        return PoseStore.for_ref(file_path).read_ref_pose(file_path, use_mmap)
+    return read_xml_pose(file_path)
+
+
+def write_pose(pose_data, file_path):
+    """
+    Writes a pose file in whatever format its extension says it is.
+
+    :param pose_data: The pose to write.
+    :type: PoseData
+
+    :param file_path: The full path to write to.
+    :type: str
+    """
+    ext = pose_ext(file_path)
+    if ext == BIN_EXT:
+        write_binary_pose(pose_data, file_path)
+    elif ext == REF_EXT:
+        PoseStore.for_ref(file_path).write_ref_pose(pose_data, file_path)
+    else:
+        write_xml_pose(pose_data, file_path)
+
+
+def read_xml_pose(file_path):
+    """
+    Reads the contents of a pose XML file.
+
+    :param file_path: The full path to an XML file on disk.
+    :type: str
+
+    :return: The pose, or None if it couldn't be read.
+    :type: PoseData
+    """
+    try:
+        root = et.parse(file_path).getroot()
+    except (IOError, OSError, et.ParseError) as err:
+        IO.error("Unable to read \"%s\": %s" % (file_path, err))
+        return None
+
+    # Controls are the root's children, and their children are the attributes.
+    pose_data = PoseData(sparse=root.attrib.get("sparse") == "1")
+    for ctrl in root:
+        attr_values = [(x.tag, float(x.attrib["value"])) for x in ctrl]
+        pose_data.add_control(ctrl.tag, attr_values)
+
+    return pose_data
+
+
+def write_xml_pose(pose_data, file_path):
+    """
+    Writes a pose out as XML, the same layout the pose library has always written. The
+    file is streamed out a control at a time instead of building a DOM first.
+
+    :param pose_data: The pose to write.
+    :type: PoseData
+
+    :param file_path: The full path to write to.
+    :type: str
+    """
+    with PoseXmlWriter(file_path, sparse=pose_data.sparse) as writer:
+        for control, attrs, values in pose_data.iter_controls():
+            writer.add_control(control, attrs, values)
+
+
+def read_binary_pose(file_path, use_mmap=False):
+    """
+    Reads a binary pose file. The values are a view straight into the file's buffer.
+
+    :param file_path: The full path to a binary pose file on disk.
+    :type: str
+
+    :param use_mmap: Memory-map the file instead of reading it in.
+    :type: bool
+
+    :return: The pose, or None if it couldn't be read.
+    :type: PoseData
+    """
+    try:
+        with open(file_path, "rb") as fh:
+            if use_mmap:
+                buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = fh.read()
+    except (IOError, OSError, ValueError) as err:
+        IO.error("Unable to read \"%s\": %s" % (file_path, err))
+        return None
+
+    try:
+        return PoseData.from_buffer(buffer)
+    except ValueError as err:
+        IO.error("\"%s\" is not a valid pose file: %s" % (file_path, err))
+        return None
+
+
+def write_binary_pose(pose_data, file_path):
+    """
+    Writes a pose out as a binary pose file.
+
+    :param pose_data: The pose to write.
+    :type: PoseData
+
+    :param file_path: The full path to write to.
+    :type: str
+    """
+    with open(file_path, "wb") as fh:
+        fh.write(pose_data.to_bytes())
+
+
+def convert_library(data_dir, to_ext=BIN_EXT, remove_source=False):
+    """
+    Converts every pose file in a directory to another format, so existing XML
+    libraries can move over to the binary format. Poses already converted are skipped.
+
+    :param data_dir: The directory with the pose files.
+    :type: str
+
+    :param to_ext: The format to convert to, XML_EXT or BIN_EXT.
+    :type: str
+
+    :param remove_source: Delete the original file after converting it.
+    :type: bool
+
+    :return: The paths of the files written.
+    :type: list
+    """
+    converted = []
+    for file_name in sorted(os.listdir(data_dir)):
+        from_ext = pose_ext(file_name)
+        if from_ext is None or from_ext == to_ext or from_ext == REF_EXT:
+            continue
+
+        src_path = "%s/%s" % (data_dir, file_name)
+        dest_path = "%s.%s" % (os.path.splitext(src_path)[0], to_ext)
+        if os.path.isfile(dest_path):
+            continue
+
+        pose_data = read_pose(src_path)
+        if pose_data is None:
+            continue
+        write_pose(pose_data, dest_path)
+        converted.append(dest_path)
+
+        if remove_source:
+            try:
+                os.remove(src_path)
+            except OSError:
+                IO.error("Unable to delete: \n%s" % src_path)
+
+    return converted
+
+
+def sparsify_pose(pose_data, defaults, tolerance=SPARSE_TOLERANCE):
+    """
+    Gets a sparse pose, keeping only the values that differ from the default pose.
+    Controls with every attribute at its default are kept without any attributes.
+
+    :param pose_data: The full pose.
+    :type: PoseData
+
+    :param defaults: The character's default pose, {control: {attr: value}}.
+    :type: dict
+
+    :param tolerance: How far from the default a value has to be to be kept.
+    :type: float
+
+    :return: The sparse pose.
+    :type: PoseData
+    """
+    sparse = PoseData(sparse=True)
+    for control, attrs, values in pose_data.iter_controls():
+        control_defaults = defaults.get(control, {})
+        sparse.add_control(control, [(x, y) for x, y in zip(attrs, values) \
+                                     if x not in control_defaults or \
+                                     abs(y - control_defaults[x]) > tolerance])
+
+    return sparse
+
+
+def expand_pose(pose_data, defaults):
+    """
+    Gets the full pose of a sparse pose, filling in every attribute the default pose
+    has for its controls. Full poses are returned as they are.
+
+    :param pose_data: The sparse pose.
+    :type: PoseData
+
+    :param defaults: The character's default pose, {control: {attr: value}}.
+    :type: dict
+
+    :return: The full pose.
+    :type: PoseData
+    """
+    if not pose_data.sparse:
+        return pose_data
+
+    full = PoseData()
+    for control, attrs, values in pose_data.iter_controls():
+        attr_values = dict(defaults.get(control, {}))
+        attr_values.update(zip(attrs, values))
+        full.add_control(control, attr_values.items())
+
+    return full
+
+
+def defaults_dir(data_dir):
+    """
+    Gets where the default poses sparse poses are saved against live, next to the data
+    directory like the store.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :return: The default poses' directory.
+    :type: str
+    """
+    return "%s.defaults" % os.path.normpath(data_dir).replace("\\", "/")
+
+
+def store_dir(data_dir):
+    """
+    Gets where the content-addressed store of a data directory lives. It's next to the
+    data directory like the manifest, so writing blobs doesn't change the directory's
+    modified time.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :return: The store's directory.
+    :type: str
+    """
+    return "%s.store" % os.path.normpath(data_dir).replace("\\", "/")
+
+
+def layout_path(data_dir):
+    """
+    Gets where the file recording a library's layout lives, next to the data directory
+    like the store.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :return: The layout file's path.
+    :type: str
+    """
+    return "%s.layout.json" % os.path.normpath(data_dir).replace("\\", "/")
+
+
+def manifests_dir(data_dir):
+    """
+    Gets where the manifests of a sharded library's characters live. They're kept out
+    of the shards, writing them would change the shards' modified times otherwise.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :return: The manifests' directory.
+    :type: str
+    """
+    return "%s.manifests" % os.path.normpath(data_dir).replace("\\", "/")
+
+
+def pose_bucket(pose, digits):
+    """
+    Gets the hashed bucket a pose goes in, within its character's shard. The name is
+    lowercased first, so poses only differing by case land in the same bucket like
+    they land in the same directory on Windows.
+
+    :param pose: The pose's name.
+    :type: str
+
+    :param digits: The number of hex digits in the bucket names, 1 for 16 buckets and
+                   2 for 256.
+    :type: int
+
+    :return: The bucket's name.
+    :type: str
+    """
+    return hashlib.md5(pose.lower().encode("utf-8")).hexdigest()[:digits]
+
+
+def read_pose_ref(ref_path):
+    """
+    Reads a pose reference file.
+
+    :param ref_path: The full path to a reference file.
+    :type: str
+
+    :return: {"data": digest, "img": digest or None}, or None if it can't be read.
+    :type: dict
+    """
+    try:
+        with open(ref_path, "r") as fh:
+            ref = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    if ref.get("version") != REF_VERSION or not ref.get("data"):
+        return None
+    return {"data": ref["data"], "img": ref.get("img")}
+
+
+def write_pose_ref(ref_path, data_digest, img_digest=None):
+    """
+    Writes a pose reference file, swapping it in so nobody reads half of one.
+
+    :param ref_path: The full path to the reference file.
+    :type: str
+
+    :param data_digest: The digest of the pose's contents in the store.
+    :type: str
+
+    :param img_digest: The digest of the pose's thumbnail in the store.
+    :type: str
+    """
+    temp_path = "%s.%d.tmp" % (ref_path, os.getpid())
+    with open(temp_path, "w") as fh:
+        json.dump({"version": REF_VERSION, "data": data_digest, "img": img_digest}, fh)
+    os.replace(temp_path, ref_path)
+
+
+def migrate_to_store(data_dir, imgs_dir, remove_source=True, leaf_dirs=None):
+    """
+    Moves a library's pose files and thumbnails into the content-addressed store,
+    leaving a reference file per pose. Poses and thumbnails with the same contents are
+    only stored once.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :param imgs_dir: The pose thumbnail directory.
+    :type: str
+
+    :param remove_source: Delete the pose files and thumbnails that were moved.
+    :type: bool
+
+    :param leaf_dirs: (data_dir, imgs_dir) of every directory with pose files, the
+                      shards and buckets of a sharded library. Just data_dir and
+                      imgs_dir if None.
+    :type: list
+
+    :return: The counts of poses, unique blobs and the bytes before and after.
+    :type: dict
+    """
+    store = PoseStore(store_dir(data_dir))
+
+    # The file each pose is stored from, the binary file wins over the XML.
+    sources = {}
+    for pose_dir, img_dir in leaf_dirs or [(data_dir, imgs_dir)]:
+        for file_name in sorted(os.listdir(pose_dir)):
+            ext = pose_ext(file_name)
+            if ext is None:
+                continue
+            key = (pose_dir, img_dir, os.path.splitext(file_name)[0])
+            if key not in sources or FORMAT_RANK[ext] > FORMAT_RANK[sources[key]]:
+                sources[key] = ext
+
+    stats = {"poses": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    data_digests = set()
+    img_digests = set()
+    for (pose_dir, img_dir, base_name), ext in sorted(sources.items()):
+        if ext == REF_EXT:
+            continue
+
+        src_path = "%s/%s.%s" % (pose_dir, base_name, ext)
+        img_path = "%s/%s.%s" % (img_dir, base_name, IMG_EXT)
+        pose_data = read_pose(src_path)
+        if pose_data is None:
+            stats["failed"] += 1
+            continue
+
+        data_digest = store.put_pose(pose_data)
+        pose_data.release()
+        img_digest = None
+        if os.path.isfile(img_path):
+            img_digest = store.put_image(img_path)
+        write_pose_ref("%s/%s.%s" % (pose_dir, base_name, REF_EXT), data_digest,
+                       img_digest)
+
+        # Count what the pose took up before, every format and its thumbnail.
+        moved = [x for x in pose_file_variants(src_path) if pose_ext(x) != REF_EXT]
+        if img_digest:
+            moved.append(img_path)
+        for moved_path in moved:
+            stamp = file_stamp(moved_path)
+            if stamp is None:
+                continue
+            stats["bytes_before"] += stamp[1]
+            if remove_source:
+                try:
+                    os.remove(moved_path)
+                except OSError:
+                    IO.error("Unable to delete: \n%s" % moved_path)
+
+        stats["poses"] += 1
+        if data_digest not in data_digests:
+            data_digests.add(data_digest)
+            stats["bytes_after"] += (file_stamp(store.blob_path(data_digest, BIN_EXT)) \
+                                                                        or (0, 0))[1]
+        if img_digest and img_digest not in img_digests:
+            img_digests.add(img_digest)
+            stats["bytes_after"] += (file_stamp(store.blob_path(img_digest, IMG_EXT)) \
+                                                                        or (0, 0))[1]
+
+    stats["unique_poses"] = len(data_digests)
+    stats["unique_thumbnails"] = len(img_digests)
+    return stats
+
+
+def shard_library(data_dir, imgs_dir, chars, bucket_poses=BUCKET_POSES):
+    """
+    Moves a flat library's pose files and thumbnails into a directory per character,
+    so a scene only has to list the characters in it. Characters with more than
+    bucket_poses poses are split again into hashed buckets. Files are moved with their
+    names as they are, and files of characters that aren't given stay where they are,
+    so it can be run again as more characters are known. The layout is saved before
+    anything is moved, so a migration that doesn't finish leaves every pose readable.
+
+    :param data_dir: The pose data directory.
+    :type: str
+
+    :param imgs_dir: The pose thumbnail directory.
+    :type: str
+
+    :param chars: The character names, to match files to characters with.
+    :type: list
+
+    :param bucket_poses: Characters with more poses than this get buckets, None to
+                         never bucket.
+    :type: int
+
+    :return: The counts of files and thumbnails moved, the characters sharded and
+             bucketed, and the files left where they are.
+    :type: dict
+    """
+    layout = PoseLayout(data_dir, imgs_dir)
+    matcher = CharacterMatcher(chars)
+
+    # {char: {base_name: (pose, [file names])}} of every file we can match.
+    found = {}
+    stats = {"files": 0, "thumbnails": 0, "characters": 0, "bucketed": 0,
+             "unmatched": 0, "conflicts": 0, "failed": 0}
+    for file_name in sorted(os.listdir(layout.data_dir)):
+        if not pose_ext(file_name):
+            continue
+        char, pose = matcher.split(file_name)
+        if char is None:
+            stats["unmatched"] += 1
+            continue
+        base_name = os.path.splitext(file_name)[0]
+        found.setdefault(char, {}).setdefault(base_name, (pose, []))[1].append(file_name)
+
+    # A character keeps the buckets its shard was made with, moving its poses between
+    # buckets isn't worth it.
+    for char, poses in found.items():
+        if os.path.isdir("%s/%s" % (layout.data_dir, char)):
+            continue
+        if bucket_poses and len(poses) > bucket_poses:
+            layout.buckets[char] = 1 if len(poses) <= bucket_poses * 16 else 2
+            stats["bucketed"] += 1
+    layout.sharded = True
+    if not layout.save():
+        return stats
+
+    for char in sorted(found):
+        stats["characters"] += 1
+        for base_name, (pose, file_names) in sorted(found[char].items()):
+            dest_base = layout.pose_base(char, pose)
+            moves = [("%s/%s" % (layout.data_dir, x),
+                      "%s/%s.%s" % (layout.data_dir, dest_base, pose_ext(x))) \
+                                                                    for x in file_names]
+            img_path = "%s/%s.%s" % (imgs_dir, base_name, IMG_EXT)
+            if os.path.isfile(img_path):
+                moves.append((img_path, "%s/%s.%s" % (imgs_dir, dest_base, IMG_EXT)))
+
+            for src_path, dest_path in moves:
+                # A pose saved into the shard and flat both, the shard's copy wins and
+                # the flat one is left for someone to look at.
+                if os.path.exists(dest_path):
+                    stats["conflicts"] += 1
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                    os.replace(src_path, dest_path)
+                except OSError as err:
+                    IO.error("Unable to move \"%s\": %s" % (src_path, err))
+                    stats["failed"] += 1
+                    continue
+                stats["thumbnails" if src_path == img_path else "files"] += 1
+
+    return stats
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseData(object):
+    """
+    The contents of a pose. Controls keep the order they were saved in, and every value
+    lives in one flat float array lined up with the controls' attributes. A sparse pose
+    only has the values that differ from its character's default pose.
+    """
+    __slots__ = ("controls", "attrs", "values", "sparse", "_buffer")
+
+    def __init__(self, controls=None, attrs=None, values=None, sparse=False):
+        self.controls = controls if controls is not None else []
+        self.attrs = attrs if attrs is not None else []
+        self.values = values if values is not None else array("d")
+        self.sparse = sparse
+        self._buffer = None
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    @classmethod
+    def from_dict(cls, contents):
+        """
+        Makes a pose from a {control: {attr: value}} dictionary.
+
+        :param contents: The dictionary of the pose's contents.
+        :type: dict
+
+        :return: The pose.
+        :type: PoseData
+        """
+        pose_data = cls()
+        for control in contents:
+            pose_data.add_control(control, contents[control].items())
+        return pose_data
+
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        Makes a pose from the bytes of a binary pose file. The values are a view into
+        the buffer, so nothing is copied.
+
+        :param buffer: The bytes, or memory-map, of a binary pose file.
+        :type: bytes
+
+        :return: The pose.
+        :type: PoseData
+        """
+        if len(buffer) < BIN_HEADER.size:
+            raise ValueError("too short for a header")
+
+        magic, version, flags, num_ctrls, num_values, table_size = \
+                                                    BIN_HEADER.unpack_from(buffer, 0)
+        if magic != BIN_MAGIC:
+            raise ValueError("bad magic %r" % magic)
+        if version > BIN_VERSION:
+            raise ValueError("version %d is newer than this tool" % version)
+
+        table_start = BIN_HEADER.size
+        values_start = _align(table_start + table_size)
+        values_end = values_start + num_values * 8
+        if len(buffer) < values_end:
+            raise ValueError("truncated")
+
+        # Every control is a line of tab separated names, the control first.
+        controls = []
+        attrs = []
+        table = bytes(buffer[table_start:table_start + table_size]).decode("utf-8")
+        for line in table.split("\n")[:num_ctrls]:
+            names = line.split("\t")
+            controls.append(names[0])
+            attrs.append(names[1:])
+
+        view = memoryview(buffer)[values_start:values_end]
+        if sys.byteorder == "little":
+            values = view.cast("d")
+        else:
+            values = array("d", bytes(view))
+            values.byteswap()
+
+        if sum(len(x) for x in attrs) != len(values):
+            raise ValueError("names and values don't line up")
+
+        pose_data = cls(controls, attrs, values, bool(flags & BIN_FLAG_SPARSE))
+        pose_data._buffer = buffer
+        return pose_data
+
+
+    def to_bytes(self):
+        """
+        Packs the pose into the binary pose file layout.
+
+        :return: The bytes of the file.
+        :type: bytes
+        """
+        table = "".join("%s\n" % "\t".join([control] + list(attrs)) for \
+                                    control, attrs in zip(self.controls, self.attrs))
+        table = table.encode("utf-8")
+        flags = BIN_FLAG_SPARSE if self.sparse else 0
+        header = BIN_HEADER.pack(BIN_MAGIC, BIN_VERSION, flags, len(self.controls),
+                                 len(self.values), len(table))
+        padding = b"\0" * (_align(len(header) + len(table)) - len(header) - len(table))
+
+        values = array("d", self.values)
+        if sys.byteorder != "little":
+            values.byteswap()
+
+        return b"".join((header, table, padding, values.tobytes()))
+
+
+    def add_control(self, control, attr_values):
+        """
+        Adds a control and its attributes to the end of the pose.
+
+        :param control: The control's name, without a namespace.
+        :type: str
+
+        :param attr_values: (attr, value) pairs for the control.
+        :type: list
+        """
+        names = []
+        for attr, value in attr_values:
+            names.append(attr)
+            self.values.append(float(value))
+        self.controls.append(control)
+        self.attrs.append(names)
+
+
+    def iter_controls(self):
+        """
+        Iterates over the controls with their attributes and values.
+
+        :return: (control, attrs, values) for every control.
+        :type: generator
+        """
+        start = 0
+        for control, attrs in zip(self.controls, self.attrs):
+            end = start + len(attrs)
+            yield control, attrs, self.values[start:end]
+            start = end
+
+
+    def items(self):
+        """
+        Iterates over every value in the pose.
+
+        :return: (control, attr, value) for every value.
+        :type: generator
+        """
+        values = self.values
+        index = 0
+        for control, attrs in zip(self.controls, self.attrs):
+            for attr in attrs:
+                yield control, attr, values[index]
+                index += 1
+
+
+    def to_dict(self):
+        """
+        Gets the pose as the {control: {attr: value}} dictionary _read_xml returns.
+
+        :return: The contents of the pose.
+        :type: AutoVivification
+        """
+        contents = AutoVivification()
+        for control, attrs, values in self.iter_controls():
+            contents[control] = dict(zip(attrs, values))
+        return contents
+
+
+    def nbytes(self):
+        """
+        Estimates how much memory the pose holds, for keeping caches in a budget.
+
+        :return: The approximate size in bytes.
+        :type: int
+        """
+        names = sum(len(x) for x in self.controls)
+        names += sum(len(y) for x in self.attrs for y in x)
+        return len(self.values) * 8 + names + 64 * (len(self.controls) + len(self.values))
+
+
+    def release(self):
+        """
+        Lets go of the file buffer. A memory-mapped file stays open until this is called
+        or the pose is garbage collected.
+        """
+        buffer = self._buffer
+        values = self.values
+        if isinstance(values, memoryview):
+            self.values = array("d", values)
+            values.release()
+        self._buffer = None
+        if isinstance(buffer, mmap.mmap):
+            buffer.close()
+
+
+class PoseXmlWriter(object):
+    """
+    Streams a pose out as XML, laid out the same as minidom's toprettyxml used to write
+    it. It writes to a temp file next to the pose and swaps it in when it's closed, so
+    someone reading the library never sees half a pose.
+
+    with PoseXmlWriter(path) as writer:
+        writer.add_control("l_eye_CC", ["translateX"], [1.0])
+    """
+    def __init__(self, file_path, indent="    ", sparse=False):
+        self.file_path = file_path
+        self.temp_path = "%s.tmp%d" % (file_path, os.getpid())
+        self.indent = indent
+        self.root_tag = 'root sparse="1"' if sparse else "root"
+        self.count = 0
+        self._fh = None
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+
+
+    def open(self):
+        self._fh = open(self.temp_path, "w")
+        self._fh.write('<?xml version="1.0" ?>\n')
+
+
+    def add_control(self, control, attrs, values):
+        """
+        Writes a control and its attribute values.
+
+        :param control: The control's name without the namespace.
+        :type: str
+
+        :param attrs: The attribute names.
+        :type: list
+
+        :param values: The values, lined up with the attribute names.
+        :type: list
+        """
+        # The root element is only opened once we know it isn't empty.
+        if not self.count:
+            self._fh.write("<%s>\n" % self.root_tag)
+        self.count += 1
+
+        indent = self.indent
+        if not attrs:
+            self._fh.write("%s<%s/>\n" % (indent, control))
+            return None
+
+        lines = ["%s<%s>\n" % (indent, control)]
+        for curr_attr, attr_value in zip(attrs, values):
+            lines.append('%s%s<%s value="%.3f"/>\n' % (indent, indent, curr_attr,
+                                                         attr_value))
+        lines.append("%s</%s>\n" % (indent, control))
+        self._fh.write("".join(lines))
+
+
+    def close(self, commit=True):
+        """
+        Finishes the file and swaps it in for the pose, or throws it away.
+
+        :param commit: Keep what was written.
+        :type: bool
+        """
+        if self._fh is None:
+            return None
+
+        try:
+            if commit:
+                self._fh.write("</root>\n" if self.count else "<%s/>\n" % \
+                                                                        self.root_tag)
+            self._fh.close()
+            self._fh = None
+            if commit:
+                os.replace(self.temp_path, self.file_path)
+        finally:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+
+class PoseStore(object):
+    """
+    Content-addressed storage for poses and thumbnails. Each blob is stored once under
+    the SHA-1 of its contents, and the data directory keeps a small reference file per
+    pose naming its blobs, so saving the same pose under ten names stores it once.
+
+    Poses are normalized before hashing, the controls and attributes sorted and the
+    values rounded to the 3 decimals the XML has always kept, so the same pose saved
+    from a different selection order is the same blob. Blobs never change once written,
+    a changed pose is a new blob and its reference is pointed at it.
+
+    <data_dir>.store/ab/abcdef....pbin
+    <data_dir>.store/12/123456....png
+    """
+    # {reference directory: library data directory} found by for_ref.
+    _roots = {}
+
+    def __init__(self, root):
+        self.root = root
+
+
+    @classmethod
+    def for_ref(cls, ref_path):
+        """
+        Gets the store the references in a data directory point to. A reference in a
+        character's shard, or one of its buckets, points to the library's store, so the
+        directories above it are looked at for a store or a layout file too.
+
+        :param ref_path: The full path to a reference file.
+        :type: str
+
+        :return: The store.
+        :type: PoseStore
+        """
+        ref_dir = os.path.dirname(os.path.normpath(ref_path)).replace("\\", "/")
+        root = cls._roots.get(ref_dir)
+        if root is None:
+            root = ref_dir
+            search_dir = ref_dir
+            for _ in range(3):
+                if os.path.isdir(store_dir(search_dir)) or \
+                                                os.path.isfile(layout_path(search_dir)):
+                    root = search_dir
+                    cls._roots[ref_dir] = root
+                    break
+                search_dir = os.path.dirname(search_dir)
+
+        return cls(store_dir(root))
+
+
+    def blob_path(self, digest, ext):
+        """
+        Gets where a blob lives.
+
+        :param digest: The blob's digest.
+        :type: str
+
+        :param ext: BIN_EXT for poses, IMG_EXT for thumbnails.
+        :type: str
+
+        :return: The full path of the blob.
+        :type: str
+        """
+        return "%s/%s/%s.%s" % (self.root, digest[:2], digest, ext)
+
+
+    @staticmethod
+    def normalize(pose_data):
+        """
+        Gets a pose in its canonical order and precision, for hashing.
+
+        :param pose_data: The pose.
+        :type: PoseData
+
+        :return: The normalized pose.
+        :type: PoseData
+        """
+        controls = sorted(pose_data.iter_controls(), key=lambda x: x[0])
+        normal = PoseData(sparse=pose_data.sparse)
+        for control, attrs, values in controls:
+            pairs = sorted(zip(attrs, values), key=lambda x: x[0])
+            normal.add_control(control, [(x, round(y, 3) + 0.0) for x, y in pairs])
+
+        return normal
+
+
+    def put_pose(self, pose_data):
+        """
+        Stores a pose, if the store doesn't have it already.
+
+        :param pose_data: The pose.
+        :type: PoseData
+
+        :return: The digest of the stored pose.
+        :type: str
+        """
+        payload = self.normalize(pose_data).to_bytes()
+        digest = hashlib.sha1(payload).hexdigest()
+        self._put(digest, BIN_EXT, payload)
+        return digest
+
+
+    def put_image(self, img_path):
+        """
+        Stores a thumbnail, if the store doesn't have it already.
+
+        :param img_path: The thumbnail's path.
+        :type: str
+
+        :return: The digest of the stored thumbnail.
+        :type: str
+        """
+        with open(img_path, "rb") as fh:
+            payload = fh.read()
+        digest = hashlib.sha1(payload).hexdigest()
+        self._put(digest, IMG_EXT, payload)
+        return digest
+
+
+    def remove(self, digest, ext):
+        """
+        Deletes a blob. Only call this once nothing references it.
+
+        :return: If the blob was deleted.
+        :type: bool
+        """
+        try:
+            os.remove(self.blob_path(digest, ext))
+        except OSError:
+            return False
+        return True
+
+
+    def read_ref_pose(self, ref_path, use_mmap=False):
+        """
+        Reads the pose a reference file points to.
+
+        :param ref_path: The full path to the reference file.
+        :type: str
+
+        :return: The pose, or None if it couldn't be read.
+        :type: PoseData
+        """
+        ref = read_pose_ref(ref_path)
+        if ref is None:
+            IO.error("\"%s\" is not a valid pose reference." % ref_path)
+            return None
+        return read_binary_pose(self.blob_path(ref["data"], BIN_EXT), use_mmap)
+
+
+    def write_ref_pose(self, pose_data, ref_path):
+        """
+        Stores a pose and points a reference file at it, keeping the reference's
+        thumbnail.
+
+        :param pose_data: The pose.
+        :type: PoseData
+
+        :param ref_path: The full path to the reference file.
+        :type: str
+        """
+        old_ref = read_pose_ref(ref_path) or {}
+        write_pose_ref(ref_path, self.put_pose(pose_data), old_ref.get("img"))
+
+
+    def iter_blobs(self):
+        """
+        Lists every blob in the store.
+
+        :return: (digest, ext) for every blob.
+        :type: generator
+        """
+        try:
+            prefixes = sorted(os.listdir(self.root))
+        except OSError:
+            return None
+
+        for prefix in prefixes:
+            try:
+                file_names = os.listdir("%s/%s" % (self.root, prefix))
+            except OSError:
+                continue
+            for file_name in file_names:
+                digest, ext = os.path.splitext(file_name)
+                if ext[1:] in (BIN_EXT, IMG_EXT):
+                    yield digest, ext[1:]
+
+
+    def _put(self, digest, ext, payload):
+        blob_path = self.blob_path(digest, ext)
+        if os.path.isfile(blob_path):
+            return None
+
+        blob_dir = os.path.dirname(blob_path)
+        if not os.path.isdir(blob_dir):
+            os.makedirs(blob_dir, exist_ok=True)
+
+        # Two people storing the same blob at once write the same bytes, whoever
+        # swaps in last wins and nothing is lost.
+        temp_path = "%s.%d.tmp" % (blob_path, os.getpid())
+        with open(temp_path, "wb") as fh:
+            fh.write(payload)
+        os.replace(temp_path, blob_path)
+
+
+class CharacterMatcher(object):
+    """
+    Matches pose file names to the character they belong to. The characters are kept in
+    a prefix trie, so a name is matched in one walk over its letters no matter how many
+    characters there are, and the longest character wins. "Tom2_sit" goes to "Tom2"
+    even when there's also a "Tom".
+    """
+    # Marks the trie nodes where a character's name ends.
+    _END = ""
+
+    def __init__(self, chars=None, separator="_"):
+
+        self.separator = separator
+        self._trie = {}
+        for char in chars or []:
+            self.add(char)
+
+
+    def add(self, char):
+        """
+        Adds a character to match against.
+
+        :param char: The character's name.
+        :type: str
+        """
+        node = self._trie
+        for letter in char:
+            node = node.setdefault(letter, {})
+        node[self._END] = char
+
+
+    def match(self, name):
+        """
+        Finds the longest character the name starts with, followed by the separator.
+
+        :param name: The name to match, like "octoNinja_sit".
+        :type: str
+
+        :return: The character and the rest of the name after the separator, or
+                 None, None if no character matches.
+        :type: str, str
+        """
+        end_key = self._END
+        separator = self.separator
+        found_char = None
+        found_index = -1
+        node = self._trie
+        for index, letter in enumerate(name):
+            # Only count a character if its name is followed by the separator.
+            if letter == separator and end_key in node:
+                found_char = node[end_key]
+                found_index = index
+            node = node.get(letter)
+            if node is None:
+                break
+
+        if found_char is None or found_index + 1 >= len(name):
+            return None, None
+
+        return found_char, name[found_index + 1:]
+
+
+    def split(self, file_name):
+        """
+        Splits a pose file name into its character and pose, the naming find_poses uses.
+        "character_A_pose_title.xml" is "character_A" and "pose_title".
+
+        :param file_name: The pose file's name or path, with or without the extension.
+        :type: str
+
+        :return: The character and pose, or None, None if no character matches.
+        :type: str, str
+        """
+        return self.match(os.path.splitext(os.path.basename(file_name))[0])
+
+
+class PoseCache(object):
+    """
+    Keeps recently read poses in memory so applying the same pose again doesn't read and
+    parse the file again. Entries are checked against the file's modified time and size
+    on every get, and the least recently used are dropped past the entry or byte budget.
+    """
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # {path: (stamp, pose_data, nbytes)}, oldest first.
+        self._entries = OrderedDict()
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __contains__(self, file_path):
+        return file_path in self._entries
+
+
+    def get(self, file_path, loader=read_pose):
+        """
+        Gets a pose from the cache, reading it with the loader if it isn't cached or the
+        file changed on disk.
+
+        :param file_path: The full path to a pose file on disk.
+        :type: str
+
+        :param loader: The function to read the file with on a miss.
+        :type: function
+
+        :return: The pose, or None if it couldn't be read.
+        :type: PoseData
+        """
+        stamp = file_stamp(file_path)
+        entry = self._entries.get(file_path)
+        if entry is not None and stamp is not None and entry[0] == stamp:
+            self._entries.move_to_end(file_path)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        self.invalidate(file_path)
+        if stamp is None:
+            return None
+
+        pose_data = loader(file_path)
+        if pose_data is None:
+            return None
+
+        self.put(file_path, pose_data, stamp)
+        return pose_data
+
+
+    def put(self, file_path, pose_data, stamp=None):
+        """
+        Adds a pose to the cache, dropping the least recently used to stay in budget.
+
+        :param file_path: The full path the pose was read from.
+        :type: str
+
+        :param pose_data: The pose.
+        :type: PoseData
+
+        :param stamp: The file stamp of the file when it was read.
+        :type: tuple
+        """
+        self.invalidate(file_path)
+        if stamp is None:
+            stamp = file_stamp(file_path)
+
+        # Anything bigger than the whole budget would just evict everything else.
+        size = pose_data.nbytes()
+        if size > self.max_bytes:
+            return None
+
+        self._entries[file_path] = (stamp, pose_data, size)
+        self.nbytes += size
+        while self._entries and (len(self._entries) > self.max_entries or \
+                                 self.nbytes > self.max_bytes):
+            old_stamp, old_pose, old_size = self._entries.popitem(last=False)[1]
+            old_pose.release()
+            self.nbytes -= old_size
+            self.evictions += 1
+
+
+    def invalidate(self, file_path=None):
+        """
+        Drops a pose from the cache, or everything if no path is given.
+
+        :param file_path: The full path to the pose file.
+        :type: str
+        """
+        if file_path is None:
+            self._entries.clear()
+            self.nbytes = 0
+            return None
+
+        entry = self._entries.pop(file_path, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+
+    def stats(self):
+        """
+        Gets the counters for tuning the cache's budget.
+
+        :return: The hits, misses, evictions, entries and bytes held.
+        :type: dict
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits) / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes}
+
+
+class PoseManifest(object):
+    """
+    An index of the pose files in a data directory, saved next to it so opening the tool
+    doesn't have to list and stat the whole directory on the network drive.
+
+    Each record is keyed by file name and holds the character, pose, data path, image
+    path, size and modified time. The manifest remembers the directory's modified time
+    when it was last in sync. Adding or removing a file changes the directory's modified
+    time, so a mismatch means someone changed the library without updating the manifest
+    and only then is the directory listed again.
+
+    A character's shard split into hashed buckets keeps the modified time of every
+    bucket, and only the buckets that changed are listed again. Its records are keyed
+    by the bucket and file name, "3f/Tom_sit.xml".
+
+    A scan can list the directory on a worker thread while poses are added and removed
+    on the main thread. The records are changed and saved under a lock, and what was
+    added or removed during a scan is applied over what the scan found.
+    """
+    def __init__(self, data_dir, imgs_dir, manifest_path=None, revalidate_after=3600.0,
+                 buckets=0, store_root=None):
+
+        self.data_dir = os.path.normpath(data_dir).replace("\\", "/")
+        self.imgs_dir = imgs_dir
+
+        # The hex digits of the bucket names, 0 when the files aren't in buckets.
+        self.buckets = buckets
+
+        # The data directory the library's store is next to, a shard's is the
+        # library's.
+        self.store_root = store_root or self.data_dir
+
+        # Kept outside the data directory, writing it would change the directory's
+        # modified time otherwise.
+        self.manifest_path = manifest_path
+        if not self.manifest_path:
+            self.manifest_path = "%s.manifest.json" % self.data_dir
+
+        # Even without drift, list the directory again after this many seconds to catch
+        # anything that slipped past, like two saves landing on the same timestamp.
+        self.revalidate_after = revalidate_after
+
+        self.entries = {}
+        self.dir_mtime = None
+        self.scanned = 0.0
+
+        # The records added and removed while each running scan lists the directory,
+        # [{key: record, or None if removed}].
+        self._lock = threading.RLock()
+        self._scans = []
+
+
+    def load(self):
+        """
+        Loads the manifest, listing the directory again only if it drifted.
+
+        :return: The records of every pose file, {file_name: record}.
+        :type: dict
+        """
+        dir_mtime = self._dir_mtime()
+        if dir_mtime is None:
+            self.entries = {}
+            return self.entries
+
+        if not self._read():
+            self.rebuild()
+        elif dir_mtime != self.dir_mtime or \
+                                    time.time() - self.scanned > self.revalidate_after:
+            self.revalidate()
+
+        return self.entries
+
+
+    def iter_load(self, cancelled=None):
+        """
+        Same as load, but yields the records as they're found, so a slow listing of the
+        directory can be shown as it goes. A manifest in sync yields its records in
+        name order right away.
+
+        :param cancelled: Called between files, stops the scan when it returns True.
+                          The manifest isn't saved if the scan is stopped.
+        :type: function
+
+        :return: (file_name, record) for every pose file.
+        :type: generator
+        """
+        dir_mtime = self._dir_mtime()
+        if dir_mtime is None:
+            self.entries = {}
+            return None
+
+        if self._read():
+            if dir_mtime == self.dir_mtime and \
+                                    time.time() - self.scanned <= self.revalidate_after:
+                for file_name in sorted(self.entries):
+                    yield file_name, self.entries[file_name]
+                return None
+        else:
+            self.entries = {}
+
+        for item in self.iter_revalidate(cancelled):
+            yield item
+
+
+    def rebuild(self):
+        """
+        Throws away every record and lists and stats the whole directory.
+
+        :return: The records of every pose file.
+        :type: dict
+        """
+        self.entries = {}
+        self.dir_mtime = None
+        return self.revalidate()
+
+
+    def revalidate(self):
+        """
+        Lists the directory and syncs the records with it. Files we already have records
+        for keep them as long as their size and modified time still match.
+
+        :return: The records of every pose file.
+        :type: dict
+        """
+        for _ in self.iter_revalidate():
+            pass
+        return self.entries
+
+
+    def iter_revalidate(self, cancelled=None):
+        """
+        Same as revalidate, but yields the records as the directory is listed. The
+        records are only merged in and saved once the whole directory is listed, with
+        anything added or removed since the scan started applied over them.
+
+        :param cancelled: Called between files, stops the scan when it returns True.
+        :type: function
+
+        :return: (file_name, record) for every pose file.
+        :type: generator
+        """
+        dir_mtime = self._dir_mtime()
+        entries = {}
+
+        # List against a copy of the records, the main thread may change them meanwhile.
+        with self._lock:
+            known = dict(self.entries)
+            old_dir_mtime = self.dir_mtime
+            scanned = self.scanned
+            writes = {}
+            self._scans.append(writes)
+
+        try:
+            if not self.buckets:
+                finished = yield from self._iter_dir(self.data_dir, "", entries, known,
+                                                     cancelled)
+                if not finished:
+                    return None
+
+            elif dir_mtime is None:
+                IO.error("Unable to list \"%s\"." % self.data_dir)
+                return None
+
+            else:
+                # Buckets with the modified time they had last time haven't changed,
+                # their records are kept without listing them. Unless it's been long
+                # enough that everything is listed again anyway.
+                kept = {}
+                if isinstance(old_dir_mtime, dict) and \
+                                        time.time() - scanned <= self.revalidate_after:
+                    for key, record in known.items():
+                        kept.setdefault(key.split("/")[0], []).append((key, record))
+
+                for bucket in sorted(x for x in dir_mtime if x):
+                    if bucket in kept and old_dir_mtime.get(bucket) == dir_mtime[bucket]:
+                        for key, record in kept[bucket]:
+                            entries[key] = record
+                            yield key, record
+                        continue
+                    finished = yield from self._iter_dir(
+                                                "%s/%s" % (self.data_dir, bucket),
+                                                "%s/" % bucket, entries, known, cancelled)
+                    if not finished:
+                        return None
+
+            with self._lock:
+                # Anything added or removed while we listed wins over what we found.
+                for key, record in writes.items():
+                    if record is None:
+                        entries.pop(key, None)
+                    else:
+                        entries[key] = record
+
+                for key in set(self.entries) - set(entries):
+                    del self.entries[key]
+                self.entries.update(entries)
+                self.dir_mtime = dir_mtime
+                self.scanned = time.time()
+                self.save()
+
+        finally:
+            with self._lock:
+                self._scans.remove(writes)
+
+
+    def _iter_dir(self, dir_path, prefix, entries, known, cancelled=None):
+        """
+        Lists one directory of pose files into entries, yielding the records as they're
+        found.
+
+        :param dir_path: The directory to list.
+        :type: str
+
+        :param prefix: Put before the file names to make the keys, the bucket's "3f/".
+        :type: str
+
+        :param entries: The records found so far, {key: record}.
+        :type: dict
+
+        :param known: The records from before the scan, {key: record}.
+        :type: dict
+
+        :param cancelled: Called between files, stops the scan when it returns True.
+        :type: function
+
+        :return: (key, record) for every pose file, and if the directory was listed to
+                 the end.
+        :type: generator
+        """
+        try:
+            dir_iter = os.scandir(dir_path)
+        except OSError as err:
+            IO.error("Unable to list \"%s\": %s" % (dir_path, err))
+            return False
+
+        # scandir hands entries over as the OS lists them, so the first poses show up
+        # before the whole share is listed.
+        with dir_iter:
+            for dir_entry in dir_iter:
+                if cancelled is not None and cancelled():
+                    return False
+                if not pose_ext(dir_entry.name):
+                    continue
+                key = prefix + dir_entry.name
+                try:
+                    if not dir_entry.is_file():
+                        continue
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+
+                # A file changed in place outside the tool keeps its record's name but
+                # not its size or modified time, make its record again so it shows up
+                # as modified. Windows hands the stat over with the listing for free.
+                record = known.get(key)
+                if record is None or record.get("size") != stat.st_size or \
+                                                    record.get("mtime") != stat.st_mtime:
+                    old_record = record or {}
+                    record = self._make_record(key, stat)
+                    record["char"] = old_record.get("char")
+                    record["pose"] = old_record.get("pose")
+                entries[key] = record
+                yield key, record
+
+        return True
+
+
+    def key(self, file_path):
+        """
+        Gets the key of a file's record, its name or its bucket and name.
+
+        :param file_path: The full path of a pose file.
+        :type: str
+
+        :return: The key.
+        :type: str
+        """
+        file_name = os.path.basename(file_path)
+        if not self.buckets:
+            return file_name
+        return "%s/%s" % (os.path.basename(os.path.dirname(file_path)), file_name)
+
+
+    def record(self, file_path):
+        """
+        Gets the record of a file.
+
+        :param file_path: The full path of a pose file.
+        :type: str
+
+        :return: The record, or None if the manifest doesn't have the file.
+        :type: dict
+        """
+        with self._lock:
+            return self.entries.get(self.key(file_path))
+
+
+    def leaf_dirs(self):
+        """
+        Gets the directories the pose files are in, the data directory or its buckets.
+
+        :return: (data_dir, imgs_dir) for each.
+        :type: list
+        """
+        if not self.buckets:
+            return [(self.data_dir, self.imgs_dir)]
+
+        dir_mtime = self._dir_mtime() or {}
+        return [("%s/%s" % (self.data_dir, x), "%s/%s" % (self.imgs_dir, x)) \
+                                                        for x in sorted(dir_mtime) if x]
+
+
+    def watch_paths(self):
+        """
+        Gets the paths to watch for other animators' changes. A bucketed shard only
+        watches its shard and the manifest, which every save through the tool rewrites.
+
+        :return: The paths.
+        :type: list
+        """
+        return [self.data_dir, self.manifest_path]
+
+
+    def add(self, file_path, char=None, pose=None):
+        """
+        Adds or updates the record of a file after writing it.
+
+        :param file_path: The full path of the pose file written.
+        :type: str
+
+        :param char: The character the pose is for, if known.
+        :type: str
+
+        :param pose: The pose's name, if known.
+        :type: str
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return self.remove(file_path)
+
+        key = self.key(file_path)
+        record = self._make_record(key, stat)
+        with self._lock:
+            # Reload first, someone else may have saved since we last read it.
+            self._sync_before_write()
+            old_record = self.entries.get(key, {})
+            record["char"] = char or old_record.get("char")
+            record["pose"] = pose or old_record.get("pose")
+            self.entries[key] = record
+            for writes in self._scans:
+                writes[key] = record
+            self._save_after_write()
+
+
+    def remove(self, file_path):
+        """
+        Removes the record of a file after deleting it.
+
+        :param file_path: The full path of the pose file deleted.
+        :type: str
+        """
+        key = self.key(file_path)
+        with self._lock:
+            self._sync_before_write()
+            self.entries.pop(key, None)
+            for writes in self._scans:
+                writes[key] = None
+            self._save_after_write()
+
+
+    def save(self):
+        """
+        Writes the manifest to disk. It's written to a temp file and swapped in, so
+        nobody reads a half written manifest.
+        """
+        # The lock keeps the records still while they're dumped, and keeps the threads
+        # of this session from writing the same temp file.
+        with self._lock:
+            data = {"version": MANIFEST_VERSION,
+                    "data_dir": self.data_dir,
+                    "buckets": self.buckets,
+                    "dir_mtime": self.dir_mtime,
+                    "scanned": self.scanned,
+                    "entries": self.entries}
+            temp_path = "%s.%d.tmp" % (self.manifest_path, os.getpid())
+            try:
+                with open(temp_path, "w") as fh:
+                    json.dump(data, fh, separators=(",", ":"))
+                os.replace(temp_path, self.manifest_path)
+            except OSError as err:
+                IO.error("Unable to write the pose manifest: %s" % err)
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+
+    def _read(self):
+        """
+        Reads the manifest from disk.
+
+        :return: If there was a valid manifest to read.
+        :type: bool
+        """
+        try:
+            with open(self.manifest_path, "r") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != MANIFEST_VERSION or \
+                                            data.get("data_dir") != self.data_dir or \
+                                            data.get("buckets", 0) != self.buckets:
+            return False
+
+        with self._lock:
+            self.entries = data.get("entries", {})
+            self.dir_mtime = data.get("dir_mtime")
+            self.scanned = data.get("scanned", 0.0)
+        return True
+
+
+    def _sync_before_write(self):
+        """
+        Reloads the manifest before changing a record, so we don't write back over
+        records someone else saved since we last read it.
+        """
+        if not self._read():
+            self.entries = {}
+            self.dir_mtime = None
+
+
+    def _save_after_write(self):
+        """
+        Saves after changing a record, marking the manifest in sync with the directory.
+        """
+        if self.dir_mtime is None:
+            self.rebuild()
+            return None
+
+        self.dir_mtime = self._dir_mtime()
+        self.save()
+
+
+    def _dir_mtime(self):
+        """
+        Gets the data directory's modified time. For a bucketed shard it's every
+        bucket's, {"": shard, "3f": bucket}, from one listing of the shard.
+        """
+        try:
+            dir_mtime = os.stat(self.data_dir).st_mtime
+        except OSError:
+            return None
+        if not self.buckets:
+            return dir_mtime
+
+        mtimes = {"": dir_mtime}
+        try:
+            with os.scandir(self.data_dir) as dir_iter:
+                for dir_entry in dir_iter:
+                    if dir_entry.is_dir():
+                        mtimes[dir_entry.name] = dir_entry.stat().st_mtime
+        except OSError:
+            return None
+        return mtimes
+
+
+    def _make_record(self, key, stat):
+        base_name = os.path.splitext(key)[0]
+        record = {"char": None,
+                  "pose": None,
+                  "data": "%s/%s" % (self.data_dir, key),
+                  "img": "%s/%s.%s" % (self.imgs_dir, base_name, IMG_EXT),
+                  "size": stat.st_size,
+                  "mtime": stat.st_mtime}
+
+        # A reference's blobs are kept with it, so finding the thumbnail and counting
+        # what references a blob doesn't have to open every reference again.
+        if pose_ext(key) == REF_EXT:
+            ref = read_pose_ref(record["data"])
+            record["ref"] = ref
+            if ref and ref.get("img"):
+                store = PoseStore(store_dir(self.store_root))
+                record["img"] = store.blob_path(ref["img"], IMG_EXT)
+        return record
+
+
+    def references(self, digest):
+        """
+        Counts the reference files pointing at a blob.
+
+        :param digest: The blob's digest.
+        :type: str
+
+        :return: The number of references.
+        :type: int
+        """
+        count = 0
+        with self._lock:
+            records = list(self.entries.values())
+        for record in records:
+            ref = record.get("ref")
+            if ref and (ref.get("data") == digest or ref.get("img") == digest):
+                count += 1
+        return count
+
+
+class PoseLayout(object):
+    """
+    How a library's files are laid out on disk, saved next to the data directory.
+
+    A flat library has every pose in the data directory and every thumbnail in the imgs
+    directory. A sharded library has a directory per character in both, so a scene only
+    lists the characters in it. A character with a lot of poses can be split again
+    into hashed buckets, so saving a pose only changes one small directory. The file
+    names are the same in every layout.
+
+    <data_dir>/Tom_sit.xml          flat
+    <data_dir>/Tom/Tom_sit.xml      sharded
+    <data_dir>/Tom/3f/Tom_sit.xml   sharded into buckets
+    """
+    def __init__(self, data_dir, imgs_dir):
+
+        self.data_dir = os.path.normpath(data_dir).replace("\\", "/")
+        self.imgs_dir = imgs_dir
+        self.path = layout_path(self.data_dir)
+
+        self.sharded = False
+
+        # {char: hex digits of its bucket names}, characters not in it have no buckets.
+        self.buckets = {}
+
+        self.read()
+
+
+    def read(self):
+        """
+        Reads the layout from disk. A library without a layout file is flat.
+
+        :return: If there was a valid layout to read.
+        :type: bool
+        """
+        try:
+            with open(self.path, "r") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("version") != LAYOUT_VERSION:
+            return False
+
+        self.sharded = bool(data.get("sharded"))
+        self.buckets = data.get("buckets", {})
+        return True
+
+
+    def save(self):
+        """
+        Writes the layout to disk, swapping it in so nobody reads half of one.
+
+        :return: Success of the operation.
+        :type: bool
+        """
+        data = {"version": LAYOUT_VERSION,
+                "sharded": self.sharded,
+                "buckets": self.buckets}
+        temp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(temp_path, "w") as fh:
+                json.dump(data, fh, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError as err:
+            IO.error("Unable to write the pose library layout: %s" % err)
+            return False
+
+        return True
+
+
+    def pose_base(self, char, pose):
+        """
+        Gets where a pose's files go, under the data and imgs directories.
+
+        :param char: The character the pose is for.
+        :type: str
+
+        :param pose: The pose's name.
+        :type: str
+
+        :return: The path without the extension, like "Tom/3f/Tom_sit".
+        :type: str
+        """
+        file_name = "%s_%s" % (char, pose)
+        if not self.sharded:
+            return file_name
+
+        digits = self.buckets.get(char, 0)
+        if not digits:
+            return "%s/%s" % (char, file_name)
+        return "%s/%s/%s" % (char, pose_bucket(pose, digits), file_name)
+
+
+    def shard_chars(self):
+        """
+        Lists the characters that have a shard.
+
+        :return: The characters.
+        :type: list
+        """
+        try:
+            with os.scandir(self.data_dir) as dir_iter:
+                return sorted(x.name for x in dir_iter if x.is_dir())
+        except OSError:
+            return []
+
+
+    def shard_manifest(self, char):
+        """
+        Gets the manifest of a character's shard.
+
+        :param char: The character.
+        :type: str
+
+        :return: The manifest.
+        :type: PoseManifest
+        """
+        manifest_dir = manifests_dir(self.data_dir)
+        if not os.path.isdir(manifest_dir):
+            try:
+                os.makedirs(manifest_dir, exist_ok=True)
+            except OSError:
+                IO.error("Unable to make \"%s\"." % manifest_dir)
+
+        return PoseManifest("%s/%s" % (self.data_dir, char),
+                            "%s/%s" % (self.imgs_dir, char),
+                            manifest_path="%s/%s.json" % (manifest_dir, char),
+                            buckets=self.buckets.get(char, 0),
+                            store_root=self.data_dir)
+
+
+    def manifest(self, chars=None):
+        """
+        Gets the manifest of the library.
+
+        :param chars: Only read the shards of these characters, every shard if None.
+                      A flat library always has every character.
+        :type: list
+
+        :return: The manifest.
+        :type: PoseManifest or ShardedManifest
+        """
+        if not self.sharded:
+            return PoseManifest(self.data_dir, self.imgs_dir)
+        return ShardedManifest(self, chars)
+
+
+class ShardedManifest(object):
+    """
+    The manifests of a sharded library, read as one. Every character's shard has a
+    manifest of its own, so only the shards of the characters asked for are read or
+    listed, and the cost of loading grows with the characters in the scene instead of
+    the whole library. Poses still saved flat, by a tool from before the library was
+    sharded, are picked up by the data directory's own manifest.
+
+    Records are keyed by their path under the data directory, "Tom/Tom_sit.xml". It can
+    be used anywhere a PoseManifest is.
+    """
+    def __init__(self, layout, chars=None):
+
+        self.layout = layout
+        self.data_dir = layout.data_dir
+        self.imgs_dir = layout.imgs_dir
+        self.chars = sorted(chars) if chars is not None else None
+
+        # {key prefix: manifest}, "" for the data directory and "Tom/" for the shards.
+        self.manifests = OrderedDict()
+        self.entries = {}
+
+        # Same as a PoseManifest's, a scan and the main thread both change the records.
+        self._lock = threading.RLock()
+
+
+    def load(self):
+        """
+        Loads every manifest, listing only the shards that drifted.
+
+        :return: The records of every pose file, {key: record}.
+        :type: dict
+        """
+        self.entries = {}
+        for prefix, manifest in self._manifests().items():
+            for key, record in manifest.load().items():
+                self.entries[prefix + key] = record
+        return self.entries
+
+
+    def iter_load(self, cancelled=None):
+        """
+        Same as load, but yields the records as they're found, a shard at a time.
+
+        :param cancelled: Called between files, stops the scan when it returns True.
+        :type: function
+
+        :return: (key, record) for every pose file.
+        :type: generator
+        """
+        with self._lock:
+            self.entries = {}
+        for prefix, manifest in self._manifests().items():
+            if cancelled is not None and cancelled():
+                return None
+            for key, record in manifest.iter_load(cancelled):
+                with self._lock:
+                    self.entries[prefix + key] = record
+                yield prefix + key, record
+
+        # Pick up anything added or removed on the main thread while we listed.
+        self._merge()
+
+
+    def rebuild(self):
+        for manifest in self._manifests().values():
+            manifest.rebuild()
+        return self._merge()
+
+
+    def revalidate(self):
+        for manifest in self._manifests().values():
+            manifest.revalidate()
+        return self._merge()
+
+
+    def add(self, file_path, char=None, pose=None):
+        """
+        Adds or updates the record of a file after writing it, in the manifest of the
+        shard it's in.
+
+        :param file_path: The full path of the pose file written.
+        :type: str
+
+        :param char: The character the pose is for, if known.
+        :type: str
+
+        :param pose: The pose's name, if known.
+        :type: str
+        """
+        with self._lock:
+            prefix, manifest = self._owner(file_path)
+            manifest.add(file_path, char, pose)
+            self._update(prefix, manifest, file_path)
+
+
+    def remove(self, file_path):
+        """
+        Removes the record of a file after deleting it.
+
+        :param file_path: The full path of the pose file deleted.
+        :type: str
+        """
+        with self._lock:
+            prefix, manifest = self._owner(file_path)
+            manifest.remove(file_path)
+            self._update(prefix, manifest, file_path)
+
+
+    def save(self):
+        for manifest in self._manifests().values():
+            manifest.save()
+
+
+    def record(self, file_path):
+        prefix, manifest = self._owner(file_path)
+        return manifest.record(file_path)
+
+
+    def references(self, digest):
+        """
+        Counts the reference files pointing at a blob, in the shards read.
+
+        :param digest: The blob's digest.
+        :type: str
+
+        :return: The number of references.
+        :type: int
+        """
+        return sum(x.references(digest) for x in self._manifests().values())
+
+
+    def leaf_dirs(self):
+        return [y for x in self._manifests().values() for y in x.leaf_dirs()]
+
+
+    def watch_paths(self):
+        return [y for x in self._manifests().values() for y in x.watch_paths()]
+
+
+    def _manifests(self):
+        if not self.manifests:
+            self.manifests[""] = PoseManifest(self.data_dir, self.imgs_dir)
+            chars = self.chars if self.chars is not None else self.layout.shard_chars()
+            for char in chars:
+                self.manifests["%s/" % char] = self.layout.shard_manifest(char)
+        return self.manifests
+
+
+    def _owner(self, file_path):
+        """
+        Gets the manifest a file belongs in, from the first directory under the data
+        directory. A character's first pose in the library makes its manifest.
+
+        :param file_path: The full path of a pose file.
+        :type: str
+
+        :return: The key prefix and the manifest.
+        :type: str, PoseManifest
+        """
+        manifests = self._manifests()
+        file_path = os.path.normpath(file_path).replace("\\", "/")
+        if not file_path.startswith("%s/" % self.data_dir):
+            return "", manifests[""]
+        rel_path = file_path[len(self.data_dir) + 1:]
+        if "/" not in rel_path:
+            return "", manifests[""]
+
+        prefix = "%s/" % rel_path.split("/")[0]
+        if prefix not in manifests:
+            manifests[prefix] = self.layout.shard_manifest(prefix[:-1])
+        return prefix, manifests[prefix]
+
+
+    def _update(self, prefix, manifest, file_path):
+        # Pick up the record the shard's manifest has for the file now.
+        key = manifest.key(file_path)
+        record = manifest.entries.get(key)
+        if record is None:
+            self.entries.pop(prefix + key, None)
+        else:
+            self.entries[prefix + key] = record
+
+
+    def _merge(self):
+        with self._lock:
+            entries = {}
+            for prefix, manifest in self.manifests.items():
+                with manifest._lock:
+                    for key, record in manifest.entries.items():
+                        entries[prefix + key] = record
+            self.entries = entries
+        return self.entries
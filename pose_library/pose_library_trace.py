@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Opt-in timing spans for the pose library, with histograms and Chrome trace dumps.
+
+:description:
+    Operations are wrapped in spans with the traced decorator or the Tracer's span
+    context manager. A span records how long the operation took, the thread it ran on
+    and any counts added to it while it ran, like files scanned or plugs set. Finished
+    spans go into a bounded buffer and a latency histogram per operation. The buffer
+    can be dumped as a Chrome trace JSON file and opened in chrome://tracing or
+    Perfetto.
+
+    Tracing is off by default. While off, a traced function costs one extra call and
+    a flag check, and adding counts returns straight away. Turn it on from code:
+
+    from maya_tools.utils.pose_library_trace import TRACER
+    TRACER.enable()
+    ...
+    print(TRACER.report())
+    TRACER.dump_chrome_trace("C:/temp/pose_library_trace.json")
+
+    or by setting POSE_LIBRARY_TRACE to a file path before Maya starts, which turns it
+    on at import and dumps the trace there when Maya exits.
+
+:applications:
+    None, this module is pure Python so tools outside of Maya can use it.
+
+:see_also:
+    pose_library_utils.PoseLibraryUtil
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+# Environment variable holding the path to dump a trace to, turns tracing on at import.
+TRACE_ENV = "POSE_LIBRARY_TRACE"
+
+# Histogram bucket upper bounds in ms, roughly doubling. The last bucket is everything
+# slower than the last bound.
+HISTOGRAM_BOUNDS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0,
+                    500.0, 1000.0, 2500.0, 5000.0)
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def traced(name):
+    """
+    Decorator wrapping every call of a function in a span on the module's tracer.
+
+    @traced("find_poses")
+    def find_poses(self):
+
+    :param name: The span's name.
+    :type: str
+
+    :return: The decorator.
+    :type: function
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class Span(object):
+    """
+    One timed operation. Times are perf_counter seconds.
+    """
+    __slots__ = ("name", "start", "end", "thread", "counts")
+
+    def __init__(self, name, start, thread):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.thread = thread
+        self.counts = {}
+
+
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+
+class Histogram(object):
+    """
+    The latencies of one operation, bucketed by HISTOGRAM_BOUNDS.
+    """
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets", "counts")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+        # The counts of every span summed, {"files": 50000}.
+        self.counts = {}
+
+
+    def add(self, span):
+        ms = span.duration() * 1e3
+        self.count += 1
+        self.total += ms
+        self.minimum = ms if self.minimum is None else min(self.minimum, ms)
+        self.maximum = max(self.maximum, ms)
+
+        bucket = len(HISTOGRAM_BOUNDS)
+        for index, bound in enumerate(HISTOGRAM_BOUNDS):
+            if ms <= bound:
+                bucket = index
+                break
+        self.buckets[bucket] += 1
+
+        for key, value in span.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+
+    def percentile(self, pct):
+        """
+        Estimates a percentile from the buckets, as the upper bound of its bucket.
+
+        :param pct: The percentile, 0 to 100.
+        :type: float
+
+        :return: The latency in ms.
+        :type: float
+        """
+        if not self.count:
+            return 0.0
+
+        target = self.count * pct / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                if index < len(HISTOGRAM_BOUNDS):
+                    return min(HISTOGRAM_BOUNDS[index], self.maximum)
+                return self.maximum
+
+        return self.maximum
+
+
+    def to_dict(self):
+        return {"count": self.count,
+                "total_ms": self.total,
+                "mean_ms": self.total / self.count if self.count else 0.0,
+                "min_ms": self.minimum or 0.0,
+                "max_ms": self.maximum,
+                "p50_ms": self.percentile(50),
+                "p90_ms": self.percentile(90),
+                "p99_ms": self.percentile(99),
+                "buckets": dict(zip([str(x) for x in HISTOGRAM_BOUNDS] + ["inf"],
+                                    self.buckets)),
+                "counts": dict(self.counts)}
+
+
+class Tracer(object):
+    """
+    Records spans and keeps a histogram per operation. Spans nest per thread, so counts
+    always go to the innermost span running on the calling thread.
+    """
+    def __init__(self, max_spans=100000):
+
+        self.enabled = False
+        self.spans = deque(maxlen=max_spans)
+        self.histograms = {}
+        self.origin = time.perf_counter()
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+
+    def enable(self, clear=True):
+        """
+        Turns tracing on.
+
+        :param clear: Throw away what was recorded before.
+        :type: bool
+        """
+        if clear:
+            self.clear()
+        self.enabled = True
+
+
+    def disable(self):
+        self.enabled = False
+
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.histograms = {}
+            self.origin = time.perf_counter()
+
+
+    def span(self, name):
+        """
+        Context manager timing a block as a span.
+
+        with TRACER.span("populate"):
+            ...
+
+        :param name: The span's name.
+        :type: str
+
+        :return: The context manager.
+        :type: SpanContext
+        """
+        return SpanContext(self, name)
+
+
+    def add(self, key, value=1):
+        """
+        Adds to a count on the innermost span running on this thread. Does nothing when
+        tracing is off or no span is running.
+
+        :param key: What's being counted, like "files" or "plugs_set".
+        :type: str
+
+        :param value: How much to add.
+        :type: int
+        """
+        if not self.enabled:
+            return None
+
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            counts = stack[-1].counts
+            counts[key] = counts.get(key, 0) + value
+
+
+    def _start(self, name):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(name, time.perf_counter(), threading.get_ident())
+        stack.append(span)
+        return span
+
+
+    def _finish(self, span):
+        span.end = time.perf_counter()
+        stack = self._local.stack
+        if stack and stack[-1] is span:
+            stack.pop()
+
+        with self._lock:
+            self.spans.append(span)
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram()
+            histogram.add(span)
+
+
+    def summary(self):
+        """
+        Gets the histogram of every operation.
+
+        :return: {name: histogram dict}
+        :type: dict
+        """
+        with self._lock:
+            return dict((x, y.to_dict()) for x, y in self.histograms.items())
+
+
+    def report(self):
+        """
+        Gets a table of the operations, slowest total first, for reading in the script
+        editor.
+
+        :return: The table.
+        :type: str
+        """
+        lines = ["%-28s %7s %10s %9s %9s %9s  %s" % ("operation", "count", "total ms",
+                                                    "p50 ms", "p99 ms", "max ms",
+                                                    "counts")]
+        summary = self.summary()
+        for name in sorted(summary, key=lambda x: -summary[x]["total_ms"]):
+            stats = summary[name]
+            counts = ", ".join("%s=%s" % x for x in sorted(stats["counts"].items()))
+            lines.append("%-28s %7d %10.1f %9.2f %9.2f %9.2f  %s" % (
+                                            name, stats["count"], stats["total_ms"],
+                                            stats["p50_ms"], stats["p99_ms"],
+                                            stats["max_ms"], counts))
+        return "\n".join(lines)
+
+
+    def dump_chrome_trace(self, file_path):
+        """
+        Writes the recorded spans as a Chrome trace, for chrome://tracing or Perfetto.
+
+        :param file_path: The path of the JSON file to write.
+        :type: str
+
+        :return: The number of spans written.
+        :type: int
+        """
+        with self._lock:
+            spans = list(self.spans)
+            summary = dict((x, y.to_dict()) for x, y in self.histograms.items())
+
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            events.append({"name": span.name,
+                           "cat": "pose_library",
+                           "ph": "X",
+                           "ts": (span.start - self.origin) * 1e6,
+                           "dur": span.duration() * 1e6,
+                           "pid": pid,
+                           "tid": span.thread,
+                           "args": span.counts})
+
+        with open(file_path, "w") as fh:
+            json.dump({"traceEvents": events,
+                       "displayTimeUnit": "ms",
+                       "otherData": {"histograms": summary}}, fh)
+
+        return len(events)
+
+
+class SpanContext(object):
+    """
+    Context manager for a span, it's a no-op while tracing is off.
+    """
+    __slots__ = ("tracer", "name", "span")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.span = None
+
+
+    def __enter__(self):
+        if self.tracer.enabled:
+            self.span = self.tracer._start(self.name)
+        return self.span
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.span is not None:
+            if exc_type is not None:
+                self.span.counts["error"] = 1
+            self.tracer._finish(self.span)
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- VARIABLES --#
+
+# The tracer every module in the pose library records to.
+TRACER = Tracer()
+
+# Turn tracing on for the whole session if the environment asks for it.
+if os.environ.get(TRACE_ENV):
+    TRACER.enable()
+    atexit.register(TRACER.dump_chrome_trace, os.environ[TRACE_ENV])
@@ -25,23 +25,1369 @@
 #----------------------------------------------------------------------------- IMPORTS --#
 
 # Default Python Imports
+import heapq
+import math
 import os
-from os.path import isfile, join
+import time
+from array import array
+from collections import OrderedDict
 import maya.cmds as cmds
-from xml.dom import minidom
-import xml.etree.ElementTree as et
+import maya.api.OpenMaya as om
+
+# NumPy isn't in every Maya install, blending and searching fall back to plain Python
+# without it.
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # External
 from maya_tools.utils.maya_utils import get_assets_from_refs, get_maya_pipe_context, IOM
 from gen_utils.pipe_enums import FileExtensions
 from gen_utils.utils import IO, AutoVivification
 from maya_tools.guis.maya_guis import PreviewImage
+from maya_tools.utils.pose_library_io import BIN_EXT, BUCKET_POSES, FORMAT_RANK, \
+                                             IMG_EXT, REF_EXT, SPARSE_TOLERANCE, \
+                                             XML_EXT, convert_library, defaults_dir, \
+                                             expand_pose, file_stamp, migrate_to_store, \
+                                             pose_ext, pose_file_variants, read_pose, \
+                                             read_pose_ref, shard_library, \
+                                             sparsify_pose, store_dir, write_pose, \
+                                             write_pose_ref, CharacterMatcher, \
+                                             PoseCache, PoseData, PoseLayout, PoseStore
+from maya_tools.utils.pose_library_trace import TRACER, traced
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def set_plugs(plugs, handles, scales, values, indices, undoable=True):
+    """
+    Sets plugs to values. On the undo queue it's one setAttr per plug, the undo queue
+    only sees commands and a script can't put an MDGModifier on it. Off the undo queue,
+    like previews and blend drags, every plug goes into one MDGModifier and is set with
+    a single doIt.
+
+    :param plugs: The "ns:ctrl.attr" names of the plugs.
+    :type: list
+
+    :param handles: The MPlugs, lined up with plugs.
+    :type: list
+
+    :param scales: What each plug's internal value is multiplied by for its UI value.
+    :type: list
+
+    :param values: The UI values, lined up with plugs.
+    :type: list
+
+    :param indices: The plugs to set.
+    :type: list
+
+    :param undoable: Set with setAttr so the caller's undo chunk has it. Otherwise the
+                     caller has to be fine with it not being undoable.
+    :type: bool
+
+    :return: The plugs that couldn't be set.
+    :type: list
+    """
+    failed = []
+    if undoable:
+        # Local name keeps the lookup out of the loop.
+        set_attr = cmds.setAttr
+        for index in indices:
+            try:
+                set_attr(plugs[index], values[index])
+            except RuntimeError:
+                # Locked or connected plugs can't be set, don't stop the rest.
+                failed.append(plugs[index])
+        return failed
+
+    modifier = om.MDGModifier()
+    for index in indices:
+        handle = handles[index]
+        # A plug that can't be set would fail the whole doIt, leave it out.
+        if handle.isLocked or handle.isDestination:
+            failed.append(plugs[index])
+            continue
+        modifier.newPlugValueDouble(handle, values[index] / scales[index])
+
+    try:
+        modifier.doIt()
+    except RuntimeError:
+        # Something we couldn't tell up front, find it one plug at a time. The undo
+        # queue stays off so it's still not undoable, like the doIt.
+        cmds.undoInfo(stateWithoutFlush=False)
+        try:
+            return set_plugs(plugs, handles, scales, values, indices, undoable=True)
+        finally:
+            cmds.undoInfo(stateWithoutFlush=True)
+
+    return failed
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseApplyPlan(object):
+    """
+    A pose compiled against one namespace. The plugs are the full "ns:ctrl.attr" strings
+    with their resolved MPlugs, and the values are the floats lined up with them, so
+    applying doesn't have to format any strings or convert any values. Angular plugs are
+    flagged so blends can take the shortest way around.
+    """
+    __slots__ = ("plugs", "handles", "scales", "values", "stamp", "missing", "angular",
+                 "angle_period")
+
+    def __init__(self, plugs, handles, scales, values, stamp=None, missing=None,
+                 angular=None, angle_period=360.0):
+        self.plugs = plugs
+        self.handles = handles
+        self.scales = scales
+        self.values = values
+        self.stamp = stamp
+        self.missing = missing or []
+        self.angular = angular if angular is not None else array("b", [0] * len(plugs))
+        self.angle_period = angle_period
+
+
+class PoseApplyEngine(object):
+    """
+    Compiles poses into apply plans once, caches them by pose file and namespace, and
+    pushes only the plugs that need to change in a single undo chunk. Undoable applies
+    still set each of those plugs with its own setAttr, only applies made off the undo
+    queue are set in one batch, see set_plugs.
+    """
+    def __init__(self, tolerance=1e-5, max_plans=64):
+
+        # Values closer than the tolerance are treated as already applied. The XML only
+        # stores 3 decimals so anything finer than that is noise.
+        self.tolerance = tolerance
+        self.max_plans = max_plans
+
+        self._plans = OrderedDict()
+
+        # Counters from the last apply, handy when checking how much work was skipped.
+        self.last_set = 0
+        self.last_skipped = 0
+        self.last_failed = 0
+
+
+    def compile(self, contents, namespace, stamp=None):
+        """
+        Resolves the contents of a pose against a namespace.
+
+        :param contents: The contents of a pose file.
+        :type: PoseData
+
+        :param namespace: The namespace of the rig we're applying to.
+        :type: str
+
+        :param stamp: The file stamp of the pose file the contents came from.
+        :type: tuple
+
+        :return: The compiled plan.
+        :type: PoseApplyPlan
+        """
+        # MPlug reads come back in internal units, so work out once how to scale
+        # radians and centimeters to the UI units setAttr and the XML use.
+        angle_scale = om.MAngle(1.0).asUnits(om.MAngle.uiUnit())
+        distance_scale = om.MDistance(1.0).asUnits(om.MDistance.uiUnit())
+
+        plugs = []
+        handles = []
+        scales = array("d")
+        values = array("d")
+        angular = array("b")
+        missing = []
+        sel_list = om.MSelectionList()
+        for control, attr, value in contents.items():
+            plug = "%s:%s.%s" % (namespace, control, attr)
+
+            # Anything that isn't on this rig would otherwise throw on every apply.
+            try:
+                sel_list.add(plug)
+            except RuntimeError:
+                missing.append(plug)
+                continue
+            handle = sel_list.getPlug(sel_list.length() - 1)
+
+            scale = 1.0
+            is_angle = 0
+            mobj = handle.attribute()
+            if mobj.hasFn(om.MFn.kUnitAttribute):
+                unit_type = om.MFnUnitAttribute(mobj).unitType()
+                if unit_type == om.MFnUnitAttribute.kAngle:
+                    scale = angle_scale
+                    is_angle = 1
+                elif unit_type == om.MFnUnitAttribute.kDistance:
+                    scale = distance_scale
+
+            plugs.append(plug)
+            handles.append(handle)
+            scales.append(scale)
+            values.append(value)
+            angular.append(is_angle)
+
+        # A full turn in the UI's angle unit, 360 for degrees.
+        angle_period = 2.0 * math.pi * angle_scale
+        return PoseApplyPlan(plugs, handles, scales, values, stamp, missing, angular,
+                             angle_period)
+
+
+    def read_values(self, plan):
+        """
+        Reads the current values of the plan's plugs straight from the MPlugs, without
+        going through a getAttr command per plug.
+
+        :param plan: The compiled plan to read.
+        :type: PoseApplyPlan
+
+        :return: The current values in UI units, lined up with the plan's plugs.
+        :type: list
+        """
+        return [handle.asDouble() * scale for handle, scale in \
+                                                    zip(plan.handles, plan.scales)]
+
+
+    def get_plan(self, pose_path, namespace, read_func, variant=None):
+        """
+        Gets the plan for a pose file and namespace, compiling it if we don't have one or
+        the file changed on disk since we compiled it.
+
+        :param pose_path: The full path to the pose file on disk.
+        :type: str
+
+        :param namespace: The namespace of the rig we're applying to.
+        :type: str
+
+        :param read_func: The function to read the pose file's contents with.
+        :type: function
+
+        :param variant: Keeps plans of the same file compiled from different contents
+                        apart, like "mirror" for the pose's mirror image.
+        :type: str
+
+        :return: The plan, or None if the file couldn't be read.
+        :type: PoseApplyPlan
+        """
+        key = (pose_path, namespace, variant)
+        stamp = file_stamp(pose_path)
+
+        # Reuse the plan if the file is the same as when we compiled it.
+        plan = self._plans.get(key)
+        if plan is not None and stamp is not None and plan.stamp == stamp:
+            self._plans.move_to_end(key)
+            return plan
+
+        contents = read_func(pose_path)
+        if contents is None:
+            self._plans.pop(key, None)
+            return None
+
+        plan = self.compile(contents, namespace, stamp)
+        if plan.missing:
+            IOM.warning("Skipping controls not found in the scene: %s" % plan.missing)
+
+        # Keep the cache bounded, dropping the least recently used plans.
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_plans:
+            self._plans.popitem(last=False)
+
+        return plan
+
+
+    def apply(self, plan, chunk_name="poseLibraryApply", current=None, undoable=True):
+        """
+        Sets the plan's values on the rig. Plugs already at their value are skipped, and
+        everything else is set in one pass inside one undo chunk.
+
+        :param plan: The compiled plan to apply.
+        :type: PoseApplyPlan
+
+        :param chunk_name: The name of the undo chunk.
+        :type: str
+
+        :param current: The plugs' values if they were just read, like for a snapshot.
+        :type: list
+
+        :param undoable: Off sets every plug in one MDGModifier instead, without an
+                         undo chunk, for changes that are put back without undo.
+        :type: bool
+
+        :return: The number of plugs that were set.
+        :type: int
+        """
+        # Find what actually needs to change before opening the undo chunk.
+        changed = self._changed(plan, current)
+
+        self.last_skipped = len(plan.plugs) - len(changed)
+        self.last_set = 0
+        self.last_failed = 0
+        if not changed:
+            return 0
+
+        if undoable:
+            cmds.undoInfo(openChunk=True, chunkName=chunk_name)
+        try:
+            failed = self._set(plan, changed, undoable)
+        finally:
+            if undoable:
+                cmds.undoInfo(closeChunk=True)
+
+        if failed:
+            IOM.warning("Unable to set: %s" % failed)
+
+        self.last_failed = len(failed)
+        self.last_set = len(changed) - len(failed)
+        return self.last_set
+
+
+    def apply_many(self, plans, chunk_name="poseLibraryApplyMany"):
+        """
+        Sets several plans on their rigs inside one undo chunk, like one pose on every
+        instance of a character.
+
+        :param plans: (label, plan) pairs, the label is what the report is keyed by.
+        :type: list
+
+        :return: {label: {"set": int, "skipped": int, "failed": list, "seconds": float}}
+        :type: OrderedDict
+        """
+        report = OrderedDict()
+        cmds.undoInfo(openChunk=True, chunkName=chunk_name)
+        try:
+            for label, plan in plans:
+                start = time.perf_counter()
+                changed = self._changed(plan)
+                failed = self._set(plan, changed)
+                report[label] = {"set": len(changed) - len(failed),
+                                 "skipped": len(plan.plugs) - len(changed),
+                                 "failed": failed,
+                                 "seconds": time.perf_counter() - start}
+        finally:
+            cmds.undoInfo(closeChunk=True)
+
+        return report
+
+
+    def key_many(self, frame_plans, chunk_name="poseLibraryBake"):
+        """
+        Sets keys for plans at frames, without moving the current time, in one undo
+        chunk. The keys are gathered per animation curve first. Every frame a plug
+        holds the same value at goes into one setKeyframe call, and plugs keyed to the
+        same value on the same frames share that call.
+
+        setKeyframe only takes one value, so a plug still costs a call for every
+        different value it's keyed to. MFnAnimCurve.addKeys could key a whole curve in
+        one call, but like an MDGModifier a script can't put it on the undo queue, and
+        a bake has to be undoable.
+
+        :param frame_plans: (frame, plan) pairs.
+        :type: list
+
+        :return: The number of keys set and the "plug@frame" keys that failed.
+        :type: int, list
+        """
+        # {plug: {value: [frames]}}, a plug often holds a value across several poses.
+        curves = OrderedDict()
+        for frame, plan in frame_plans:
+            for plug, value in zip(plan.plugs, plan.values):
+                frames_by_value = curves.setdefault(plug, OrderedDict())
+                frames_by_value.setdefault(value, []).append(frame)
+
+        # {(value, frames): [plugs]}, poses repeat a lot of values like 0 and 1.
+        groups = OrderedDict()
+        for plug, frames_by_value in curves.items():
+            for value, frames in frames_by_value.items():
+                groups.setdefault((value, tuple(frames)), []).append(plug)
+
+        set_keyframe = cmds.setKeyframe
+        key_count = 0
+        failed = []
+        cmds.undoInfo(openChunk=True, chunkName=chunk_name)
+        try:
+            for (value, frames), plugs in groups.items():
+                times = [(x, x) for x in frames]
+                try:
+                    set_keyframe(plugs, time=times, value=value)
+                    key_count += len(plugs) * len(frames)
+                    continue
+                except RuntimeError:
+                    pass
+
+                # Something in the group is locked, key them one by one to find it.
+                for plug in plugs:
+                    try:
+                        set_keyframe(plug, time=times, value=value)
+                        key_count += len(frames)
+                    except RuntimeError:
+                        failed += ["%s@%s" % (plug, x) for x in frames]
+        finally:
+            cmds.undoInfo(closeChunk=True)
+
+        return key_count, failed
+
+
+    def _changed(self, plan, current=None):
+        # The indices of the plugs that aren't at the plan's values.
+        tolerance = self.tolerance
+        if current is None:
+            current = self.read_values(plan)
+        return [index for index, (value, curr_value) in \
+                enumerate(zip(plan.values, current)) \
+                if abs(curr_value - value) > tolerance]
+
+
+    def _set(self, plan, changed, undoable=True):
+        return set_plugs(plan.plugs, plan.handles, plan.scales, plan.values, changed,
+                         undoable)
+
+
+    def invalidate(self, pose_path=None):
+        """
+        Drops cached plans. Useful when rigs are swapped or the file is rewritten.
+
+        :param pose_path: Only drop the plans for this pose file. Drops all if None.
+        :type: str
+        """
+        if pose_path is None:
+            self._plans.clear()
+            return None
+
+        for key in [x for x in self._plans if x[0] == pose_path]:
+            self._plans.pop(key)
+
+
+class PoseCapture(object):
+    """
+    Reads the keyable values of a rig's controls in bulk. The keyable attributes of
+    every control are listed once per rig and kept with their resolved MPlugs, so saving
+    a pose after that reads straight from the plugs, without a listAttr or a getAttr
+    command per attribute.
+    """
+    def __init__(self):
+
+        # {namespace: {control: (attrs, handles, scales)}}, the schema of each rig.
+        self.schemas = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def capture(self, selected):
+        """
+        Captures the values of the selected controls.
+
+        :param selected: The namespaced controls, like "octoNinja:l_eye_CC".
+        :type: list
+
+        :return: The pose, with the controls named without their namespace, or None if a
+            control isn't in a rig's namespace.
+        :type: PoseData
+        """
+        pose_data = PoseData()
+        for item in selected:
+            # The namespace is how we know the rig, a control without one can't be saved.
+            if ":" not in item:
+                IOM.error("%s is not in a rig's namespace, can't save it." % item)
+                return None
+            namespace, just_cc = item.split(":")[:2]
+            attrs, values = self.read_control(item, namespace, just_cc)
+            pose_data.add_control(just_cc, zip(attrs, values))
+
+        return pose_data
+
+
+    def read_control(self, item, namespace, control):
+        """
+        Reads the keyable values of one control, listing its schema the first time.
+
+        :param item: The namespaced control.
+        :type: str
+
+        :param namespace: The rig's namespace.
+        :type: str
+
+        :param control: The control's name without the namespace.
+        :type: str
+
+        :return: The keyable attribute names and their values in UI units.
+        :type: list, list
+        """
+        rig_schema = self.schemas.setdefault(namespace, {})
+        schema = rig_schema.get(control)
+        if schema is not None:
+            try:
+                values = [x.asDouble() * y for x, y in zip(schema[1], schema[2])]
+                self.hits += 1
+                return schema[0], values
+            except RuntimeError:
+                # The rig was reloaded or changed under us, list it again.
+                pass
+
+        self.misses += 1
+        schema = self._build_schema(item)
+        rig_schema[control] = schema
+        return schema[0], [x.asDouble() * y for x, y in zip(schema[1], schema[2])]
+
+
+    def invalidate(self, namespace=None):
+        """
+        Forgets the schema of a rig, or of every rig if no namespace is given.
+
+        :param namespace: The rig's namespace.
+        :type: str
+        """
+        if namespace is None:
+            self.schemas.clear()
+        else:
+            self.schemas.pop(namespace, None)
+
+
+    def _build_schema(self, item):
+        # Get the list of attributes that are keyable. Remove any dividers.
+        keyable_attrs = cmds.listAttr(item, keyable=True) or []
+        keyable_attrs = [x for x in keyable_attrs if not x.find("__") == 0]
+
+        # Same unit handling as the apply engine, MPlugs read in internal units.
+        angle_scale = om.MAngle(1.0).asUnits(om.MAngle.uiUnit())
+        distance_scale = om.MDistance(1.0).asUnits(om.MDistance.uiUnit())
+
+        attrs = []
+        handles = []
+        scales = array("d")
+        sel_list = om.MSelectionList()
+        for curr_attr in keyable_attrs:
+            try:
+                sel_list.add("%s.%s" % (item, curr_attr))
+            except RuntimeError:
+                continue
+            handle = sel_list.getPlug(sel_list.length() - 1)
+
+            scale = 1.0
+            mobj = handle.attribute()
+            if mobj.hasFn(om.MFn.kUnitAttribute):
+                unit_type = om.MFnUnitAttribute(mobj).unitType()
+                if unit_type == om.MFnUnitAttribute.kAngle:
+                    scale = angle_scale
+                elif unit_type == om.MFnUnitAttribute.kDistance:
+                    scale = distance_scale
+
+            attrs.append(curr_attr)
+            handles.append(handle)
+            scales.append(scale)
+
+        return attrs, handles, scales
+
+
+class PoseDefaults(object):
+    """
+    The default pose of each character, that sparse poses are saved against. A
+    control's defaults are the attribute defaults the rig was built with, read the
+    first time the control is saved in a sparse pose and kept in
+    <data_dir>.defaults/<char>.pbin from then on. Defaults are only ever added, never
+    changed, so a sparse pose always expands the same way it was saved.
+    """
+    def __init__(self, root):
+
+        self.root = root
+
+        # {char: (file stamp, {control: {attr: value}})}
+        self._defaults = {}
+
+
+    def path(self, char):
+        return "%s/%s.%s" % (self.root, char, BIN_EXT)
+
+
+    def get(self, char):
+        """
+        Gets a character's default pose, reading it again if someone added to it.
+
+        :param char: The character.
+        :type: str
+
+        :return: The default pose, {control: {attr: value}}.
+        :type: dict
+        """
+        def_path = self.path(char)
+        stamp = file_stamp(def_path)
+        cached = self._defaults.get(char)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        defaults = {}
+        pose_data = read_pose(def_path) if stamp is not None else None
+        if pose_data is not None:
+            for control, attrs, values in pose_data.iter_controls():
+                defaults[control] = dict(zip(attrs, values))
+            pose_data.release()
+
+        self._defaults[char] = (stamp, defaults)
+        return defaults
+
+
+    def extend(self, char, pose_data, namespace):
+        """
+        Adds the attribute defaults of any control and attribute in a pose that the
+        character's default pose doesn't have yet.
+
+        :param char: The character.
+        :type: str
+
+        :param pose_data: The pose about to be saved.
+        :type: PoseData
+
+        :param namespace: The namespace of the rig the pose was captured from.
+        :type: str
+
+        :return: The default pose, {control: {attr: value}}.
+        :type: dict
+        """
+        defaults = self.get(char)
+        added = 0
+        for control, attrs in zip(pose_data.controls, pose_data.attrs):
+            control_defaults = defaults.setdefault(control, {})
+            item = "%s:%s" % (namespace, control)
+            for attr in attrs:
+                if attr in control_defaults:
+                    continue
+                try:
+                    default = cmds.attributeQuery(attr, node=item, listDefault=True)
+                except RuntimeError:
+                    default = None
+
+                # Without a default the attribute is always kept in the pose.
+                if default:
+                    control_defaults[attr] = float(default[0])
+                    added += 1
+
+        if not added:
+            return defaults
+
+        # Write it to a temp file and swap it in, others may be reading it.
+        full = PoseData()
+        for control in sorted(defaults):
+            full.add_control(control, sorted(defaults[control].items()))
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok=True)
+        def_path = self.path(char)
+        temp_path = "%s.%d.tmp" % (def_path, os.getpid())
+        write_pose(full, temp_path)
+        os.replace(temp_path, def_path)
+
+        self._defaults[char] = (file_stamp(def_path), defaults)
+        return defaults
+
+
+class PoseSnapshot(object):
+    """
+    The values of a set of plugs at one moment, read in bulk from their MPlugs so they
+    can be put back in one pass. Plugs are added as they're about to be changed, the
+    first value seen is the one kept, so it only ever holds what it needs to restore.
+    Putting values back only sets the plugs that aren't already at them.
+    """
+    def __init__(self, tolerance=1e-5):
+
+        self.tolerance = tolerance
+        self.plugs = []
+        self.handles = []
+        self.scales = array("d")
+        self.values = array("d")
+
+        # {plug: position}
+        self.index = {}
+
+
+    def __len__(self):
+        return len(self.plugs)
+
+
+    def add(self, plan, current=None):
+        """
+        Snapshots the plan's plugs that aren't in the snapshot yet.
+
+        :param plan: The plan about to be applied.
+        :type: PoseApplyPlan
+
+        :param current: The plugs' values if they were just read.
+        :type: list
+
+        :return: The number of plugs added.
+        :type: int
+        """
+        index = self.index
+        added = 0
+        if current is None:
+            current = [x.asDouble() * y for x, y in zip(plan.handles, plan.scales)]
+        for plug, handle, scale, value in zip(plan.plugs, plan.handles, plan.scales,
+                                              current):
+            if plug in index:
+                continue
+            index[plug] = len(self.plugs)
+            self.plugs.append(plug)
+            self.handles.append(handle)
+            self.scales.append(scale)
+            self.values.append(value)
+            added += 1
+
+        return added
+
+
+    def values_with(self, plan):
+        """
+        Gets the snapshot's values with a plan's values on top, what the rig looks like
+        with only that pose applied over the snapshot.
+
+        :param plan: A plan whose plugs are all in the snapshot.
+        :type: PoseApplyPlan
+
+        :return: The values, lined up with self.plugs.
+        :type: array
+        """
+        values = array("d", self.values)
+        index = self.index
+        for plug, value in zip(plan.plugs, plan.values):
+            values[index[plug]] = value
+        return values
+
+
+    def restore(self, undoable=True, chunk_name="poseLibraryRestore"):
+        """
+        Puts every plug back to its snapshot value.
+
+        :param undoable: Put it on the undo queue as one chunk, otherwise set it with
+                         the undo queue off.
+        :type: bool
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        return self.set_values(self.values, undoable, chunk_name)
+
+
+    def set_values(self, values, undoable=True, chunk_name="poseLibraryRestore"):
+        """
+        Sets the plugs to values, only the ones that aren't already at them.
+
+        :param values: The values, lined up with self.plugs.
+        :type: list
+
+        :param undoable: Put it on the undo queue as one chunk, otherwise set it in one
+                         batch off the undo queue.
+        :type: bool
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        tolerance = self.tolerance
+        changed = [index for index, (value, handle, scale) in \
+                   enumerate(zip(values, self.handles, self.scales)) \
+                   if abs(handle.asDouble() * scale - value) > tolerance]
+        if not changed:
+            return 0
+
+        if undoable:
+            cmds.undoInfo(openChunk=True, chunkName=chunk_name)
+        try:
+            set_plugs(self.plugs, self.handles, self.scales, values, changed, undoable)
+        finally:
+            if undoable:
+                cmds.undoInfo(closeChunk=True)
+
+        return len(changed)
+
+
+class PoseMirrorTable(object):
+    """
+    Maps a character's controls and attributes to their mirror image, so a pose saved
+    on one side can be applied to the other. Control names swap their side tokens, so
+    "l_arm_CC" is "r_arm_CC" and back. A token ending in "_" only matches the start of a
+    name, one starting with "_" only the end. Any other token has to be a whole word,
+    between "_" or the ends of the name, or a capitalised word in camel case, so
+    "left_arm_CC" and "armLeft_CC" swap but "cleft_chin_CC" doesn't. The attributes in
+    negate_attrs flip their sign, on center controls too.
+
+    Names are worked out the first time they're seen and kept, so mirroring a pose
+    again is only lookups.
+    """
+    def __init__(self, side_tokens=None, negate_attrs=None):
+
+        # (left, right) pairs, tried in order.
+        self.side_tokens = side_tokens or [("l_", "r_"), ("L_", "R_"), ("_l", "_r"),
+                                           ("_L", "_R"), ("left", "right"),
+                                           ("Left", "Right")]
+
+        # Mirroring across the YZ plane.
+        self.negate_attrs = set(negate_attrs or ("translateX", "rotateY", "rotateZ"))
+
+        # {control: mirrored control} and {(control, attr): (mirrored control, attr,
+        # sign)}.
+        self.controls = {}
+        self.entries = {}
+
+
+    def mirror_control(self, control):
+        """
+        Gets the name of the control on the other side.
+
+        :param control: The control's name without the namespace.
+        :type: str
+
+        :return: The mirrored control, or the control itself if it's in the center.
+        :type: str
+        """
+        mirrored = self.controls.get(control)
+        if mirrored is not None:
+            return mirrored
+
+        mirrored = control
+        for left, right in self.side_tokens:
+            swapped = self._swap(control, left, right)
+            if swapped is None:
+                swapped = self._swap(control, right, left)
+            if swapped is not None:
+                mirrored = swapped
+                break
+
+        self.controls[control] = mirrored
+        return mirrored
+
+
+    def mirror(self, pose_data):
+        """
+        Gets the mirror image of a pose.
+
+        :param pose_data: The pose.
+        :type: PoseData
+
+        :return: The mirrored pose.
+        :type: PoseData
+        """
+        entries = self.entries
+        mirrored = PoseData()
+        for control, attrs, values in pose_data.iter_controls():
+            attr_values = []
+            target = None
+            for attr, value in zip(attrs, values):
+                entry = entries.get((control, attr))
+                if entry is None:
+                    sign = -1.0 if attr in self.negate_attrs else 1.0
+                    entry = entries[(control, attr)] = (self.mirror_control(control),
+                                                        attr, sign)
+                target = entry[0]
+                attr_values.append((entry[1], entry[2] * value))
+            mirrored.add_control(target or self.mirror_control(control), attr_values)
+
+        return mirrored
+
+
+    def _swap(self, control, from_token, to_token):
+        if from_token.endswith("_"):
+            if control.startswith(from_token):
+                return to_token + control[len(from_token):]
+        elif from_token.startswith("_"):
+            if control.endswith(from_token):
+                return control[:-len(from_token)] + to_token
+        else:
+            index = control.find(from_token)
+            while index != -1:
+                if self._is_word(control, index, len(from_token)):
+                    return control[:index] + to_token + \
+                                                control[index + len(from_token):]
+                index = control.find(from_token, index + 1)
+        return None
+
+
+    def _is_word(self, control, index, length):
+        # If control[index:index + length] is a word of its own. It starts the name,
+        # follows a "_" or starts a camel case word, and ends the name, comes before a
+        # "_" or comes before the next camel case word or a number.
+        before = control[index - 1] if index else "_"
+        after = control[index + length] if index + length < len(control) else "_"
+        starts = before == "_" or (control[index].isupper() and before.islower())
+        ends = after == "_" or after.isupper() or after.isdigit()
+        return starts and ends
+
+
+class PoseBlend(object):
+    """
+    Blends the rig from where it was when the blend started toward a pose. The start
+    and target values are read once, and every weight after that is one multiply-add
+    over the plug vector. Plugs that don't move are dropped up front, and plugs that
+    didn't change since the last weight aren't set again, so a slider can drag it.
+
+    While blending, the plugs are set in one batch off the undo queue. Ending the blend
+    puts the start values back silently, then sets the final values in one undo chunk,
+    so a whole slider drag is one undo.
+    """
+    def __init__(self, plan, start_values, tolerance=1e-5, shortest_rotation=True):
+
+        self.plan = plan
+        self.tolerance = tolerance
+        self.weight = 0.0
+
+        # Rotations take the shortest way around, so blending from 350 to 10 goes
+        # through 0 instead of back through 180.
+        period = plan.angle_period
+        deltas = []
+        for value, start, is_angle in zip(plan.values, start_values, plan.angular):
+            delta = value - start
+            if is_angle and shortest_rotation:
+                delta = (delta + period / 2.0) % period - period / 2.0
+            deltas.append(delta)
+
+        # Only keep the plugs that actually move.
+        active = [x for x, y in enumerate(deltas) if abs(y) > tolerance]
+        self.plugs = [plan.plugs[x] for x in active]
+        self.handles = [plan.handles[x] for x in active]
+        self.scales = [plan.scales[x] for x in active]
+        if np is not None:
+            self.start = np.array([start_values[x] for x in active], dtype=np.float64)
+            self.delta = np.array([deltas[x] for x in active], dtype=np.float64)
+        else:
+            self.start = array("d", [start_values[x] for x in active])
+            self.delta = array("d", [deltas[x] for x in active])
+        self.current = self.start
+
+
+    def values_at(self, weight):
+        """
+        Gets the blended values of the moving plugs.
+
+        :param weight: 0 is where the rig started, 1 is the pose.
+        :type: float
+
+        :return: The values, lined up with self.plugs.
+        :type: numpy.ndarray or array
+        """
+        if np is not None:
+            return self.start + weight * self.delta
+        return array("d", [x + weight * y for x, y in zip(self.start, self.delta)])
+
+
+    def set_weight(self, weight):
+        """
+        Moves the rig to a weight, setting only the plugs that changed since the last
+        weight. Runs with the undo queue off.
+
+        :param weight: 0 is where the rig started, 1 is the pose.
+        :type: float
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        weight = min(max(float(weight), 0.0), 1.0)
+        values = self.values_at(weight)
+        changed = self._changed(values)
+        self._set(changed, values, undoable=False)
+        self.current = values
+        self.weight = weight
+        return len(changed)
+
+
+    def finish(self, commit=True):
+        """
+        Ends the blend. Committing puts the start values back with undo off, then sets
+        the final values in one undo chunk. Cancelling just puts the start values back.
+
+        :param commit: Keep the blended pose, otherwise go back to where we started.
+        :type: bool
+
+        :return: The number of plugs set in the undo chunk.
+        :type: int
+        """
+        final = self.current
+        self._set(self._changed(self.start), self.start, undoable=False)
+        self.current = self.start
+        if not commit or self.weight == 0.0:
+            return 0
+
+        indices = list(range(len(self.plugs)))
+        self._set(indices, final, undoable=True)
+        self.current = final
+        return len(indices)
+
+
+    def _changed(self, values):
+        tolerance = self.tolerance
+        if np is not None:
+            return np.nonzero(np.abs(values - self.current) > tolerance)[0].tolist()
+        return [x for x, (y, z) in enumerate(zip(values, self.current)) \
+                                                            if abs(y - z) > tolerance]
+
+
+    def _set(self, indices, values, undoable=True):
+        if not indices:
+            return None
+
+        if np is not None:
+            values = values.tolist()
+
+        if undoable:
+            cmds.undoInfo(openChunk=True, chunkName="poseLibraryBlend")
+        try:
+            set_plugs(self.plugs, self.handles, self.scales, values, indices, undoable)
+        finally:
+            if undoable:
+                cmds.undoInfo(closeChunk=True)
+
+
+class PoseSearchIndex(object):
+    """
+    The poses of one character as rows of a matrix, for finding the poses closest to
+    how a rig is posed. Every (control, attr) any of the poses has is a column, and a
+    pose is only compared on the columns it has, so a hand pose is as easy to find as a
+    full body pose. Poses are added and removed a row at a time as they come and go.
+
+    The distance is the root mean square of the differences over the columns both the
+    pose and the rig have, in the units the poses are saved in. With NumPy it's a few
+    matrix-vector products over the whole library. Past approx_threshold poses the rows
+    are clustered, and a search only measures the poses in the clusters closest to the
+    rig.
+    """
+    def __init__(self, approx_threshold=20000, probes=8):
+
+        self.approx_threshold = approx_threshold
+        self.probes = probes
+
+        # {(control, attr): column}, and the keys in column order.
+        self.columns = {}
+        self.column_keys = []
+
+        # The pose on each row, {pose: row} and {pose: data path}.
+        self.poses = []
+        self.rows = {}
+        self.paths = {}
+
+        # {pose: data path} of poses that couldn't be read, so they aren't read again
+        # until their file moves.
+        self.unreadable = {}
+
+        # With NumPy, the values and masks are matrices with spare rows, and the sum of
+        # squares and column count of each row. Without it, each row is its columns and
+        # values.
+        self._values = None
+        self._mask = None
+        self._row_sq = None
+        self._row_count = None
+        self._sparse = []
+
+        # The clusters of the approximate search, trained when it's first used.
+        self._centroids = None
+        self._weights = None
+        self._labels = None
+        self._trained_rows = 0
 
-#----------------------------------------------------------------------------------------#
-#--------------------------------------------------------------------------- FUNCTIONS --#
 
-#----------------------------------------------------------------------------------------#
-#----------------------------------------------------------------------------- CLASSES --#
+    def __len__(self):
+        return len(self.poses)
+
+
+    def sync(self, pose_paths, loader):
+        """
+        Brings the rows in line with a character's poses, only reading the poses that
+        are new or moved to another file.
+
+        :param pose_paths: {pose: data path} of every pose the character has.
+        :type: dict
+
+        :param loader: Reads a data path into a PoseData.
+        :type: function
+
+        :return: The number of poses added and removed.
+        :type: int, int
+        """
+        removed = [x for x, y in self.paths.items() if pose_paths.get(x) != y]
+        for pose in removed:
+            self.remove(pose)
+
+        added = 0
+        for pose, data_path in pose_paths.items():
+            if pose in self.rows or self.unreadable.get(pose) == data_path:
+                continue
+            pose_data = loader(data_path)
+            if pose_data is None:
+                self.unreadable[pose] = data_path
+                continue
+            self.unreadable.pop(pose, None)
+            self.add(pose, pose_data, data_path)
+            added += 1
+
+        return added, len(removed)
+
+
+    def add(self, pose, pose_data, data_path=None):
+        """
+        Adds a pose as a row, adding columns for anything new it has.
+
+        :param pose: The pose's name.
+        :type: str
+
+        :param pose_data: The full pose.
+        :type: PoseData
+
+        :param data_path: The file the pose was read from.
+        :type: str
+
+        :return: The pose's row.
+        :type: int
+        """
+        if pose in self.rows:
+            self.remove(pose)
+
+        columns = self.columns
+        cols = []
+        vals = []
+        for control, attr, value in pose_data.items():
+            col = columns.get((control, attr))
+            if col is None:
+                col = columns[(control, attr)] = len(self.column_keys)
+                self.column_keys.append((control, attr))
+            cols.append(col)
+            vals.append(value)
+
+        row = len(self.poses)
+        self.poses.append(pose)
+        self.rows[pose] = row
+        self.paths[pose] = data_path
+
+        if np is None:
+            self._sparse.append((cols, vals))
+            return row
+
+        self._reserve(row + 1)
+        self._values[row, cols] = vals
+        self._mask[row, cols] = 1.0
+        self._row_sq[row] = sum(x * x for x in vals)
+        self._row_count[row] = len(cols)
+        if self._centroids is not None:
+            self._labels[row] = self._assign(self._values[row:row + 1],
+                                             self._mask[row:row + 1])[0]
+        return row
+
+
+    def remove(self, pose):
+        """
+        Removes a pose, moving the last row into its place.
+
+        :param pose: The pose's name.
+        :type: str
+
+        :return: If the pose had a row.
+        :type: bool
+        """
+        self.unreadable.pop(pose, None)
+        self.paths.pop(pose, None)
+        row = self.rows.pop(pose, None)
+        if row is None:
+            return False
+
+        last = len(self.poses) - 1
+        last_pose = self.poses.pop()
+        if row != last:
+            self.poses[row] = last_pose
+            self.rows[last_pose] = row
+
+        if np is None:
+            last_row = self._sparse.pop()
+            if row != last:
+                self._sparse[row] = last_row
+            return True
+
+        for matrix in (self._values, self._mask, self._row_sq, self._row_count):
+            matrix[row] = matrix[last]
+            matrix[last] = 0.0
+        if self._labels is not None:
+            self._labels[row] = self._labels[last]
+            self._labels[last] = -1
+        return True
+
+
+    def clear(self):
+        """
+        Forgets every pose and column.
+        """
+        self.__init__(self.approx_threshold, self.probes)
+
+
+    def search(self, query, available=None, count=5, approximate=None):
+        """
+        Finds the poses closest to a vector of values over the columns.
+
+        :param query: A value per column, like the rig's current values.
+        :type: list
+
+        :param available: 1 for the columns to compare, 0 for the ones to leave out,
+                          like controls the rig doesn't have. Every column if None.
+        :type: list
+
+        :param count: The number of poses to find.
+        :type: int
+
+        :param approximate: Only measure the closest clusters. Automatic past
+                            approx_threshold poses if None, never without NumPy.
+        :type: bool
+
+        :return: (pose, distance) pairs, closest first. Poses with no columns in
+                 common with the query aren't found.
+        :type: list
+        """
+        num_rows = len(self.poses)
+        if not num_rows or count < 1:
+            return []
+        if available is None:
+            available = [1.0] * len(query)
+
+        if np is None:
+            return self._search_python(query, available, count)
+
+        width = self._values.shape[1]
+        query_vec = np.zeros(width)
+        query_vec[:len(query)] = query
+        avail_vec = np.zeros(width)
+        avail_vec[:len(available)] = available
+
+        rows = None
+        if approximate is None:
+            approximate = num_rows >= self.approx_threshold
+        if approximate:
+            rows = self._candidates(query_vec, avail_vec, count)
+
+        values = self._values[:num_rows] if rows is None else self._values[rows]
+        mask = self._mask[:num_rows] if rows is None else self._mask[rows]
+        row_sq = self._row_sq[:num_rows] if rows is None else self._row_sq[rows]
+        row_count = self._row_count[:num_rows] if rows is None else self._row_count[rows]
+
+        # Sum over the shared columns of (x - q)^2 = x^2 - 2xq + q^2. The row sums of x^2
+        # are kept, so only the columns left out need taking back off.
+        left_out = np.nonzero(avail_vec[:len(self.column_keys)] == 0.0)[0]
+        if len(left_out):
+            row_sq = row_sq - (values[:, left_out] ** 2).sum(axis=1)
+            row_count = row_count - mask[:, left_out].sum(axis=1)
+        masked_query = query_vec * avail_vec
+        sq_dist = row_sq - 2.0 * values.dot(masked_query) + \
+                                                    mask.dot(masked_query * query_vec)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = np.sqrt(np.maximum(sq_dist, 0.0) / row_count)
+        dist[row_count <= 0] = np.inf
+
+        count = min(count, len(dist))
+        found = np.argpartition(dist, count - 1)[:count]
+        found = found[np.argsort(dist[found])]
+
+        results = []
+        for index in found.tolist():
+            if not np.isfinite(dist[index]):
+                break
+            row = index if rows is None else int(rows[index])
+            results.append((self.poses[row], float(dist[index])))
+        return results
+
+
+    def _search_python(self, query, available, count):
+        distances = []
+        for row, (cols, vals) in enumerate(self._sparse):
+            total = 0.0
+            shared = 0
+            for col, value in zip(cols, vals):
+                if col < len(query) and available[col]:
+                    diff = value - query[col]
+                    total += diff * diff
+                    shared += 1
+            if shared:
+                distances.append((math.sqrt(total / shared), row))
+
+        return [(self.poses[y], x) for x, y in heapq.nsmallest(count, distances)]
+
+
+    def _reserve(self, num_rows):
+        # Grow the matrices to fit the rows and every column, with room to spare so
+        # adding poses one at a time doesn't copy them every time.
+        num_cols = len(self.column_keys)
+        old_rows, old_cols = (0, 0) if self._values is None else self._values.shape
+        if num_rows <= old_rows and num_cols <= old_cols:
+            return None
+
+        new_rows = max(num_rows, old_rows * 2, 64) if num_rows > old_rows else old_rows
+        new_cols = max(num_cols, old_cols + old_cols // 2) if num_cols > old_cols else \
+                                                                            old_cols
+        for name in ("_values", "_mask"):
+            matrix = np.zeros((new_rows, new_cols))
+            if old_rows:
+                matrix[:old_rows, :old_cols] = getattr(self, name)
+            setattr(self, name, matrix)
+        for name in ("_row_sq", "_row_count"):
+            vector = np.zeros(new_rows)
+            if old_rows:
+                vector[:old_rows] = getattr(self, name)
+            setattr(self, name, vector)
+
+        if self._centroids is not None:
+            for name in ("_centroids", "_weights"):
+                matrix = np.zeros((len(self._centroids), new_cols))
+                matrix[:, :old_cols] = getattr(self, name)
+                setattr(self, name, matrix)
+            labels = np.full(new_rows, -1, dtype=np.int64)
+            labels[:old_rows] = self._labels
+            self._labels = labels
+
+
+    def _candidates(self, query_vec, avail_vec, count):
+        # Retrain once the library doubled, the clusters drift as poses are added.
+        num_rows = len(self.poses)
+        if self._centroids is None or num_rows > 2 * self._trained_rows:
+            self._train()
+
+        # Distance to each cluster's mean over the columns its poses have, weighted by
+        # how many of them have it.
+        weights = self._weights * avail_vec
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cluster_dist = ((self._centroids - query_vec) ** 2 * weights).sum(axis=1) / \
+                                                                    weights.sum(axis=1)
+        cluster_dist[~np.isfinite(cluster_dist)] = np.inf
+
+        probes = np.argsort(cluster_dist)[:self.probes]
+        rows = np.nonzero(np.isin(self._labels[:num_rows], probes))[0]
+        if len(rows) < count:
+            return None
+        return rows
+
+
+    def _train(self, iterations=6, sample_size=4096):
+        # k-means on a sample of the rows, then every row goes to its nearest cluster.
+        num_rows = len(self.poses)
+        values = self._values[:num_rows]
+        mask = self._mask[:num_rows]
+        random = np.random.RandomState(0)
+        sample = random.choice(num_rows, min(num_rows, sample_size), replace=False)
+        sample_values = values[sample]
+        sample_mask = mask[sample]
+
+        num_clusters = max(1, min(256, int(math.sqrt(num_rows))))
+        seeds = random.choice(len(sample), num_clusters, replace=False)
+        self._centroids = sample_values[seeds].copy()
+        self._weights = sample_mask[seeds].copy()
+        for _ in range(iterations):
+            labels = self._assign(sample_values, sample_mask)
+            members = np.zeros((num_clusters, len(sample)))
+            members[labels, np.arange(len(sample))] = 1.0
+            sizes = np.maximum(members.sum(axis=1), 1.0)[:, None]
+            counts = members.dot(sample_mask)
+            self._centroids = members.dot(sample_values) / np.maximum(counts, 1.0)
+            self._weights = counts / sizes
+
+        self._labels = np.full(self._values.shape[0], -1, dtype=np.int64)
+        self._labels[:num_rows] = self._assign(values, mask)
+        self._trained_rows = num_rows
+
+
+    def _assign(self, values, mask):
+        # The nearest cluster mean over the columns each row has. The row's own sum of
+        # squares is the same for every cluster, so it's left out.
+        centroids = self._centroids
+        dist = mask.dot((centroids ** 2).T) - 2.0 * values.dot(centroids.T)
+        return np.argmin(dist, axis=1)
+
 
 class PoseLibraryUtil(object):
     """
@@ -57,17 +1403,72 @@ class PoseLibraryUtil(object):
         self.pose_search_dir = None
         self.proj_data_path = None
         self.proj_imgs_path = None
+        self.manifest = None
+
+        # Flat or a directory per character, the manifest only reads the shards of the
+        # characters in the scene once it's sharded.
+        self.pose_layout = None
 
         self.match_char_dict = None
+        self.char_matcher = None
         self.pose_paths = None
 
+        # {char: {name: pose}} so any name the GUI has for a pose, like "sit" from the
+        # title label or "sit.png" from the image label, is one lookup to its pose.
+        self.pose_index = {}
+
+        # {(char, pose): (size, mtime)} of the data files, to tell what changed on the
+        # network drive between two scans.
+        self.pose_stamps = {}
+
+        # The format new poses are written in, XML_EXT, BIN_EXT or REF_EXT to keep them
+        # in the content-addressed store. Every format is always read.
+        self.pose_format = XML_EXT
+
+        # Save poses with only the values that differ from the character's default
+        # pose. Sparse poses are always read, whatever this is set to.
+        self.sparse_poses = False
+        self.sparse_tolerance = SPARSE_TOLERANCE
+        self.pose_defaults = None
+
         self.curr_char    = None
         self.curr_char_ns = None
 
+        self.apply_engine = PoseApplyEngine()
+        self.pose_blend = None
+
+        # The plugs the last apply changed as they were before it, for revert_pose. And
+        # while previewing, the plugs the previews touched as they were before them.
+        self.last_snapshot = None
+        self.pose_preview = None
+        self.preview_key = None
+
+        # The keyable attributes of each rig, so saving a pose reads the plugs in bulk.
+        self.pose_capture = PoseCapture()
 
-    def gather_info(self):
+        # Parsed poses, so applying the same pose again doesn't go back to the network.
+        self.pose_cache = PoseCache()
+
+        # {char: PoseSearchIndex} for finding the poses closest to a rig, and
+        # {(char, namespace): (columns, plan, positions)} to read the rig's values with.
+        self.pose_search = {}
+        self._search_plans = {}
+
+        # {char: PoseMirrorTable}, made with these rules the first time a character's
+        # pose is mirrored.
+        self.mirror_tables = {}
+        self.mirror_side_tokens = None
+        self.mirror_negate_attrs = None
+
+
+    @traced("gather_info")
+    def gather_info(self, scan=True):
         """
         Will gather the information at the start.
+
+        :param scan: Find the poses too. The GUI turns this off and streams the poses
+                     in from scan_poses on a worker thread instead.
+        :type: bool
         """
         # Check for any referenced rigs in the current Maya file. The tool won't launch if
         # there aren't any rigs in the scene.
@@ -86,7 +1487,10 @@ class PoseLibraryUtil(object):
         self.match_rigs_to_char()
 
         # Find any poses for any characters. We'll make a dictionary all we found.
-        self.find_poses()
+        if scan:
+            self.find_poses()
+        else:
+            self.reset_poses()
 
 
     def change_char(self, new_char=None, new_char_ns=None):
@@ -129,30 +1533,84 @@ class PoseLibraryUtil(object):
             IO.error('Could not find any references in the current Maya file.')
             return None
 
+        # The rigs may have been swapped or reloaded, list their attributes again.
+        self.pose_capture.invalidate()
+        self._search_plans = {}
         return all_refs
 
 
-    def get_pose_paths(self, pose_name):
+    def get_pose_paths(self, pose_name, char=None):
         """
         This will get the pose's data from the pose_paths dicitionary
 
-        :param pose_name: The pose's name we're looking for.
+        :param pose_name: The pose's name we're looking for. Either label's name works,
+                          "sit" and "sit.png" both find the "sit" pose.
         :type: str
+
+        :param char: The character the pose is for, the current character if None.
+        :type: str
+
+        :return: The pose's data and img file paths, or None, None if not found.
+        :type: str, str
         """
-        # With the character we're currently working on, find a match in the poses dict.
-        char = self.curr_char
-        pose_data = None
-        pose_img = None
-        for pose in self.pose_paths[char]:
-
-            # Even if the label's name is "sit.png" it can still find "sit" in it, and we
-            # got a match.
-            if pose == pose_name:
-                pose_data = self.pose_paths[char][pose]["data"]
-                pose_img = self.pose_paths[char][pose]["img"]
-                break
+        # With the character we're currently working on, find the pose in the index.
+        if char is None:
+            char = self.curr_char
+        pose = self.resolve_pose(pose_name, char)
+        if pose is None:
+            return None, None
+
+        pose_entry = self.pose_paths[char][pose]
+        return pose_entry["data"], pose_entry["img"]
+
+
+    def resolve_pose(self, pose_name, char=None):
+        """
+        Gets the pose key in the pose_paths dictionary from any name the pose goes by.
+
+        :param pose_name: The pose's name or one of its GUI object names.
+        :type: str
+
+        :param char: The character the pose is for, the current character if None.
+        :type: str
+
+        :return: The pose key, or None if the character has no such pose.
+        :type: str
+        """
+        if char is None:
+            char = self.curr_char
+
+        return self.pose_index.get(char, {}).get(pose_name)
+
+
+    def _index_pose(self, char, pose):
+        """
+        Adds the names a pose goes by to the pose index.
+
+        :param char: The character the pose is for.
+        :type: str
+
+        :param pose: The pose key in the pose_paths dictionary.
+        :type: str
+        """
+        char_index = self.pose_index.setdefault(char, {})
+        char_index[pose] = pose
+        char_index["%s.png" % pose] = pose
+
+
+    def _unindex_pose(self, char, pose):
+        """
+        Removes the names a pose goes by from the pose index.
+
+        :param char: The character the pose is for.
+        :type: str
 
-        return pose_data, pose_img
+        :param pose: The pose key in the pose_paths dictionary.
+        :type: str
+        """
+        char_index = self.pose_index.get(char, {})
+        char_index.pop(pose, None)
+        char_index.pop("%s.png" % pose, None)
 
 
     def get_pose_dir(self):
@@ -183,6 +1641,17 @@ class PoseLibraryUtil(object):
             except WindowsError or OSError:
                 IOM.error("Error trying to create the tool's \"imgs\" directory.")
 
+        # The index of the data directory, so we don't list it on every launch.
+        self.pose_layout = PoseLayout(self.proj_data_path, self.proj_imgs_path)
+        self._make_manifest()
+
+        # The default poses sparse poses are saved against.
+        self.pose_defaults = PoseDefaults(defaults_dir(self.proj_data_path))
+
+        # A library moved into the content-addressed store keeps saving poses there.
+        if os.path.isdir(store_dir(self.proj_data_path)):
+            self.pose_format = REF_EXT
+
         return self.proj_data_path, self.proj_imgs_path
 
 
@@ -207,127 +1676,483 @@ class PoseLibraryUtil(object):
             else:
                 self.match_char_dict[item.name].append(item.asset_ns)
 
+        # Build the matcher find_poses uses to tell which character a file is for.
+        self.char_matcher = CharacterMatcher(self.match_char_dict)
+
+        # A sharded library only reads these characters' shards.
+        if self.pose_layout is not None:
+            self._make_manifest()
+
         return self.match_char_dict
 
 
-    def find_poses(self):
+    def _make_manifest(self):
+        """
+        Makes the manifest of the library. Once the library is sharded it's the
+        manifests of the characters in the scene, or every character before the rigs
+        are matched to characters.
+
+        :return: The manifest.
+        :type: PoseManifest or ShardedManifest
+        """
+        if self.pose_layout is None:
+            self.pose_layout = PoseLayout(self.proj_data_path, self.proj_imgs_path)
+
+        self.manifest = self.pose_layout.manifest(self.match_char_dict)
+        return self.manifest
+
+
+    @traced("find_poses")
+    def find_poses(self):
+        """
+        Finds the poses in the project data path, and tries to find an image if it exists.
+
+        :return: The dictionary of the character and its poses we found, holding the
+                 data and img file paths.
+                 {"octoNinja": {"sit": {"data": "C:/...", "img": "C:/..."}},
+                               {"blink": {"data": "C:/...", "img": "C:/..."},
+                  "character2": {"sit": {"data": "C:/...", "img": "C:/..."}}}
+        :type: dict
+        """
+        # Get the pose files from the manifest. It only lists the directory again when
+        # the directory changed behind its back.
+        if self.manifest is None:
+            self._make_manifest()
+        entries = self.manifest.load()
+        only_files = sorted(entries)
+        TRACER.add("files", len(only_files))
+
+        # Forget the poses found before, even when there are none left, so deleting the
+        # last poses shows up as removed.
+        self.reset_poses()
+
+        # Check if the library is empty.
+        if not only_files:
+            IOM.warning("This project's pose library is empty.")
+            return None
+
+        # Find the characters from the data directory and add them to a dictionary.
+        self.add_scanned([(x, entries[x]) for x in only_files])
+
+
+    def reset_poses(self):
+        """
+        Forgets every pose found, before finding them again.
+        """
+        self.pose_paths = {}
+        self.pose_index = {}
+        self.pose_stamps = {}
+
+
+    def scan_poses(self, chunk_size=250, cancelled=None):
+        """
+        Lists the pose files in chunks as they're found, for a background scan. This
+        only touches the manifest, so it can run on a worker thread while the chunks
+        are handed to add_scanned on the main thread.
+
+        :param chunk_size: The number of files in each chunk.
+        :type: int
+
+        :param cancelled: Called between files, stops the scan when it returns True.
+        :type: function
+
+        :return: Lists of (file_name, record) from the manifest.
+        :type: generator
+        """
+        if self.manifest is None:
+            self._make_manifest()
+
+        chunk = []
+        for item in self.manifest.iter_load(cancelled):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+    def add_scanned(self, items):
+        """
+        Matches pose files to characters and adds them to the poses found.
+
+        :param items: (file_name, record) for pose files, as the manifest has them.
+        :type: list
+
+        :return: The (char, pose) of the poses that weren't found before.
+        :type: list
+        """
+        added = []
+        for curr_file, record in items:
+            # Just use the file's name, without the file extension and without the
+            # character's directory in a sharded library.
+            base_name = os.path.splitext(os.path.basename(curr_file))[0]
+            # Get the character from the start of the file name, the rest is the pose.
+            # So character_A_pose_title.xml will get "character_A" and the pose is
+            # "pose_title". The longest matching character wins, so "Tom2_sit.xml" is
+            # "Tom2" even if "Tom" is in the scene too.
+            char, pose = self.char_matcher.match(base_name)
+
+            # If we didn't find a matching character or pose then skip this file.
+            if char is None or pose is None:
+                continue
+
+            # Ensure the character is in the scene at all.
+            if char not in self.match_char_dict.keys():
+                continue
+
+            # Check if the character is in the dictionary already.
+            if not char in self.pose_paths:
+                self.pose_paths[char] = {}
+
+            # Check if the pose already exists, we don't want to collide. The only time
+            # we replace it is when a pose has more than one format, then the reference
+            # wins over the binary file, which wins over the XML.
+            found = self.pose_paths[char].get(pose)
+            if found is not None and FORMAT_RANK[pose_ext(curr_file)] <= \
+                                                    FORMAT_RANK[pose_ext(found["data"])]:
+                continue
+
+            if found is None:
+                added.append((char, pose))
+            self.pose_paths[char][pose] = {"data": record.get("data") or "%s/%s" % \
+                                                (self.proj_data_path, curr_file)}
+
+            # Stored poses have their thumbnail in the store, the manifest has its path.
+            img_file = "%s.png" % os.path.splitext(curr_file)[0]
+            self.pose_paths[char][pose]["img"] = record.get("img") or "%s/%s" % \
+                                                (self.proj_imgs_path, img_file)
+            self._index_pose(char, pose)
+
+            self.pose_stamps[(char, pose)] = (record.get("size"), record.get("mtime"))
+            TRACER.add("poses")
+
+        return added
+
+
+    def refresh_poses(self):
+        """
+        Finds the poses again and works out what changed since the last time, so a GUI
+        can update just those poses instead of rebuilding everything.
+
+        :return: The (char, pose) pairs that were added, removed and modified.
+                 {"added": [...], "removed": [...], "modified": [...]}
+        :type: dict
+        """
+        old_paths = self.pose_paths or {}
+        old_keys = set()
+        for char, poses in old_paths.items():
+            old_keys.update((char, x) for x in poses)
+        old_stamps = self.pose_stamps
+
+        self.find_poses()
+
+        new_keys = set()
+        for char, poses in (self.pose_paths or {}).items():
+            new_keys.update((char, x) for x in poses)
+
+        # A pose we added ourselves has no old stamp, that isn't a change.
+        modified = [x for x in old_keys & new_keys if x in old_stamps and \
+                                            old_stamps[x] != self.pose_stamps.get(x)]
+        delta = {"added": sorted(new_keys - old_keys),
+                 "removed": sorted(old_keys - new_keys),
+                 "modified": sorted(modified)}
+
+        # Anything cached for changed or removed poses is stale.
+        stale = [old_paths[x][y]["data"] for x, y in delta["removed"]]
+        stale += [self.pose_paths[x][y]["data"] for x, y in delta["modified"]]
+        for pose_data in stale:
+            self.pose_cache.invalidate(pose_data)
+            self.apply_engine.invalidate(pose_data)
+        for char, pose in delta["modified"]:
+            self._drop_from_search(char, pose)
+
+        return delta
+
+
+    def convert_library(self, to_ext=BIN_EXT, remove_source=False):
+        """
+        Converts the project's pose files to another format, then finds the poses again
+        so the pose paths point at the new files.
+
+        :param to_ext: The format to convert to, XML_EXT or BIN_EXT.
+        :type: str
+
+        :param remove_source: Delete the original files after converting them.
+        :type: bool
+
+        :return: The paths of the files written.
+        :type: list
+        """
+        if not self.proj_data_path:
+            IOM.error("There is no data directory to convert.")
+            return None
+
+        # Every character's poses, not just the ones in the scene.
+        converted = []
+        for data_dir, _ in self._library_dirs():
+            converted += convert_library(data_dir, to_ext, remove_source)
+        self.pose_cache.invalidate()
+        self.apply_engine.invalidate()
+        if self.manifest is not None:
+            self.manifest.rebuild()
+        if self.match_char_dict is not None:
+            self.find_poses()
+
+        return converted
+
+
+    def _library_dirs(self):
+        """
+        Gets every directory of the library with pose files in it. In a sharded library
+        that's every character's shard or buckets, not only the ones in the scene.
+
+        :return: (data_dir, imgs_dir) for each.
+        :type: list
+        """
+        if self.pose_layout is None:
+            self.pose_layout = PoseLayout(self.proj_data_path, self.proj_imgs_path)
+        return self.pose_layout.manifest().leaf_dirs()
+
+
+    def shard_library(self, bucket_poses=BUCKET_POSES):
+        """
+        Moves the library into a directory per character, so opening the tool only
+        lists the poses of the characters in the scene. Only the poses of the characters
+        in the scene are moved, run it again from other scenes or use the command line
+        tool with every character to move the rest. Until then, they're still found
+        where they are.
+
+        :param bucket_poses: Characters with more poses than this get hashed buckets,
+                             None to never bucket.
+        :type: int
+
+        :return: The counts of files and thumbnails moved, the characters sharded and
+                 bucketed, and the files left where they are.
+        :type: dict
+        """
+        if not self.proj_data_path or not self.match_char_dict:
+            IOM.error("There is no data directory or character to shard.")
+            return None
+
+        stats = shard_library(self.proj_data_path, self.proj_imgs_path,
+                              list(self.match_char_dict), bucket_poses)
+
+        # Every path changed, start the caches over and find the poses again.
+        self.pose_layout = PoseLayout(self.proj_data_path, self.proj_imgs_path)
+        self._make_manifest()
+        self.pose_cache.invalidate()
+        self.apply_engine.invalidate()
+        self.pose_search = {}
+        self.find_poses()
+
+        IOM.success("Moved %d pose files and %d thumbnails into %d character "
+                    "directories." % (stats["files"], stats["thumbnails"],
+                                      stats["characters"]))
+        return stats
+
+
+    @traced("_apply_attrs")
+    def _apply_attrs(self, xml_path, mirror=False):
+        """
+        Applies the attributes from the xml file to the appropriate controls.
+
+        :param xml_path: The full path to an XML file on disk.
+        :type: str
+
+        :param mirror: Apply the pose's mirror image instead.
+        :type: bool
+        """
+        # A preview would end up in the snapshot and the undo, put the rig back first.
+        self.end_preview()
+
+        # Get the compiled plan for the pose on the current namespace. The engine only
+        # reads the file again if it changed since the last apply.
+        namespace = self.curr_char_ns
+        plan = self.apply_engine.get_plan(xml_path, namespace,
+                                          self._read_mirrored if mirror else \
+                                          self._read_pose,
+                                          "mirror" if mirror else None)
+        if plan is None:
+            return None
+
+        # Keep what the plugs were, the same read tells the engine what to set.
+        current = self.apply_engine.read_values(plan)
+        self.last_snapshot = PoseSnapshot(self.apply_engine.tolerance)
+        self.last_snapshot.add(plan, current)
+
+        # Set everything that isn't already at the pose's value.
+        plugs_set = self.apply_engine.apply(plan, current=current)
+        TRACER.add("plugs_set", plugs_set)
+        TRACER.add("plugs_skipped", self.apply_engine.last_skipped)
+        TRACER.add("plugs_failed", self.apply_engine.last_failed)
+        return plugs_set
+
+
+    @traced("read_pose")
+    def _read_pose(self, pose_path):
+        """
+        Reads a pose file, XML or binary, and returns its contents. Sparse poses come
+        back expanded to the full pose.
+
+        :param pose_path: The full path to a pose file on disk.
+        :type: str
+
+        :return: The contents of the pose file.
+        :type: PoseData
+        """
+        # Poses we've read before come from the cache, as long as the file hasn't
+        # changed on disk since.
+        misses = self.pose_cache.misses
+        pose_data = self.pose_cache.get(pose_path, self._load_pose)
+        if pose_data is None and not os.path.isfile(pose_path):
+            IOM.error("The file path given can't be found on disk.")
+            return None
+
+        # Only the files the cache didn't have were read from disk.
+        if TRACER.enabled:
+            if self.pose_cache.misses != misses:
+                TRACER.add("bytes_read", (file_stamp(pose_path) or (0, 0))[1])
+            else:
+                TRACER.add("cache_hits")
+        return pose_data
+
+
+    def _load_pose(self, pose_path):
+        """
+        Reads a pose file for the cache. Sparse poses are expanded against their
+        character's default pose, so everything after this only sees full poses.
+
+        :param pose_path: The full path to a pose file on disk.
+        :type: str
+
+        :return: The full pose, or None if it couldn't be read.
+        :type: PoseData
+        """
+        pose_data = read_pose(pose_path)
+        if pose_data is None or not pose_data.sparse:
+            return pose_data
+
+        char = self._pose_char(pose_path)
+        defaults = self.pose_defaults.get(char) if self.pose_defaults and char else {}
+        missing = [x for x in pose_data.controls if x not in defaults]
+        if missing:
+            IOM.warning("No default pose for %s, only applying what was saved." % \
+                                                                            missing)
+
+        full = expand_pose(pose_data, defaults)
+        pose_data.release()
+        TRACER.add("sparse_values", len(pose_data))
+        return full
+
+
+    def _pose_char(self, pose_path):
+        """
+        Gets the character a pose file is for from its name.
+
+        :param pose_path: The path to a pose file.
+        :type: str
+
+        :return: The character, or None if no character in the scene matches.
+        :type: str
+        """
+        if self.char_matcher is None:
+            return None
+        base_name = os.path.splitext(os.path.basename(pose_path))[0]
+        return self.char_matcher.match(base_name)[0]
+
+
+    def _read_mirrored(self, pose_path):
         """
-        Finds the poses in the project data path, and tries to find an image if it exists.
+        Reads a pose file and mirrors it with its character's mirror table.
 
-        :return: The dictionary of the character and its poses we found, holding the
-                 data and img file paths.
-                 {"octoNinja": {"sit": {"data": "C:/...", "img": "C:/..."}},
-                               {"blink": {"data": "C:/...", "img": "C:/..."},
-                  "character2": {"sit": {"data": "C:/...", "img": "C:/..."}}}
-        :type: dict
+        :param pose_path: The full path to a pose file on disk.
+        :type: str
+
+        :return: The mirrored pose, or None if it couldn't be read.
+        :type: PoseData
         """
-        # Check if the file path is empty.
-        if not os.listdir(self.proj_data_path):
-            IOM.warning("This project's pose library is empty.")
+        pose_data = self._read_pose(pose_path)
+        if pose_data is None:
             return None
 
-        # Find only the files, no directories.
-        only_files = [f for f in os.listdir(self.proj_data_path) if \
-                                isfile(join(self.proj_data_path, f))]
+        return self.mirror_table(self._pose_char(pose_path) or self.curr_char)\
+                                                                    .mirror(pose_data)
 
-        # Find the characters from the data directory and add them to a dictionary.
-        self.pose_paths = {}
-        for curr_file in only_files:
-            # Just use the base name without the file extension.
-            base_name = os.path.splitext(curr_file)[0]
-            # Get the index of the characters from the file path.
-            # So character_A_pose_title.xml will get "character_A" and the pose is
-            # "pose_title".
-            char = None
-            pose = None
-            char_list = self.match_char_dict.keys()
-            for search_char in char_list:
-                # curr_file.find will search the string from the beginning until the
-                # length of the search char's length. We get the exact character's
-                # name on the start of the file to ensure the pose belongs to the char.
-                search_char_len = len(search_char)
-                char_start_index = curr_file.find(search_char, 0, search_char_len)
-                # If the character is found, then get the char and pose from it.
-                if char_start_index != -1:
-                    char = base_name[:search_char_len]
-                    pose = base_name[search_char_len+1:]
-                    break
-                else:
-                    # the string.find will return -1 if it can't find it, so continue.
-                    continue
 
-            # If we didn't find a matching character or pose then skip this file.
-            if char is None or pose is None:
-                continue
+    def mirror_table(self, char=None):
+        """
+        Gets a character's mirror table, making it the first time.
 
-            # Ensure the character is in the scene at all.
-            if char not in self.match_char_dict.keys():
-                continue
+        :param char: The character, the current character if None.
+        :type: str
 
-            # Check if the character is in the dictionary already.
-            if not char in self.pose_paths:
-                self.pose_paths[char] = {}
+        :return: The mirror table.
+        :type: PoseMirrorTable
+        """
+        if char is None:
+            char = self.curr_char
 
-            # Check if the pose already exists, we don't want to collide.
-            if not pose in self.pose_paths[char]:
-                self.pose_paths[char][pose] = {"data": "%s/%s" % \
-                                                    (self.proj_data_path, curr_file)}
-                img_file = "%s.png" % curr_file[:-4]
-                self.pose_paths[char][pose]["img"] = "%s/%s" % \
-                                                    (self.proj_imgs_path, img_file)
-            else:
-                continue
+        table = self.mirror_tables.get(char)
+        if table is None:
+            table = self.mirror_tables[char] = PoseMirrorTable(self.mirror_side_tokens,
+                                                               self.mirror_negate_attrs)
+        return table
 
 
-    def _apply_attrs(self, xml_path):
+    def set_mirror_rules(self, side_tokens=None, negate_attrs=None, char=None):
         """
-        Applies the attributes from the xml file to the appropriate controls.
+        Changes how poses are mirrored, for every character or just one.
 
-        :param xml_path: The full path to an XML file on disk.
+        :param side_tokens: (left, right) name tokens, like [("lf_", "rt_")]. The
+                            defaults if None.
+        :type: list
+
+        :param negate_attrs: The attributes that flip sign. The defaults if None.
+        :type: list
+
+        :param char: Only change this character's rules.
         :type: str
         """
-        # Get the contents of the XML file.
-        contents = self._read_xml(xml_path)
-        namespace = self.curr_char_ns
+        if char is None:
+            self.mirror_side_tokens = side_tokens
+            self.mirror_negate_attrs = negate_attrs
+            self.mirror_tables = {}
+        else:
+            self.mirror_tables[char] = PoseMirrorTable(side_tokens, negate_attrs)
 
-        # Iterate through the contents dict, adding the namespace to each name.
-        # And setting the attributes.
-        for control in contents:
-            ns_control = "%s:%s" % (namespace, control)
-            for attr in contents[control]:
-                value = float(contents[control][attr])
-                cmds.setAttr("%s.%s" % (ns_control, attr), value)
+        # Mirrored plans were compiled with the old rules.
+        self.apply_engine.invalidate()
+
+
+    def pose_cache_stats(self):
+        """
+        Gets the parsed pose cache's counters, for tuning its budget.
+
+        :return: The hits, misses, evictions, entries and bytes held.
+        :type: dict
+        """
+        return self.pose_cache.stats()
 
 
+    @traced("_read_xml")
     def _read_xml(self, xml_path):
         """
-        Reads the contents of an XML file and returns it.
+        Reads the contents of a pose file and returns it as a dictionary. Binary pose
+        files are read the same way, so the path doesn't have to be an XML.
 
-        :param xml_path: The full path to an XML file on disk.
+        :param xml_path: The full path to a pose file on disk.
         :type: str
 
-        :return: The contents of the XML file.
+        :return: The contents of the pose file, {control: {attr: value}}.
         :type: dict
         """
-        # Make sure the file exists.
-        if not os.path.isfile(xml_path):
-            IOM.error("The file path given can't be found on disk.")
+        pose_data = self._read_pose(xml_path)
+        if pose_data is None:
             return None
 
-        # Read in the XML and get the root.
-        xml_fh = et.parse(xml_path)
-        root = xml_fh.getroot()
+        return pose_data.to_dict()
 
-        # Find the children of the root node. and add it to a dictionary.
-        contents = AutoVivification()
-        xml_ctrls = root.getchildren()
-        for ctrl in xml_ctrls:
-            ctrl_attrs = ctrl.getchildren()
-            for ctrl_attr in ctrl_attrs:
-                value = ctrl_attr.attrib["value"]
-                contents[ctrl.tag][ctrl_attr.tag] = value
-
-        return contents
 
     def update_pose_data(self, pose_selected, overwrite_sel_set=False):
         """
@@ -343,6 +2168,10 @@ class PoseLibraryUtil(object):
         # Get the relevant pose paths.
         pose_data, pose_img = self.get_pose_paths(pose_selected)
 
+        # A stored pose is pointed at a new blob, the old one may be free after.
+        old_ref = read_pose_ref(pose_data) if pose_data and \
+                                            pose_ext(pose_data) == REF_EXT else None
+
         # Update the pose's XML, which will overwrite everything.
         # In the future give the option to use the same controls or a new selection set.
         if pose_data:
@@ -351,6 +2180,12 @@ class PoseLibraryUtil(object):
             else:
                 self._update_attrs(pose_data)
 
+            # Keep the manifest's size and modified time of the file current.
+            if self.manifest is not None:
+                self.manifest.add(pose_data, self.curr_char, pose_selected)
+            self._release_blobs(old_ref)
+            self._drop_from_search(self.curr_char,
+                                   self.resolve_pose(pose_selected, self.curr_char))
 
 
     def _update_sel_and_attrs(self, pose_data):
@@ -419,9 +2254,18 @@ class PoseLibraryUtil(object):
         # Get the pose img file path.
         pose_data, pose_img = self.get_pose_paths(pose_selected)
 
+        # Stored poses capture next to the other thumbnails, then move into the store.
+        # The thumbnail goes in the same shard and bucket as the pose's data.
+        if pose_data and pose_ext(pose_data) == REF_EXT:
+            rel_path = os.path.relpath(pose_data, self.proj_data_path).replace("\\", "/")
+            file_name = "%s.%s" % (os.path.splitext(rel_path)[0], FileExtensions.PNG)
+            self.viewport_capture(file_name)
+            return self._store_thumbnail(pose_data, "%s/%s" % (self.proj_imgs_path,
+                                                                file_name))
+
         if pose_img:
             # Derive the file name from the pose_img file path. Then capture the viewport.
-            file_name = os.path.basename(pose_img)
+            file_name = os.path.relpath(pose_img, self.proj_imgs_path).replace("\\", "/")
             self.viewport_capture(file_name)
 
             return pose_img
@@ -432,9 +2276,12 @@ class PoseLibraryUtil(object):
 
 
 
+    @traced("write_xml")
     def write_xml(self, selected, xml_path=None):
         """
-        Writes out the xml using what was selected.
+        Writes out the xml using what was selected. A path ending in the binary pose
+        extension writes the binary format instead. With sparse_poses on, only the
+        values that differ from the character's default pose are written.
 
         :param selected: Verifying the selected is handled before calling this function.
         :type: list
@@ -450,38 +2297,35 @@ class PoseLibraryUtil(object):
             IOM.error("No XML path entered in writing the XML.")
             return False
 
-        # Make an XML document and write some contents to it.
-        xml_doc = minidom.Document()
-        root = xml_doc.createElement("root")
-        xml_doc.appendChild(root)
+        # Save the rig as the animator posed it, not a pose being previewed.
+        self.end_preview()
 
-        # Add to the XMl just the names of the controls without namespaces. So
-        # for "octoNinja:l_eye_CC" will just save "l_eye_CC" to the XML.
+        # Add just the names of the controls without namespaces. So for
+        # "octoNinja:l_eye_CC" will just save "l_eye_CC" to the file.
         # In the loop, "item" is "octoNinja:l_eye_CC" which we can get the attr from.
-        # "just_cc" is the "l_eye_CC" that we write to the XML.
+        # "just_cc" is the "l_eye_CC" that we write to the file.
         # When we read, we will apply the namespace to apply the pose.
-        for item in selected:
-            just_cc = item.split(":")[1]
-            control_curve = xml_doc.createElement(just_cc)
-            root.appendChild(control_curve)
-
-            # Get the list of attributes that are keyable. Remove any dividers.
-            keyable_attrs = cmds.listAttr(item, keyable=True)
-            keyable_attrs = [x for x in keyable_attrs if not x.find("__") == 0]
-
-            # Loop through all the keyable attributes and write them out.
-            for curr_attr in keyable_attrs:
-                attr_element = xml_doc.createElement(curr_attr)
-                control_curve.appendChild(attr_element)
-                attr_value = cmds.getAttr("%s.%s" % (item, curr_attr))
-                attr_value = "%.3f" % attr_value
-                attr_element.setAttribute("value", attr_value)
-
-        # Now that we have everything in the XML instance, write the file to disk.
-        xml_str = xml_doc.toprettyxml(indent="    ")
-        with open(xml_path, "w") as fh:
-            fh.write(xml_str)
-        fh.close()
+        pose_data = self.pose_capture.capture(selected)
+        if pose_data is None:
+            return False
+
+        # Only keep what differs from the character's default pose, filling in the
+        # defaults of any control saved sparse for the first time.
+        if self.sparse_poses and self.pose_defaults is not None:
+            char = self._pose_char(xml_path) or self.curr_char
+            namespace = selected[0].split(":")[0]
+            defaults = self.pose_defaults.extend(char, pose_data, namespace)
+            pose_data = sparsify_pose(pose_data, defaults, self.sparse_tolerance)
+
+        TRACER.add("controls", len(pose_data.controls))
+        TRACER.add("values", len(pose_data.values))
+
+        # Write the file to disk, in the format the file's extension asks for.
+        write_pose(pose_data, xml_path)
+
+        # Any cached contents and compiled plans for this file are stale now.
+        self.pose_cache.invalidate(xml_path)
+        self.apply_engine.invalidate(xml_path)
         return True
 
 
@@ -492,7 +2336,7 @@ class PoseLibraryUtil(object):
         :param pose_name: The pose's name we'll make the name of the file with the char.
         :type: str
 
-        :return: The path to the XML we wrote out.
+        :return: The path to the pose file we wrote out.
         :type: str
         """
         # Verify we have a data file we can write to.
@@ -500,10 +2344,13 @@ class PoseLibraryUtil(object):
             IOM.error("There is no data directory to write out to.")
             return None
 
-        # Find the character the namespace in the combo box matches to.
+        # Find the character the namespace in the combo box matches to. A sharded
+        # library puts it in the character's directory.
         char = self.curr_char
-        file_name = "%s_%s" % (char, pose_name)
-        xml_path = "%s/%s.xml" % (self.proj_data_path, file_name)
+        if self.pose_layout is None:
+            self._make_manifest()
+        file_name = self.pose_layout.pose_base(char, pose_name)
+        xml_path = "%s/%s.%s" % (self.proj_data_path, file_name, self.pose_format)
         img_path = "%s/%s.png" % (self.proj_imgs_path, file_name)
 
         # Get the currently selected items from the scene.
@@ -517,11 +2364,27 @@ class PoseLibraryUtil(object):
             IOM.error("Selected failed verification step.")
             return None
 
+        # The character's first pose in a sharded library makes its directories.
+        for dir_path in (os.path.dirname(xml_path), os.path.dirname(img_path)):
+            try:
+                os.makedirs(dir_path, exist_ok=True)
+            except OSError:
+                IOM.error("Unable to make the directory \"%s\"." % dir_path)
+                return None
+
+        # Saving over a stored pose may free its old blob.
+        old_ref = read_pose_ref(xml_path) if self.pose_format == REF_EXT else None
+
         # We can now write to the xml.
         if not self.write_xml(selected_list, xml_path):
             IOM.error("Unable to write the XML")
             return None
 
+        # Record the new file in the manifest.
+        if self.manifest is not None:
+            self.manifest.add(xml_path, char, pose_name)
+        self._release_blobs(old_ref)
+
         # If this is the first file in the library, make it a dictionary we can add to.
         if self.pose_paths is None:
             self.pose_paths = {}
@@ -530,13 +2393,20 @@ class PoseLibraryUtil(object):
         if not char in self.pose_paths.keys():
             self.pose_paths[char] = {pose_name: None}
         self.pose_paths[char][pose_name] = {"data": xml_path, "img": img_path}
+        self._index_pose(char, pose_name)
+        self._drop_from_search(char, pose_name)
 
         return xml_path
 
 
+    @traced("viewport_capture")
     def viewport_capture(self, file_name):
         """
         This will set up the viewport to capture then use the PreviewImage class.
+
+        :param file_name: The image's path under the images directory, "Tom_sit.png"
+                          or "Tom/Tom_sit.png" in a sharded library.
+        :type: str
         """
         # Add these values to a RenderResEnum like a square dimension.
         width = 100
@@ -548,7 +2418,7 @@ class PoseLibraryUtil(object):
         # Make a temporary file for whatever context we are working in.
         import tempfile
         temp_dir = tempfile.mkdtemp()
-        temp_file = temp_dir + "/" + file_name
+        temp_file = temp_dir + "/" + os.path.basename(file_name)
 
         # Hide all the nurbs curves from every panel to get a clean screenshot.
         view_panels = cmds.getPanel(type="modelPanel")
@@ -580,10 +2450,16 @@ class PoseLibraryUtil(object):
             IOM.error("Writing the file failed.")
             return None
 
-        # Capture the viewport for the screenshot.
-        file_name = "%s_%s.%s" % (char, pose_name, FileExtensions.PNG)
+        # Capture the viewport for the screenshot, next to where the pose was written.
+        file_name = "%s.%s" % (self.pose_layout.pose_base(char, pose_name),
+                               FileExtensions.PNG)
         self.viewport_capture(file_name)
 
+        # Stored poses keep their thumbnail in the store too.
+        pose_data = self.get_pose_paths(pose_name, char)[0]
+        if pose_data and pose_ext(pose_data) == REF_EXT:
+            self._store_thumbnail(pose_data, "%s/%s" % (self.proj_imgs_path, file_name))
+
 
     def verify_selection(self, selected, char):
         """
@@ -625,7 +2501,7 @@ class PoseLibraryUtil(object):
         return True
 
 
-    def apply_pose(self, pose_name, char):
+    def apply_pose(self, pose_name, char, mirror=False):
         """
         Applies the pose by getting the info from the XML.
 
@@ -634,19 +2510,549 @@ class PoseLibraryUtil(object):
 
         :param char: The character we're applying it to.
         :type: str
+
+        :param mirror: Apply the pose's mirror image, left and right swapped.
+        :type: bool
+        """
+        # Locate it in the poses dictionary. The label's name can be "sit" or "sit.png",
+        # the index knows both.
+        pose = self.resolve_pose(pose_name, char)
+        if pose is None:
+            IOM.error("Could not find the pose \"%s\"." % pose_name)
+            return None
+
+        pose_data = self.pose_paths[char][pose]["data"]
+        self._apply_attrs(pose_data, mirror)
+        IOM.success("Applied: %s%s" % (pose, " mirrored" if mirror else ""))
+
+
+    @traced("apply_pose_to_namespaces")
+    def apply_pose_to_namespaces(self, pose_name, char, namespaces=None, mirror=False):
+        """
+        Applies a pose to several instances of a character at once, as one undo. The
+        pose file is read once and compiled against each namespace.
+
+        :param pose_name: The pose's name.
+        :type: str
+
+        :param char: The character we're applying it to.
+        :type: str
+
+        :param namespaces: The namespaces to apply to, every instance of the character
+                           in the scene if None.
+        :type: list
+
+        :param mirror: Apply the pose's mirror image.
+        :type: bool
+
+        :return: Per namespace, what was set and how long it took. Looks like:
+                 {"octoNinja": {"set": 40, "skipped": 2, "failed": [], "missing": [],
+                                "seconds": 0.004}}
+        :type: OrderedDict
+        """
+        pose = self.resolve_pose(pose_name, char)
+        if pose is None:
+            IOM.error("Could not find the pose \"%s\"." % pose_name)
+            return None
+        self.end_preview()
+
+        if namespaces is None:
+            namespaces = self.match_char_dict.get(char, [])
+        if not namespaces:
+            IOM.error("No namespaces to apply \"%s\" to." % pose)
+            return None
+
+        # Read the file once, every namespace compiles from the same contents.
+        pose_path = self.pose_paths[char][pose]["data"]
+        read_func = self._read_mirrored if mirror else self._read_pose
+        contents = read_func(pose_path)
+        if contents is None:
+            return None
+
+        plans = []
+        compile_times = {}
+        variant = "mirror" if mirror else None
+        for namespace in namespaces:
+            start = time.perf_counter()
+            plan = self.apply_engine.get_plan(pose_path, namespace, lambda x: contents,
+                                              variant)
+            compile_times[namespace] = time.perf_counter() - start
+            plans.append((namespace, plan))
+
+        # One snapshot of every rig, so revert_pose puts them all back.
+        self.last_snapshot = PoseSnapshot(self.apply_engine.tolerance)
+        for namespace, plan in plans:
+            self.last_snapshot.add(plan)
+
+        report = self.apply_engine.apply_many(plans)
+        TRACER.add("rigs", len(report))
+        TRACER.add("plugs_set", sum(x["set"] for x in report.values()))
+        for namespace, plan in plans:
+            report[namespace]["missing"] = plan.missing
+            report[namespace]["seconds"] += compile_times[namespace]
+
+        # Say which instances didn't take the whole pose.
+        for namespace, result in report.items():
+            if result["failed"] or result["missing"]:
+                IOM.warning("%s: %d plugs failed, %d not found." % (namespace,
+                                                                  len(result["failed"]),
+                                                                  len(result["missing"])))
+        total = sum(x["seconds"] for x in report.values())
+        IOM.success("Applied %s to %d rigs in %.1f ms." % (pose, len(report),
+                                                          total * 1e3))
+        return report
+
+
+    @traced("bake_poses")
+    def bake_poses(self, frame_poses, char=None, namespaces=None):
+        """
+        Keys poses at frames on one or more instances of a character, without moving
+        the time slider, as one undo. Each pose file is read once.
+
+        :param frame_poses: (frame, pose_name) pairs, like [(1, "idle"), (12, "jump")].
+        :type: list
+
+        :param char: The character the poses are for, the current character if None.
+        :type: str
+
+        :param namespaces: The namespaces to key, the current namespace if None.
+        :type: list
+
+        :return: The number of keys set.
+        :type: int
+        """
+        if char is None:
+            char = self.curr_char
+        if namespaces is None:
+            namespaces = [self.curr_char_ns]
+        self.end_preview()
+
+        # Resolve and read every pose up front, so a typo doesn't leave half a bake.
+        contents = {}
+        frame_paths = []
+        for frame, pose_name in frame_poses:
+            pose = self.resolve_pose(pose_name, char)
+            if pose is None:
+                IOM.error("Could not find the pose \"%s\"." % pose_name)
+                return 0
+
+            pose_path = self.pose_paths[char][pose]["data"]
+            if pose_path not in contents:
+                contents[pose_path] = self._read_pose(pose_path)
+                if contents[pose_path] is None:
+                    return 0
+            frame_paths.append((frame, pose_path))
+
+        frame_plans = []
+        for namespace in namespaces:
+            for frame, pose_path in frame_paths:
+                plan = self.apply_engine.get_plan(pose_path, namespace,
+                                                  lambda x: contents[x])
+                frame_plans.append((frame, plan))
+
+        key_count, failed = self.apply_engine.key_many(frame_plans)
+        TRACER.add("keys", key_count)
+        if failed:
+            IOM.warning("Unable to key: %s" % failed)
+        IOM.success("Baked %d poses on %d rigs, %d keys." % (len(frame_poses),
+                                                            len(namespaces), key_count))
+        return key_count
+
+
+    def search_index(self, char=None):
+        """
+        Gets a character's similarity index, brought up to date with its poses. The
+        first time every pose is read, after that only new and changed poses are.
+
+        :param char: The character, the current character if None.
+        :type: str
+
+        :return: The index.
+        :type: PoseSearchIndex
+        """
+        if char is None:
+            char = self.curr_char
+
+        index = self.pose_search.get(char)
+        if index is None:
+            index = self.pose_search[char] = PoseSearchIndex()
+
+        # Read around the pose cache, a whole library would push out the poses in use.
+        poses = (self.pose_paths or {}).get(char, {})
+        added, removed = index.sync(dict((x, y["data"]) for x, y in poses.items()),
+                                    self._load_pose)
+        TRACER.add("poses_indexed", added)
+        return index
+
+
+    @traced("find_similar_poses")
+    def find_similar_poses(self, count=5, char=None, namespace=None, controls=None,
+                           approximate=None):
+        """
+        Finds the character's poses closest to how the rig is posed right now.
+
+        :param count: The number of poses to find.
+        :type: int
+
+        :param char: The character, the current character if None.
+        :type: str
+
+        :param namespace: The rig to compare, the current namespace if None.
+        :type: str
+
+        :param controls: Only compare these controls, named without the namespace.
+                         Every control if None.
+        :type: list
+
+        :param approximate: Only search the closest clusters of poses. Automatic for
+                            very large libraries if None.
+        :type: bool
+
+        :return: (pose, distance) pairs, closest first.
+        :type: list
+        """
+        if char is None:
+            char = self.curr_char
+        if namespace is None:
+            namespace = self.curr_char_ns
+
+        index = self.search_index(char)
+        if not len(index):
+            return []
+
+        query, available = self._live_vector(index, char, namespace)
+        if controls is not None:
+            controls = set(controls)
+            for col, key in enumerate(index.column_keys):
+                if key[0] not in controls:
+                    available[col] = 0
+
+        results = index.search(query, available, count, approximate)
+        TRACER.add("poses_searched", len(index))
+        return results
+
+
+    def _live_vector(self, index, char, namespace):
+        """
+        Reads the rig's current value of every column in a similarity index.
+
+        :param index: The character's index.
+        :type: PoseSearchIndex
+
+        :param char: The character.
+        :type: str
+
+        :param namespace: The rig's namespace.
+        :type: str
+
+        :return: The value of every column, and 1 for the columns the rig has.
+        :type: array, array
         """
-        # Locate it in the poses dictionary.
-        pose_data = None
-        for pose in self.pose_paths[char]:
-            # Even if the label's name is "sit.png" it can still find "sit" in it, and we
-            # got a match.
-            if pose in pose_name:
-                pose_data = self.pose_paths[char][pose]["data"]
+        num_cols = len(index.column_keys)
+        for attempt in range(2):
+            # The plugs are resolved once, until the index gets new columns.
+            cached = self._search_plans.get((char, namespace))
+            if cached is None or cached[0] != num_cols:
+                schema = PoseData()
+                for control, attr in index.column_keys:
+                    schema.add_control(control, [(attr, 0.0)])
+                plan = self.apply_engine.compile(schema, namespace)
+                missing = set(plan.missing)
+                positions = [x for x, (y, z) in enumerate(index.column_keys) \
+                             if "%s:%s.%s" % (namespace, y, z) not in missing]
+                cached = (num_cols, plan, positions)
+                self._search_plans[(char, namespace)] = cached
+
+            try:
+                values = self.apply_engine.read_values(cached[1])
                 break
+            except RuntimeError:
+                # The rig was reloaded under us, resolve the plugs again.
+                self._search_plans.pop((char, namespace), None)
+                if attempt:
+                    raise
 
-        if pose_data:
-            self._apply_attrs(pose_data)
-            IOM.success("Applied: %s" % pose)
+        query = array("d", [0.0] * num_cols)
+        available = array("d", [0.0] * num_cols)
+        for col, value in zip(cached[2], values):
+            query[col] = value
+            available[col] = 1.0
+        return query, available
+
+
+    def _drop_from_search(self, char, pose):
+        """
+        Takes a pose out of its character's similarity index, so it's read again the
+        next time the index is used.
+        """
+        index = self.pose_search.get(char)
+        if index is not None and pose is not None:
+            index.remove(pose)
+
+
+    def revert_pose(self):
+        """
+        Puts back the plugs the last apply changed, as one undo.
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        if self.last_snapshot is None:
+            IOM.warning("There's no pose to revert.")
+            return 0
+
+        snapshot = self.last_snapshot
+        self.last_snapshot = None
+        return snapshot.restore(chunk_name="poseLibraryRevert")
+
+
+    @traced("preview_pose")
+    def preview_pose(self, pose_name, char=None, mirror=False):
+        """
+        Shows a pose on the current namespace without touching the undo queue. Every
+        plug a preview touches is snapshot the first time, so moving from one preview
+        to the next only sets the plugs that differ between the two poses, and
+        end_preview puts back just the plugs that moved.
+
+        :param pose_name: The pose's name.
+        :type: str
+
+        :param char: The character the pose is for, the current character if None.
+        :type: str
+
+        :param mirror: Preview the pose's mirror image.
+        :type: bool
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        if self.pose_blend is not None:
+            return 0
+
+        pose_data = self.get_pose_paths(pose_name, char)[0]
+        if not pose_data or not self.curr_char_ns:
+            return 0
+
+        plan = self.apply_engine.get_plan(pose_data, self.curr_char_ns,
+                                          self._read_mirrored if mirror else \
+                                          self._read_pose,
+                                          "mirror" if mirror else None)
+        if plan is None:
+            return 0
+
+        if self.pose_preview is None:
+            self.pose_preview = PoseSnapshot(self.apply_engine.tolerance)
+        preview = self.pose_preview
+        preview.add(plan)
+        self.preview_key = (pose_data, mirror)
+
+        plugs_set = preview.set_values(preview.values_with(plan), undoable=False)
+        TRACER.add("plugs_set", plugs_set)
+        return plugs_set
+
+
+    def end_preview(self, keep=False):
+        """
+        Ends previewing, putting the rig back how it was before the first preview.
+
+        :param keep: Apply the pose being previewed for real, as one undo.
+        :type: bool
+
+        :return: The number of plugs put back.
+        :type: int
+        """
+        if self.pose_preview is None:
+            return 0
+
+        preview = self.pose_preview
+        preview_key = self.preview_key
+        self.pose_preview = None
+        self.preview_key = None
+        plugs_set = preview.restore(undoable=False)
+
+        if keep and preview_key is not None:
+            self._apply_attrs(*preview_key)
+        return plugs_set
+
+
+    def begin_blend(self, pose_name, char=None):
+        """
+        Starts blending the current namespace toward a pose. The rig's current values
+        are where the blend starts from.
+
+        :param pose_name: The pose's name.
+        :type: str
+
+        :param char: The character the pose is for, the current character if None.
+        :type: str
+
+        :return: The blend, or None if the pose couldn't be found.
+        :type: PoseBlend
+        """
+        if self.pose_blend is not None:
+            self.end_blend()
+        self.end_preview()
+
+        pose_data = self.get_pose_paths(pose_name, char)[0]
+        if not pose_data:
+            IOM.error("Could not find the pose \"%s\"." % pose_name)
+            return None
+
+        engine = self.apply_engine
+        plan = engine.get_plan(pose_data, self.curr_char_ns, self._read_pose)
+        if plan is None:
+            return None
+
+        self.pose_blend = PoseBlend(plan, engine.read_values(plan), engine.tolerance)
+        return self.pose_blend
+
+
+    def blend_pose(self, weight):
+        """
+        Moves the blend started with begin_blend to a weight.
+
+        :param weight: 0 is where the rig started, 1 is the pose.
+        :type: float
+
+        :return: The number of plugs set.
+        :type: int
+        """
+        if self.pose_blend is None:
+            return 0
+        return self.pose_blend.set_weight(weight)
+
+
+    def end_blend(self, commit=True):
+        """
+        Ends the blend started with begin_blend, as one undo.
+
+        :param commit: Keep the blended pose, otherwise go back to where we started.
+        :type: bool
+        """
+        if self.pose_blend is None:
+            return None
+
+        pose_blend = self.pose_blend
+        self.pose_blend = None
+        pose_blend.finish(commit)
+
+
+    def apply_pose_blend(self, pose_name, char, weight):
+        """
+        Blends the current namespace toward a pose by a weight, in one go.
+
+        :param pose_name: The pose's name.
+        :type: str
+
+        :param char: The character we're applying it to.
+        :type: str
+
+        :param weight: 0 leaves the rig as is, 1 is the full pose.
+        :type: float
+        """
+        if not self.begin_blend(pose_name, char):
+            return None
+        self.blend_pose(weight)
+        self.end_blend()
+
+
+    def migrate_to_store(self, remove_source=True):
+        """
+        Moves the library into the content-addressed store, so poses and thumbnails
+        saved more than once are only kept once, and new poses are saved there too.
+
+        :param remove_source: Delete the pose files and thumbnails that were moved.
+        :type: bool
+
+        :return: The counts of poses, unique blobs and the bytes before and after.
+        :type: dict
+        """
+        if not self.proj_data_path:
+            IOM.error("There is no data directory to migrate.")
+            return None
+
+        # Every character's poses, not just the ones in the scene.
+        stats = migrate_to_store(self.proj_data_path, self.proj_imgs_path, remove_source,
+                                 self._library_dirs())
+        self.pose_format = REF_EXT
+
+        # Every path changed, start the caches over and find the poses again.
+        self.pose_cache.invalidate()
+        self.apply_engine.invalidate()
+        if self.manifest is not None:
+            self.manifest.rebuild()
+        self.find_poses()
+
+        IOM.success("Stored %d poses as %d poses and %d thumbnails, %d bytes down to %d."\
+                    % (stats["poses"], stats["unique_poses"], stats["unique_thumbnails"],
+                       stats["bytes_before"], stats["bytes_after"]))
+        return stats
+
+
+    def _store_thumbnail(self, ref_path, img_path):
+        """
+        Moves a captured thumbnail into the store and points the pose's reference at
+        it.
+
+        :param ref_path: The full path to the pose's reference file.
+        :type: str
+
+        :param img_path: The captured thumbnail.
+        :type: str
+
+        :return: The thumbnail's path in the store, or None if there wasn't one.
+        :type: str
+        """
+        old_ref = read_pose_ref(ref_path)
+        if old_ref is None or not os.path.isfile(img_path):
+            return None
+
+        store = PoseStore.for_ref(ref_path)
+        img_digest = store.put_image(img_path)
+        write_pose_ref(ref_path, old_ref["data"], img_digest)
+        try:
+            os.remove(img_path)
+        except OSError:
+            IO.error("Unable to delete: \n%s" % img_path)
+
+        # The record holds the blobs, so it has to be updated before counting them.
+        record = {}
+        if self.manifest is not None:
+            self.manifest.add(ref_path)
+            record = self.manifest.record(ref_path) or {}
+        if old_ref.get("img") != img_digest:
+            self._release_blobs({"data": None, "img": old_ref.get("img")})
+
+        store_img = store.blob_path(img_digest, IMG_EXT)
+        char, pose = record.get("char"), record.get("pose")
+        if char in (self.pose_paths or {}) and pose in self.pose_paths[char]:
+            self.pose_paths[char][pose]["img"] = store_img
+        return store_img
+
+
+    def _release_blobs(self, old_ref):
+        """
+        Deletes the blobs a reference pointed to if no reference points to them anymore.
+        Call it after the manifest has the reference's new state.
+
+        :param old_ref: The reference as it was, {"data": digest, "img": digest}.
+        :type: dict
+        """
+        if not old_ref or self.manifest is None:
+            return None
+
+        # Let the manifest catch up on anything other animators saved, so a blob
+        # someone just started using isn't deleted. The store is shared by the whole
+        # library, so a sharded one counts the characters that aren't in the scene too.
+        manifest = self.manifest
+        if self.pose_layout is not None and self.pose_layout.sharded:
+            manifest = self.pose_layout.manifest()
+        manifest.load()
+        store = PoseStore(store_dir(self.proj_data_path))
+        for digest, ext in ((old_ref.get("data"), BIN_EXT),
+                            (old_ref.get("img"), IMG_EXT)):
+            if digest and not manifest.references(digest):
+                store.remove(digest, ext)
 
 
     def delete_pose(self, pose_selected):
@@ -659,12 +3065,26 @@ class PoseLibraryUtil(object):
         # Get the pose paths necessary.
         pose_data, pose_img = self.get_pose_paths(pose_selected)
 
-        # Delete the pose's XML file.
+        # A stored pose's blobs may be shared, they're only deleted with the last
+        # reference to them.
+        old_ref = None
+        if pose_data and pose_ext(pose_data) == REF_EXT:
+            old_ref = read_pose_ref(pose_data)
+            pose_img = None
+
+        # Delete the pose's data file, in every format so a converted pose doesn't come
+        # back from its old XML.
         if pose_data:
-            try:
-                os.remove(pose_data)
-            except WindowsError or OSError:
-                IO.error("Unable to delete: \n%s" % pose_data)
+            for data_path in pose_file_variants(pose_data):
+                if not os.path.isfile(data_path):
+                    continue
+                try:
+                    os.remove(data_path)
+                except OSError:
+                    IO.error("Unable to delete: \n%s" % data_path)
+                    continue
+                if self.manifest is not None:
+                    self.manifest.remove(data_path)
 
         # Delete the pose's image file.
         if pose_img:
@@ -673,9 +3093,18 @@ class PoseLibraryUtil(object):
             except WindowsError or OSError:
                 IO.error("Unable to delete: \n%s" % pose_data)
 
+        self._release_blobs(old_ref)
+
+        if pose_data:
+            self.pose_cache.invalidate(pose_data)
+            self.apply_engine.invalidate(pose_data)
+
         # Derive the pose from the pose_selected then remove from the dictionary.
         char = self.curr_char
-        self.pose_paths[char].pop(pose_selected)
+        pose = self.resolve_pose(pose_selected, char)
+        if pose is not None:
+            self.pose_paths[char].pop(pose)
+            self._unindex_pose(char, pose)
 
 
     def select_pose_ctrls(self, pose_selected):
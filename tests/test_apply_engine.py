@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests compiling poses into apply plans and setting and keying them.
+
+:description:
+    Runs the PoseApplyEngine against the stand-in cmds and OpenMaya modules. Checks
+    rotates are converted between the API's radians and the degrees of the pose files,
+    and counts the cmds calls a bake makes.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_utils.PoseApplyEngine
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+# Every test module installs the stand-ins, the utils keep the cmds of the first.
+utils = maya_stand_ins.install()[1]
+cmds = utils.cmds
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestCompiledUnits(unittest.TestCase):
+
+    def setUp(self):
+        cmds.plugs.clear()
+        cmds.nodes.clear()
+        cmds.add_control("Tom:arm_ctrl", {"rotateX": 0.0, "translateX": 0.0, "fist": 0.0})
+        self.engine = utils.PoseApplyEngine()
+
+        pose_data = pose_io.PoseData()
+        pose_data.add_control("arm_ctrl", [("rotateX", 45.0), ("translateX", 3.0),
+                                           ("fist", 0.5)])
+        self.plan = self.engine.compile(pose_data, "Tom")
+
+
+    def assert_posed(self):
+        for plug, value in zip(self.plan.plugs, [45.0, 3.0, 0.5]):
+            self.assertAlmostEqual(cmds.plugs[plug], value)
+        curr_values = self.engine.read_values(self.plan)
+        for value, curr_value in zip([45.0, 3.0, 0.5], curr_values):
+            self.assertAlmostEqual(value, curr_value)
+
+
+    def test_rotates_are_angles(self):
+        self.assertAlmostEqual(self.plan.scales[0], 180.0 / math.pi)
+        self.assertEqual(list(self.plan.scales[1:]), [1.0, 1.0])
+        self.assertEqual(list(self.plan.angular), [1, 0, 0])
+        self.assertAlmostEqual(self.plan.angle_period, 360.0)
+
+
+    def test_rotates_round_trip_with_undo(self):
+        self.assertEqual(self.engine.apply(self.plan), 3)
+        self.assert_posed()
+
+        # Read back in degrees, the pose is already on the rig.
+        self.assertEqual(self.engine.apply(self.plan), 0)
+
+
+    def test_rotates_round_trip_without_undo(self):
+        # The MDGModifier takes radians, setAttr would have taken degrees.
+        self.assertEqual(self.engine.apply(self.plan, undoable=False), 3)
+        self.assert_posed()
+        self.assertEqual(self.engine.apply(self.plan, undoable=False), 0)
+
+
+    def test_captured_rotates_are_degrees(self):
+        self.engine.apply(self.plan)
+        pose_data = utils.PoseCapture().capture(["Tom:arm_ctrl"])
+        self.assertEqual(pose_data.attrs, [["rotateX", "translateX", "fist"]])
+        for value, captured in zip([45.0, 3.0, 0.5], pose_data.values):
+            self.assertAlmostEqual(value, captured)
+
+
+class TestKeyMany(unittest.TestCase):
+
+    def setUp(self):
+        cmds.plugs.clear()
+        cmds.nodes.clear()
+        cmds.keys.clear()
+        cmds.add_control("Tom:arm_ctrl", {"rotateX": 0.0, "rotateY": 0.0})
+        cmds.add_control("Tom:hand_ctrl", {"fist": 0.0})
+        self.engine = utils.PoseApplyEngine()
+
+
+    def plan(self, arm_x, arm_y, fist):
+        pose_data = pose_io.PoseData()
+        pose_data.add_control("arm_ctrl", [("rotateX", arm_x), ("rotateY", arm_y)])
+        pose_data.add_control("hand_ctrl", [("fist", fist)])
+        return self.engine.compile(pose_data, "Tom")
+
+
+    def test_keys_every_plug_at_every_frame(self):
+        frame_plans = [(1, self.plan(10.0, 0.0, 1.0)),
+                       (12, self.plan(20.0, 0.0, 1.0)),
+                       (24, self.plan(10.0, 5.0, 0.0))]
+        key_count, failed = self.engine.key_many(frame_plans)
+        self.assertEqual((key_count, failed), (9, []))
+        self.assertEqual(cmds.keys["Tom:arm_ctrl.rotateX"], {1: 10.0, 12: 20.0, 24: 10.0})
+        self.assertEqual(cmds.keys["Tom:arm_ctrl.rotateY"], {1: 0.0, 12: 0.0, 24: 5.0})
+        self.assertEqual(cmds.keys["Tom:hand_ctrl.fist"], {1: 1.0, 12: 1.0, 24: 0.0})
+        self.assertEqual(cmds.undo_depth, 0)
+
+
+    def test_held_values_share_a_call(self):
+        # Every plug holds its value over the frames, so it's one call per value.
+        frame_plans = [(x, self.plan(10.0, 10.0, 10.0)) for x in range(1, 50)]
+        calls = cmds.calls
+        key_count, failed = self.engine.key_many(frame_plans)
+        self.assertEqual(key_count, 49 * 3)
+
+        # The undo chunk's open and close, and one setKeyframe.
+        self.assertEqual(cmds.calls - calls, 3)
+
+
+    def test_failed_plugs_are_reported_per_frame(self):
+        plan = self.plan(10.0, 0.0, 1.0)
+        plan.plugs[2] = "Tom:gone_ctrl.fist"
+        key_count, failed = self.engine.key_many([(1, plan), (2, plan)])
+        self.assertEqual(key_count, 4)
+        self.assertEqual(failed, ["Tom:gone_ctrl.fist@1", "Tom:gone_ctrl.fist@2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests matching pose file names to characters.
+
+:description:
+    Checks the CharacterMatcher on its own, then find_poses, refresh_poses and
+    add_scanned on a temp library, against the stand-in cmds module.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_io.CharacterMatcher
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestCharacterMatcher(unittest.TestCase):
+
+    def test_longest_character_wins(self):
+        matcher = pose_io.CharacterMatcher(["Tom", "Tom2"])
+        self.assertEqual(matcher.match("Tom2_sit"), ("Tom2", "sit"))
+        self.assertEqual(matcher.match("Tom_sit"), ("Tom", "sit"))
+
+
+    def test_order_of_characters_does_not_matter(self):
+        matcher = pose_io.CharacterMatcher(["Tom2", "Tom"])
+        self.assertEqual(matcher.match("Tom2_sit"), ("Tom2", "sit"))
+        self.assertEqual(matcher.match("Tom_2_sit"), ("Tom", "2_sit"))
+
+
+    def test_characters_with_underscores(self):
+        matcher = pose_io.CharacterMatcher(["character", "character_A"])
+        self.assertEqual(matcher.match("character_A_pose_title"),
+                         ("character_A", "pose_title"))
+        self.assertEqual(matcher.match("character_B_pose_title"),
+                         ("character", "B_pose_title"))
+
+
+    def test_no_separator_or_pose(self):
+        matcher = pose_io.CharacterMatcher(["Tom"])
+        self.assertEqual(matcher.match("Tom"), (None, None))
+        self.assertEqual(matcher.match("Tomsit"), (None, None))
+        self.assertEqual(matcher.match("Tom_"), (None, None))
+        self.assertEqual(matcher.match("Jerry_sit"), (None, None))
+        self.assertEqual(matcher.match(""), (None, None))
+
+
+    def test_split(self):
+        matcher = pose_io.CharacterMatcher(["Tom", "Tom2"])
+        self.assertEqual(matcher.split("Tom2_sit.xml"), ("Tom2", "sit"))
+        self.assertEqual(matcher.split("Tom2_sit"), ("Tom2", "sit"))
+        self.assertEqual(matcher.split("/library/data/Tom/Tom_sit.pbin"), ("Tom", "sit"))
+        self.assertEqual(matcher.split("Tom.xml"), (None, None))
+
+
+class TestFindPoses(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        refs = [maya_stand_ins.StandInRef(x, x) for x in ("Tom", "Tom2")]
+        self.util = utils.PoseLibraryUtil(maya_stand_ins.StandInContext(self.root, refs))
+        self.util.rigs = self.util.check_for_rigs()
+        self.util.get_pose_dir()
+        self.util.match_rigs_to_char()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def test_find_poses_matches_the_longest_character(self):
+        for file_name in ("Tom_sit.xml", "Tom2_sit.xml", "Tom2_run.xml",
+                          "Jerry_sit.xml", "Tom.xml"):
+            open(os.path.join(self.util.proj_data_path, file_name), "w").close()
+
+        self.util.find_poses()
+        self.assertEqual(sorted(self.util.pose_paths), ["Tom", "Tom2"])
+        self.assertEqual(sorted(self.util.pose_paths["Tom"]), ["sit"])
+        self.assertEqual(sorted(self.util.pose_paths["Tom2"]), ["run", "sit"])
+        self.assertTrue(self.util.pose_paths["Tom2"]["sit"]["data"].endswith(
+                                                                        "/Tom2_sit.xml"))
+
+
+    def test_deleting_the_last_poses_is_a_removal(self):
+        file_path = os.path.join(self.util.proj_data_path, "Tom_sit.xml")
+        with open(file_path, "w") as fh:
+            fh.write("<Pose><arm_ctrl><rotateX value=\"1.0\"/></arm_ctrl></Pose>")
+        self.util.find_poses()
+        data_path = self.util.pose_paths["Tom"]["sit"]["data"]
+        self.util.pose_cache.get(data_path)
+        self.assertIn(data_path, self.util.pose_cache)
+
+        os.remove(file_path)
+        stat = os.stat(self.util.proj_data_path)
+        os.utime(self.util.proj_data_path, (stat.st_atime, stat.st_mtime + 10))
+        delta = self.util.refresh_poses()
+        self.assertEqual(delta["removed"], [("Tom", "sit")])
+        self.assertEqual(self.util.pose_paths, {})
+        self.assertNotIn(data_path, self.util.pose_cache)
+
+
+    def test_add_scanned(self):
+        self.util.reset_poses()
+        data_dir = self.util.proj_data_path
+        items = [(x, {"data": "%s/%s" % (data_dir, x)}) \
+                                    for x in ("Tom2_jump.xml", "Tom_jump.xml", "x.xml")]
+        added = self.util.add_scanned(items)
+        self.assertEqual(sorted(added), [("Tom", "jump"), ("Tom2", "jump")])
+        self.assertEqual(self.util.resolve_pose("jump.png", "Tom2"), "jump")
+
+
+if __name__ == "__main__":
+    unittest.main()
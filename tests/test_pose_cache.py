@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests the in-memory cache of parsed poses.
+
+:description:
+    Checks the PoseCache drops its least recently used poses past its budgets, and reads
+    a pose again once its file changes or goes away.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_io.PoseCache
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestPoseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.reads = []
+        self.paths = []
+        for index in range(3):
+            file_path = os.path.join(self.root, "Tom_pose%d.pbin" % index)
+            self.write(file_path, float(index))
+            self.paths.append(file_path)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def write(self, file_path, value, num_values=1):
+        pose_data = pose_io.PoseData()
+        pose_data.add_control("arm_ctrl", [("rotateX", value)] * num_values)
+        pose_io.write_pose(pose_data, file_path)
+
+
+    def loader(self, file_path):
+        # Counts the reads, so a test can tell a hit from a miss.
+        self.reads.append(os.path.basename(file_path))
+        return pose_io.read_pose(file_path)
+
+
+    def test_second_get_is_a_hit(self):
+        cache = pose_io.PoseCache()
+        first = cache.get(self.paths[0], self.loader)
+        self.assertIs(cache.get(self.paths[0], self.loader), first)
+        self.assertEqual(self.reads, ["Tom_pose0.pbin"])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+    def test_least_recently_used_is_evicted(self):
+        cache = pose_io.PoseCache(max_entries=2)
+        cache.get(self.paths[0], self.loader)
+        cache.get(self.paths[1], self.loader)
+
+        # Using the first pose again makes the second the oldest.
+        cache.get(self.paths[0], self.loader)
+        cache.get(self.paths[2], self.loader)
+        self.assertIn(self.paths[0], cache)
+        self.assertNotIn(self.paths[1], cache)
+        self.assertIn(self.paths[2], cache)
+        self.assertEqual(cache.evictions, 1)
+
+
+    def test_byte_budget(self):
+        size = pose_io.read_pose(self.paths[0]).nbytes()
+        cache = pose_io.PoseCache(max_bytes=size * 2)
+        for file_path in self.paths:
+            cache.get(file_path, self.loader)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, size * 2)
+
+        # A pose bigger than the whole budget isn't kept, and doesn't evict the rest.
+        big_path = os.path.join(self.root, "Tom_big.pbin")
+        self.write(big_path, 1.0, num_values=100)
+        self.assertIsNotNone(cache.get(big_path, self.loader))
+        self.assertNotIn(big_path, cache)
+        self.assertEqual(len(cache), 2)
+
+
+    def test_changed_file_is_read_again(self):
+        cache = pose_io.PoseCache()
+        cache.get(self.paths[0], self.loader)
+
+        # A new size is picked up, and so is a new modified time with the same size.
+        self.write(self.paths[0], 5.0, num_values=2)
+        self.assertEqual(list(cache.get(self.paths[0], self.loader).values), [5.0, 5.0])
+
+        self.write(self.paths[0], 6.0, num_values=2)
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(list(cache.get(self.paths[0], self.loader).values), [6.0, 6.0])
+        self.assertEqual(len(self.reads), 3)
+        self.assertEqual(len(cache), 1)
+
+
+    def test_deleted_file_is_dropped(self):
+        cache = pose_io.PoseCache()
+        cache.get(self.paths[0], self.loader)
+        size = cache.nbytes
+        os.remove(self.paths[0])
+        self.assertIsNone(cache.get(self.paths[0], self.loader))
+        self.assertNotIn(self.paths[0], cache)
+        self.assertEqual(cache.nbytes, 0)
+        self.assertGreater(size, 0)
+
+
+    def test_invalidate(self):
+        cache = pose_io.PoseCache()
+        for file_path in self.paths:
+            cache.get(file_path, self.loader)
+        cache.invalidate(self.paths[0])
+        self.assertNotIn(self.paths[0], cache)
+        self.assertEqual(len(cache), 2)
+
+        cache.invalidate()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests reading and writing pose files.
+
+:description:
+    Round-trips poses through the binary pose format, in memory and on disk, and checks
+    the layout of the file: the string table of names and the aligned block of values.
+    Then round-trips sparse poses against a character's default pose.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_io.PoseData
+    pose_library_io.sparsify_pose
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestBinaryPose(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.pose_data = pose_io.PoseData()
+        self.pose_data.add_control("arm_ctrl", [("rotateX", 12.5), ("rotateY", -0.25)])
+        self.pose_data.add_control("hand_ctrl", [("fist", 1.0)])
+        self.pose_data.add_control("p\u00e9lvis_ctrl", [("translateZ", 3.0)])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def assert_same_pose(self, pose_data):
+        self.assertEqual(pose_data.controls, self.pose_data.controls)
+        self.assertEqual(pose_data.attrs, self.pose_data.attrs)
+        self.assertEqual(list(pose_data.values), list(self.pose_data.values))
+
+
+    def test_round_trip_in_memory(self):
+        pose_data = pose_io.PoseData.from_buffer(self.pose_data.to_bytes())
+        self.assert_same_pose(pose_data)
+        self.assertFalse(pose_data.sparse)
+
+
+    def test_values_are_aligned_after_the_string_table(self):
+        buffer = self.pose_data.to_bytes()
+        magic, version, flags, num_ctrls, num_values, table_size = \
+                                            pose_io.BIN_HEADER.unpack_from(buffer, 0)
+        self.assertEqual(magic, pose_io.BIN_MAGIC)
+        self.assertEqual((num_ctrls, num_values), (3, 4))
+
+        # One line per control, the control's name then its attributes, tab separated.
+        table_start = pose_io.BIN_HEADER.size
+        table = buffer[table_start:table_start + table_size].decode("utf-8")
+        self.assertEqual(table.split("\n"), ["arm_ctrl\trotateX\trotateY",
+                                             "hand_ctrl\tfist",
+                                             "p\u00e9lvis_ctrl\ttranslateZ", ""])
+
+        values_start = len(buffer) - num_values * 8
+        self.assertEqual(values_start % 8, 0)
+        self.assertEqual(values_start, pose_io._align(table_start + table_size))
+        self.assertEqual(buffer[table_start + table_size:values_start],
+                         b"\0" * (values_start - table_start - table_size))
+
+
+    def test_round_trip_on_disk(self):
+        file_path = os.path.join(self.root, "Tom_sit.pbin")
+        pose_io.write_pose(self.pose_data, file_path)
+        self.assert_same_pose(pose_io.read_pose(file_path))
+
+        pose_data = pose_io.read_pose(file_path, use_mmap=True)
+        self.assert_same_pose(pose_data)
+        pose_data.release()
+        self.assertEqual(list(pose_data.values), list(self.pose_data.values))
+
+
+    def test_sparse_flag_round_trips(self):
+        self.pose_data.sparse = True
+        self.assertTrue(pose_io.PoseData.from_buffer(self.pose_data.to_bytes()).sparse)
+
+
+    def test_bad_files_are_not_read(self):
+        buffer = self.pose_data.to_bytes()
+        for bad in (b"", b"XXXX" + buffer[4:], buffer[:-8]):
+            with self.assertRaises(ValueError):
+                pose_io.PoseData.from_buffer(bad)
+
+        file_path = os.path.join(self.root, "Tom_bad.pbin")
+        with open(file_path, "wb") as fh:
+            fh.write(buffer[:-8])
+        self.assertIsNone(pose_io.read_pose(file_path))
+
+
+class TestSparsePose(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.defaults = {"arm_ctrl": {"rotateX": 0.0, "rotateY": 0.0, "scaleX": 1.0},
+                         "hand_ctrl": {"fist": 0.0}}
+        self.pose_data = pose_io.PoseData()
+        self.pose_data.add_control("arm_ctrl", [("rotateX", 30.0), ("rotateY", 0.0001),
+                                                ("scaleX", 1.0)])
+        self.pose_data.add_control("hand_ctrl", [("fist", 0.0)])
+        self.pose_data.add_control("prop_ctrl", [("grip", 0.0)])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def test_only_values_off_their_default_are_kept(self):
+        sparse = pose_io.sparsify_pose(self.pose_data, self.defaults)
+        self.assertTrue(sparse.sparse)
+
+        # A control at its default keeps its name, and anything without a default stays.
+        self.assertEqual(sparse.controls, ["arm_ctrl", "hand_ctrl", "prop_ctrl"])
+        self.assertEqual(sparse.attrs, [["rotateX"], [], ["grip"]])
+        self.assertEqual(list(sparse.values), [30.0, 0.0])
+
+
+    def test_round_trip_against_the_defaults(self):
+        sparse = pose_io.sparsify_pose(self.pose_data, self.defaults)
+        for ext in pose_io.POSE_EXTS:
+            file_path = os.path.join(self.root, "Tom_sit.%s" % ext)
+            pose_io.write_pose(sparse, file_path)
+            read_back = pose_io.read_pose(file_path)
+            self.assertTrue(read_back.sparse)
+
+            full = pose_io.expand_pose(read_back, self.defaults)
+            self.assertFalse(full.sparse)
+            self.assertEqual(sorted(full.controls), sorted(self.pose_data.controls))
+            expected = self.pose_data.to_dict()
+            for control, attr, value in full.items():
+                self.assertAlmostEqual(value, expected[control][attr], places=3)
+            self.assertEqual(len(full), len(self.pose_data))
+
+
+    def test_defaults_added_later_are_filled_in(self):
+        sparse = pose_io.sparsify_pose(self.pose_data, self.defaults)
+        self.defaults["arm_ctrl"]["rotateZ"] = 5.0
+        full = pose_io.expand_pose(sparse, self.defaults)
+        self.assertEqual(full.to_dict()["arm_ctrl"]["rotateZ"], 5.0)
+
+
+    def test_full_poses_are_not_expanded(self):
+        self.assertIs(pose_io.expand_pose(self.pose_data, self.defaults), self.pose_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests the command line maintenance tool.
+
+:description:
+    Runs the dedupe command on a temp library in this process, and checks it only
+    treats poses of the same character as duplicates.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_cli
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+pose_cli = sys.modules["maya_tools.utils.pose_library_cli"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestDedupe(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.root, "data").replace("\\", "/")
+        self.imgs_dir = os.path.join(self.root, "imgs").replace("\\", "/")
+        os.makedirs(self.data_dir)
+        os.makedirs(self.imgs_dir)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def write(self, file_name, controls):
+        pose_data = pose_io.PoseData()
+        for control, attr_values in controls:
+            pose_data.add_control(control, attr_values)
+        pose_io.write_pose(pose_data, "%s/%s" % (self.data_dir, file_name))
+
+
+    def dedupe(self, *args):
+        argv = ["dedupe", "--data", self.data_dir, "--imgs", self.imgs_dir,
+                "--jobs", "1", "--json"] + list(args)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            pose_cli.main(argv)
+        return json.loads(out.getvalue())
+
+
+    def test_characters_the_manifest_does_not_know_are_skipped(self):
+        # Same contents, different characters, and no --chars to tell them apart.
+        sit = [("arm_ctrl", [("rotateX", 1.0)])]
+        self.write("Tom_sit.xml", sit)
+        self.write("Jerry_sit.xml", sit)
+
+        report = self.dedupe("--delete")
+        self.assertEqual(report["duplicates"], 0)
+        self.assertEqual(len(report["unmatched"]), 2)
+        self.assertEqual(sorted(os.listdir(self.data_dir)),
+                         ["Jerry_sit.xml", "Tom_sit.xml"])
+
+        report = self.dedupe("--chars", "Tom", "Jerry", "--delete")
+        self.assertEqual((report["duplicates"], report["unmatched"]), (0, []))
+
+
+    def test_order_and_format_do_not_matter(self):
+        self.write("Tom_sit.xml", [("arm_ctrl", [("rotateX", 1.0), ("rotateY", 2.0)]),
+                                   ("hand_ctrl", [("fist", 0.5)])])
+        self.write("Tom_sit2.pbin", [("hand_ctrl", [("fist", 0.5)]),
+                                     ("arm_ctrl", [("rotateY", 2.0001),
+                                                   ("rotateX", 1.0)])])
+        self.write("Tom_run.xml", [("arm_ctrl", [("rotateX", 5.0)])])
+
+        report = self.dedupe("--chars", "Tom", "--delete")
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(report["deleted"], 1)
+        self.assertEqual(sorted(os.listdir(self.data_dir)),
+                         ["Tom_run.xml", "Tom_sit.xml"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests the persistent manifest of the pose data directory.
+
+:description:
+    Checks a PoseManifest in sync with its directory is loaded without listing it, and
+    that it lists the directory again and fixes its records when the directory drifted,
+    or when a file changed in place.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_io.PoseManifest
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestPoseManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.root, "data").replace("\\", "/")
+        self.imgs_dir = os.path.join(self.root, "imgs").replace("\\", "/")
+        os.makedirs(self.data_dir)
+        os.makedirs(self.imgs_dir)
+        for file_name in ("Tom_sit.xml", "Tom_run.pbin"):
+            self.write(file_name, "x")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def write(self, file_name, contents):
+        file_path = "%s/%s" % (self.data_dir, file_name)
+        with open(file_path, "w") as fh:
+            fh.write(contents)
+        return file_path
+
+
+    def touch_dir(self, seconds):
+        # Moves the directory's modified time on, in case the file system's clock is
+        # too coarse to tell two changes apart.
+        stat = os.stat(self.data_dir)
+        os.utime(self.data_dir, (stat.st_atime, stat.st_mtime + seconds))
+
+
+    def manifest(self):
+        return pose_io.PoseManifest(self.data_dir, self.imgs_dir)
+
+
+    def test_first_load_lists_and_saves(self):
+        manifest = self.manifest()
+        self.assertEqual(sorted(manifest.load()), ["Tom_run.pbin", "Tom_sit.xml"])
+        self.assertTrue(os.path.isfile(manifest.manifest_path))
+
+        record = manifest.record("%s/Tom_sit.xml" % self.data_dir)
+        self.assertEqual(record["data"], "%s/Tom_sit.xml" % self.data_dir)
+        self.assertEqual(record["img"], "%s/Tom_sit.png" % self.imgs_dir)
+        self.assertEqual(record["size"], 1)
+
+
+    def test_load_in_sync_does_not_list(self):
+        self.manifest().load()
+        with mock.patch.object(pose_io.os, "scandir", side_effect=AssertionError):
+            entries = self.manifest().load()
+        self.assertEqual(sorted(entries), ["Tom_run.pbin", "Tom_sit.xml"])
+
+
+    def test_drift_lists_again(self):
+        self.manifest().load()
+
+        # Someone else adds and deletes files without the tool.
+        self.write("Tom_jump.xml", "x")
+        os.remove("%s/Tom_run.pbin" % self.data_dir)
+        self.touch_dir(10)
+
+        entries = self.manifest().load()
+        self.assertEqual(sorted(entries), ["Tom_jump.xml", "Tom_sit.xml"])
+
+        # The listing was saved, so the next load is in sync again.
+        with mock.patch.object(pose_io.os, "scandir", side_effect=AssertionError):
+            self.assertEqual(sorted(self.manifest().load()),
+                             ["Tom_jump.xml", "Tom_sit.xml"])
+
+
+    def test_file_changed_in_place_is_revalidated(self):
+        manifest = self.manifest()
+        manifest.load()
+        file_path = "%s/Tom_sit.xml" % self.data_dir
+        manifest.add(file_path, "Tom", "sit")
+
+        # Changing a file in place doesn't change the directory's modified time, it's
+        # only caught when the directory is listed again.
+        self.write("Tom_sit.xml", "xyz")
+        manifest = pose_io.PoseManifest(self.data_dir, self.imgs_dir, revalidate_after=0)
+        record = manifest.load()["Tom_sit.xml"]
+        self.assertEqual(record["size"], 3)
+        self.assertEqual((record["char"], record["pose"]), ("Tom", "sit"))
+
+
+    def test_add_and_remove_stay_in_sync(self):
+        manifest = self.manifest()
+        manifest.load()
+        file_path = self.write("Tom_wave.xml", "x")
+        manifest.add(file_path, "Tom", "wave")
+        os.remove("%s/Tom_run.pbin" % self.data_dir)
+        manifest.remove("%s/Tom_run.pbin" % self.data_dir)
+
+        with mock.patch.object(pose_io.os, "scandir", side_effect=AssertionError):
+            entries = self.manifest().load()
+        self.assertEqual(sorted(entries), ["Tom_sit.xml", "Tom_wave.xml"])
+        self.assertEqual(entries["Tom_wave.xml"]["char"], "Tom")
+
+
+    def test_bad_manifest_is_rebuilt(self):
+        manifest = self.manifest()
+        manifest.load()
+        with open(manifest.manifest_path, "r") as fh:
+            data = json.load(fh)
+        data["version"] = pose_io.MANIFEST_VERSION + 1
+        with open(manifest.manifest_path, "w") as fh:
+            json.dump(data, fh)
+        self.assertEqual(sorted(self.manifest().load()), ["Tom_run.pbin", "Tom_sit.xml"])
+
+        with open(manifest.manifest_path, "w") as fh:
+            fh.write("{")
+        self.assertEqual(sorted(self.manifest().load()), ["Tom_run.pbin", "Tom_sit.xml"])
+
+
+if __name__ == "__main__":
+    unittest.main()
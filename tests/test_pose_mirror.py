@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests mirroring poses from one side of a rig to the other.
+
+:description:
+    Checks the PoseMirrorTable swaps the side tokens of control names only where they
+    are tokens, not letters inside other words, and flips the signs of the mirrored
+    attributes.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_utils.PoseMirrorTable
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestMirrorControl(unittest.TestCase):
+
+    def setUp(self):
+        self.table = utils.PoseMirrorTable()
+
+
+    def assert_mirrors(self, control, mirrored):
+        self.assertEqual(self.table.mirror_control(control), mirrored)
+        self.assertEqual(self.table.mirror_control(mirrored), control)
+
+
+    def test_prefixes(self):
+        self.assert_mirrors("l_arm_CC", "r_arm_CC")
+        self.assert_mirrors("L_leg_CC", "R_leg_CC")
+
+
+    def test_suffixes(self):
+        self.assert_mirrors("arm_CC_l", "arm_CC_r")
+        self.assert_mirrors("bell_L", "bell_R")
+
+
+    def test_words(self):
+        self.assert_mirrors("left_arm_CC", "right_arm_CC")
+        self.assert_mirrors("armLeft_CC", "armRight_CC")
+        self.assert_mirrors("eye_left_CC", "eye_right_CC")
+
+
+    def test_letters_inside_words_are_not_sides(self):
+        for control in ("lip_CC", "lower_lip_CC", "roll_CC", "world_CC", "ctrl_root",
+                        "cleft_chin_CC", "brightness_CC", "wheel_rl_CC", "spine_CC"):
+            self.assertEqual(self.table.mirror_control(control), control)
+
+
+    def test_only_one_side_is_swapped(self):
+        # The prefix is the side, the "_r" after it is part of the name.
+        self.assertEqual(self.table.mirror_control("l_finger_r"), "r_finger_r")
+
+
+class TestMirrorPose(unittest.TestCase):
+
+    def setUp(self):
+        self.table = utils.PoseMirrorTable()
+        self.pose_data = pose_io.PoseData()
+        self.pose_data.add_control("l_arm_CC", [("translateX", 2.0), ("rotateX", 10.0),
+                                                ("rotateY", 20.0)])
+        self.pose_data.add_control("spine_CC", [("rotateZ", 5.0), ("rotateX", 3.0)])
+
+
+    def test_mirror(self):
+        mirrored = self.table.mirror(self.pose_data)
+        self.assertEqual(mirrored.controls, ["r_arm_CC", "spine_CC"])
+        self.assertEqual(mirrored.attrs, self.pose_data.attrs)
+        self.assertEqual(list(mirrored.values), [-2.0, 10.0, -20.0, -5.0, 3.0])
+
+
+    def test_mirror_twice_is_the_pose(self):
+        mirrored = self.table.mirror(self.table.mirror(self.pose_data))
+        self.assertEqual(mirrored.controls, self.pose_data.controls)
+        self.assertEqual(list(mirrored.values), list(self.pose_data.values))
+
+        # Every name was worked out once and kept.
+        self.assertEqual(self.table.controls["l_arm_CC"], "r_arm_CC")
+        self.assertEqual(self.table.entries[("l_arm_CC", "rotateY")],
+                         ("r_arm_CC", "rotateY", -1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
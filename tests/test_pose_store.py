@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    username
+
+:synopsis:
+    Tests the content-addressed store of poses and thumbnails.
+
+:description:
+    Checks the same pose saved under two names is stored once, and that deleting the
+    poses only deletes the blob with the last reference to it.
+
+    python -m pytest tests
+
+:applications:
+    None, runs in plain Python with the stand-in cmds module.
+
+:see_also:
+    pose_library_io.PoseStore
+    benchmarks.maya_stand_ins
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                            os.path.abspath(__file__))), "benchmarks"))
+import maya_stand_ins
+
+cmds, utils = maya_stand_ins.install()
+pose_io = sys.modules["maya_tools.utils.pose_library_io"]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TestPoseStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        refs = [maya_stand_ins.StandInRef("Tom", "Tom")]
+        self.util = utils.PoseLibraryUtil(maya_stand_ins.StandInContext(self.root, refs))
+        self.util.rigs = self.util.check_for_rigs()
+        self.util.get_pose_dir()
+        self.util.match_rigs_to_char()
+        self.util.curr_char = "Tom"
+        self.data_dir = self.util.proj_data_path
+
+        # The same pose saved twice, in a different order the second time.
+        self.pose_data = pose_io.PoseData()
+        self.pose_data.add_control("arm_ctrl", [("rotateX", 1.0), ("rotateY", 2.0)])
+        self.pose_data.add_control("hand_ctrl", [("fist", 0.5)])
+        other_order = pose_io.PoseData()
+        other_order.add_control("hand_ctrl", [("fist", 0.5)])
+        other_order.add_control("arm_ctrl", [("rotateY", 2.0), ("rotateX", 1.0)])
+        for file_name, pose_data in (("Tom_sit.pref", self.pose_data),
+                                     ("Tom_perch.pref", other_order)):
+            pose_io.write_pose(pose_data, "%s/%s" % (self.data_dir, file_name))
+
+        self.util.find_poses()
+        self.digest = pose_io.read_pose_ref("%s/Tom_sit.pref" % self.data_dir)["data"]
+        store = pose_io.PoseStore(pose_io.store_dir(self.data_dir))
+        self.blob_path = store.blob_path(self.digest, pose_io.BIN_EXT)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+    def test_same_pose_is_one_blob(self):
+        ref = pose_io.read_pose_ref("%s/Tom_perch.pref" % self.data_dir)
+        self.assertEqual(ref["data"], self.digest)
+        self.assertEqual(self.util.manifest.references(self.digest), 2)
+
+        store = pose_io.PoseStore(pose_io.store_dir(self.data_dir))
+        self.assertEqual(list(store.iter_blobs()), [(self.digest, pose_io.BIN_EXT)])
+
+        pose_data = pose_io.read_pose("%s/Tom_perch.pref" % self.data_dir)
+        self.assertEqual(pose_data.controls, ["arm_ctrl", "hand_ctrl"])
+        self.assertEqual(list(pose_data.values), [1.0, 2.0, 0.5])
+
+
+    def test_blob_is_deleted_with_the_last_reference(self):
+        self.util.delete_pose("sit")
+        self.assertFalse(os.path.isfile("%s/Tom_sit.pref" % self.data_dir))
+        self.assertTrue(os.path.isfile(self.blob_path))
+        self.assertEqual(self.util.manifest.references(self.digest), 1)
+
+        self.util.delete_pose("perch")
+        self.assertFalse(os.path.isfile("%s/Tom_perch.pref" % self.data_dir))
+        self.assertFalse(os.path.isfile(self.blob_path))
+        self.assertEqual(self.util.manifest.references(self.digest), 0)
+
+
+    def test_reference_someone_else_saved_keeps_the_blob(self):
+        # Another animator saves the same pose after we listed the library.
+        ref_path = "%s/Tom_crouch.pref" % self.data_dir
+        pose_io.write_pose(self.pose_data, ref_path)
+        other = pose_io.PoseManifest(self.data_dir, self.util.manifest.imgs_dir)
+        other.add(ref_path, "Tom", "crouch")
+
+        self.util.delete_pose("sit")
+        self.util.delete_pose("perch")
+        self.assertTrue(os.path.isfile(self.blob_path))
+
+
+if __name__ == "__main__":
+    unittest.main()